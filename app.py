@@ -18,12 +18,24 @@ import plotly.express as px
 from datetime import datetime, timedelta
 import warnings
 from io import BytesIO
+from pathlib import Path
+import copy
+import hashlib
 import json
+import os
+import pickle
+import threading
+from contextlib import contextmanager
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sklearn.base import clone
 from sklearn.linear_model import LinearRegression, Ridge
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from statsmodels.tsa.seasonal import seasonal_decompose
 from statsmodels.tsa.stattools import adfuller
+from pandas.api.types import union_categoricals
 import geopandas as gpd
 from shapely.geometry import LineString, MultiLineString
 import warnings
@@ -529,6 +541,40 @@ CITY_NORMALIZE_CLEAN = {
     'KIRIKKALE': 'Kirikkale'
 }
 
+# Yüklenen Excel dosyalarının kolonlu (Parquet) önbelleği
+CACHE_DIR = Path(os.environ.get("TR_HARITA_CACHE_DIR", ".cache"))
+DATA_CACHE_DIR = CACHE_DIR / "data"
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Eğitilmiş tahmin modellerinin disk önbelleği (LRU, boyut sınırlı)
+MODEL_CACHE_DIR = CACHE_DIR / "models"
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("TR_HARITA_MODEL_CACHE_MB", "256")) * 1024 * 1024
+MODEL_CACHE_VERSION = 4  # model/feature seti değişince artırılır (eski kayıtlar geçersiz olur)
+
+# Ürün/territory başına kazanan hiperparametre ayarları
+TUNING_CACHE_PATH = CACHE_DIR / "tuning.json"
+TUNING_CACHE_VERSION = 2  # arama yöntemi değişince artırılır (eski ayarlar geçersiz olur)
+
+# Bu boyuttan büyük .xlsx dosyaları openpyxl read-only modunda parça parça okunur
+STREAMING_THRESHOLD_BYTES = 20 * 1024 * 1024
+STREAM_CHUNK_ROWS = 50_000
+
+# Ürün (PF) ve rakip satış kolonları
+MEASURE_COLUMNS = [
+    "TROCMETAM", "DIGER TROCMETAM",
+    "CORTIPOL", "DIGER CORTIPOL",
+    "DEKSAMETAZON", "DIGER DEKSAMETAZON",
+    "PF IZOTONIK", "DIGER IZOTONIK"
+]
+
+# Kategorik tutulacak boyut kolonları
+DIMENSION_COLUMNS = ['TERRITORIES', 'REGION', 'MANAGER', 'CITY', 'CITY_NORMALIZED']
+
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
@@ -537,6 +583,73 @@ def safe_divide(a, b):
     """Güvenli bölme işlemi"""
     return np.where(b != 0, a / b, 0)
 
+def decategorize(df):
+    """Küçük sonuç tablolarındaki kategorik kolonları object tipine çevir"""
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+def index_by_date(df):
+    """Veriyi tarihe göre sıralı tut ve DATE'i sıralı DatetimeIndex yap
+    
+    Sıralı indeks sayesinde tarih aralıkları filter_date_range ile ikili
+    arama (searchsorted) kullanılarak kopyasız dilimlenir.
+    """
+    if not df['DATE'].is_monotonic_increasing:
+        df = df.sort_values('DATE', kind='stable')
+    df.index = pd.DatetimeIndex(df['DATE'].to_numpy())
+    return df
+
+def filter_date_range(df, date_filter):
+    """Tarih aralığını sıralı indeks üzerinde ikili arama ile dilimle
+    
+    Dilim, ebeveynin önbellek anahtarını (attrs['frame_key']) taşımaz; aksi halde aynı satır
+    sayısındaki farklı dilimler aynı önbellek kaydını paylaşırdı.
+    """
+    if not date_filter:
+        return df
+    
+    start, end = pd.Timestamp(date_filter[0]), pd.Timestamp(date_filter[1])
+    if isinstance(df.index, pd.DatetimeIndex) and df.index.is_monotonic_increasing:
+        start_pos = df.index.searchsorted(start, side='left')
+        end_pos = df.index.searchsorted(end, side='right')
+        subset = df.iloc[start_pos:end_pos]
+    else:
+        subset = df[(df['DATE'] >= start) & (df['DATE'] <= end)]
+    
+    subset.attrs.pop('frame_key', None)
+    return subset
+
+def snap_date_filter_to_months(date_filter):
+    """Tarih aralığını tam aylara genişlet (başlangıç ayının ilk günü - bitiş ayının son anı)
+    
+    Küp ay çözünürlüğünde olduğundan ay ortasından başlayan aralıklar, ham veri ve
+    küp üzerinde aynı ayları seçsin diye her zaman tam aylara yuvarlanır.
+    """
+    if not date_filter:
+        return date_filter
+    
+    start = pd.Timestamp(date_filter[0]).to_period('M').to_timestamp()
+    end = pd.Timestamp(date_filter[1]).to_period('M').to_timestamp(how='end')
+    return (start, end)
+
+def month_start(values):
+    """Ay anahtarından (Period veya 'YYYY-MM' metni) ayın ilk günü"""
+    if isinstance(values.dtype, pd.PeriodDtype):
+        return values.dt.to_timestamp()
+    return pd.to_datetime(values.astype(str), format='%Y-%m')
+
+def format_month_key(values):
+    """Ay anahtarını (Period, kategorik veya metin) 'YYYY-MM' metnine çevir"""
+    if isinstance(values.dtype, pd.PeriodDtype):
+        return values.dt.strftime('%Y-%m')
+    return values.astype(str)
+
+def memory_usage_mb(df):
+    """DataFrame'in gerçek bellek kullanımı (MB)"""
+    return df.memory_usage(deep=True).sum() / (1024 ** 2)
+
 def get_product_columns(product):
     """Ürün kolonlarını döndür"""
     if product == "TROCMETAM":
@@ -571,6 +684,92 @@ def normalize_city_name_fixed(city_name):
     
     return CITY_NORMALIZE_CLEAN.get(city_upper, city_name)
 
+def default_pool_workers():
+    """İşçi sayısı: geçerli bir TR_HARITA_MAX_WORKERS, yoksa bu sürece ayrılmış çekirdek sayısı
+    
+    Hatalı ortam değişkeni uygulamayı durdurmaz, varsayılana dönülür.
+    """
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    
+    try:
+        requested = int(os.environ.get("TR_HARITA_MAX_WORKERS", ""))
+    except ValueError:
+        requested = 0
+    return requested if requested > 0 else available
+
+# Toplu analizlerde kullanılacak en fazla işçi süreç (cgroup/affinity sınırlarına uyar)
+POOL_MAX_WORKERS = default_pool_workers()
+POOL_MIN_TASKS = 8  # Daha az görev, işçi başlatma/modül içe aktarma maliyetine değmez; süreç içinde çalışır
+
+@st.cache_resource(show_spinner=False)
+def get_process_pool(max_workers):
+    """Oturumlar ve yeniden çalıştırmalar arasında paylaşılan süreç havuzu
+    
+    Çok iş parçacıklı sunucu sürecini fork etmek kilitlenmeye yol açabilir; işçiler temiz bir
+    süreçten (forkserver, yoksa spawn) bir kez başlatılır ve modülü bir kez içe aktarır.
+    """
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(start_method))
+
+def run_in_process_pool(func, tasks, max_workers=None):
+    """Görevleri paylaşılan süreç havuzunda çalıştır; az görevde, havuz kurulamazsa (veya çökerse) sıralı çalıştır
+    
+    func modül düzeyinde tanımlı olmalı ve Streamlit çağrısı yapmamalıdır.
+    Sonuçlar görev sırasıyla döner.
+    """
+    tasks = list(tasks)
+    max_workers = max_workers or POOL_MAX_WORKERS
+    if max_workers <= 1 or len(tasks) < POOL_MIN_TASKS:
+        return [func(task) for task in tasks]
+    
+    try:
+        executor = get_process_pool(max_workers)
+        return list(executor.map(func, tasks, chunksize=max(1, len(tasks) // (max_workers * 4))))
+    except (BrokenProcessPool, OSError):
+        # Havuz kurulamadı veya işçi süreç öldü - bozuk havuz atılır, görevler bu süreçte çalıştırılır.
+        # İşçi içindeki hatalar (görev istisnaları) yakalanmaz, çağırana ulaşır.
+        get_process_pool.clear()
+        return [func(task) for task in tasks]
+
+# Ham şehir yazımı -> normalize isim eşlemesi (süreç boyunca paylaşılır)
+_CITY_NAME_CACHE = {}
+
+def resolve_city_names(raw_names):
+    """Benzersiz şehir yazımlarını normalize et; daha önce çözülenler önbellekten gelir"""
+    resolved = []
+    for name in raw_names:
+        if name not in _CITY_NAME_CACHE:
+            _CITY_NAME_CACHE[name] = normalize_city_name_fixed(name)
+        resolved.append(_CITY_NAME_CACHE[name])
+    return resolved
+
+def normalize_city_column(series):
+    """Şehir kolonunu satır satır değil, benzersiz yazımlar üzerinden normalize et
+    
+    Normalizasyon her farklı yazım için bir kez çalışır ve sonuç kategorik
+    kodlar üzerinden tüm satırlara yayılır.
+    """
+    codes, uniques = pd.factorize(series)
+    resolved = pd.Index(resolve_city_names(uniques), dtype=object)
+    
+    try:
+        resolved_codes, categories = pd.factorize(resolved, sort=True)
+    except TypeError:
+        resolved_codes, categories = pd.factorize(resolved)
+    
+    final_codes = np.full(len(codes), -1, dtype=resolved_codes.dtype)
+    valid = codes >= 0
+    final_codes[valid] = resolved_codes[codes[valid]]
+    
+    return pd.Series(
+        pd.Categorical.from_codes(final_codes, categories=categories),
+        index=series.index,
+        name=series.name
+    )
+
 def format_number(num):
     """Sayıları binlik ayırıcılı ve sadeleştirilmiş formatta göster"""
     if pd.isna(num):
@@ -631,30 +830,80 @@ def classify_trend(slope, y_values):
     else:
         return "📉 Güçlü Düşüş"
 
+def batch_trend_slopes(values, lengths):
+    """Her satırı bir seri olan matris için kapalı formda OLS eğimleri
+    
+    Seriler sola hizalıdır; i. satırın ilk lengths[i] değeri kullanılır.
+    Eğimler calculate_trend_slope ile aynıdır. (eğimler, ortalamalar) döner.
+    """
+    values = np.asarray(values, dtype=float)
+    lengths = np.asarray(lengths)
+    x = np.arange(values.shape[1], dtype=float)
+    mask = x[None, :] < lengths[:, None]
+    
+    y = np.where(mask, values, 0.0)
+    y_mean = y.sum(axis=1) / np.maximum(lengths, 1)
+    dx = np.where(mask, x[None, :] - ((lengths - 1) / 2)[:, None], 0.0)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = (dx * (y - y_mean[:, None])).sum(axis=1) / (dx ** 2).sum(axis=1)
+    return np.where(lengths >= 2, slopes, 0.0), y_mean
+
+def batch_classify_trend(slopes, means, lengths):
+    """classify_trend'in vektörel karşılığı"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent_slope = slopes / means * 100
+    
+    return np.select(
+        [lengths < 5, means == 0, percent_slope > 10, percent_slope > 5, percent_slope > -5, percent_slope > -10],
+        ["Yetersiz Veri", "Nötr", "📈 Güçlü Artış", "📈 Artış", "📊 Sabit", "📉 Düşüş"],
+        default="📉 Güçlü Düşüş"
+    )
+
+def batch_seasonality(values, lengths, period=12):
+    """Matristeki her seri için baskın periyot, güç ve mevsimsellik sınıfı
+    
+    Aynı uzunluktaki seriler tek bir rFFT ile işlenir; güç spektrumu
+    scipy.signal.periodogram (yoğunluk, tek taraflı) ile aynı ölçektedir.
+    Güç: baskın frekansın DC dışı toplam güç içindeki payı.
+    """
+    values = np.asarray(values, dtype=float)
+    lengths = np.asarray(lengths)
+    dominant_period = np.full(len(lengths), np.nan)
+    strength = np.full(len(lengths), np.nan)
+    
+    for n in np.unique(lengths[lengths >= period * 2]):
+        rows = np.flatnonzero(lengths == n)
+        y = values[rows, :n]
+        power = np.abs(np.fft.rfft(y - y.mean(axis=1, keepdims=True), axis=1)) ** 2 / n
+        if n % 2 == 0:
+            power[:, 1:-1] *= 2
+        else:
+            power[:, 1:] *= 2
+        
+        idx = np.argmax(power[:, 1:], axis=1) + 1
+        dominant_period[rows] = 1 / np.fft.rfftfreq(n)[idx]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            strength[rows] = power[np.arange(len(rows)), idx] / power[:, 1:].sum(axis=1)
+    
+    labels = np.select(
+        [lengths < period * 2,
+         (dominant_period >= period - 2) & (dominant_period <= period + 2),
+         (dominant_period >= 3) & (dominant_period <= 24)],
+        ["Yetersiz Veri", "Güçlü Mevsimsellik", "Zayıf Mevsimsellik"],
+        default="Mevsimsellik Yok"
+    )
+    return labels, dominant_period, strength
+
 def calculate_seasonality(y_values, period=12):
     """Mevsimsellik analizi"""
     if len(y_values) < period * 2:
         return None, "Yetersiz veri"
     
-    try:
-        from scipy.signal import periodogram
-        f, Pxx = periodogram(y_values, fs=1)
-        
-        if len(f) > 0 and len(Pxx) > 0:
-            # En yüksek mevsimsel frekans
-            idx = np.argmax(Pxx[1:]) + 1
-            dominant_period = 1 / f[idx] if f[idx] > 0 else 0
-            
-            if dominant_period >= period - 2 and dominant_period <= period + 2:
-                return "Güçlü Mevsimsellik", round(dominant_period, 1)
-            elif dominant_period >= 3 and dominant_period <= 24:
-                return "Zayıf Mevsimsellik", round(dominant_period, 1)
-            else:
-                return "Mevsimsellik Yok", None
-    except:
-        return "Analiz Edilemedi", None
-    
-    return "Bilinmiyor", None
+    labels, dominant_period, _ = batch_seasonality(np.asarray(y_values, dtype=float)[None, :], [len(y_values)], period)
+    if labels[0] == "Mevsimsellik Yok":
+        return "Mevsimsellik Yok", None
+    return labels[0], round(dominant_period[0], 1)
 
 # =============================================================================
 # GELİŞTİRİLMİŞ ZAMAN SERİSİ ANALİZ FONKSİYONLARI
@@ -664,22 +913,12 @@ def calculate_advanced_time_series(df, product, territory=None, date_filter=None
     """GELİŞTİRİLMİŞ Zaman serisi analizi"""
     cols = get_product_columns(product)
     
-    df_filtered = df.copy()
-    if territory and territory != "TÜMÜ":
-        df_filtered = df_filtered[df_filtered['TERRITORIES'] == territory]
-    
-    if date_filter:
-        df_filtered = df_filtered[(df_filtered['DATE'] >= date_filter[0]) & 
-                                   (df_filtered['DATE'] <= date_filter[1])]
-    
-    # Aylık gruplama
-    monthly = df_filtered.groupby('YIL_AY').agg({
-        cols['pf']: 'sum',
-        cols['rakip']: 'sum',
-        'DATE': 'first'
-    }).reset_index().sort_values('YIL_AY')
+    # Aylık gruplama (tüm ürünler tek geçişte, önbellekli)
+    monthly = aggregate_all_products(df, ('YIL_AY',), date_filter, territory)
+    monthly = monthly[['YIL_AY', cols['pf'], cols['rakip'], 'DATE']].sort_values('YIL_AY')
     
     monthly.columns = ['YIL_AY', 'PF_Satis', 'Rakip_Satis', 'DATE']
+    monthly['YIL_AY'] = format_month_key(monthly['YIL_AY'])
     monthly['Toplam_Pazar'] = monthly['PF_Satis'] + monthly['Rakip_Satis']
     monthly['Pazar_Payi_%'] = safe_divide(monthly['PF_Satis'], monthly['Toplam_Pazar']) * 100
     
@@ -707,14 +946,13 @@ def calculate_advanced_time_series(df, product, territory=None, date_filter=None
     monthly['Year'] = monthly['DATE_DT'].dt.year
     monthly['Month'] = monthly['DATE_DT'].dt.month
     
-    # YoY büyümesini hesapla
-    for idx, row in monthly.iterrows():
-        if idx >= 12:
-            same_month_last_year = monthly[(monthly['Year'] == row['Year'] - 1) & 
-                                          (monthly['Month'] == row['Month'])]
-            if not same_month_last_year.empty:
-                monthly.loc[idx, 'YoY_PF_Growth'] = ((row['PF_Satis'] / same_month_last_year['PF_Satis'].values[0]) - 1) * 100
-                monthly.loc[idx, 'YoY_Rakip_Growth'] = ((row['Rakip_Satis'] / same_month_last_year['Rakip_Satis'].values[0]) - 1) * 100
+    # YoY büyümesini hesapla (ay dönemine hizalı 12 ay geri; eksik aylar boş kalır)
+    month_period = pd.PeriodIndex(monthly['DATE_DT'], freq='M')
+    last_year = monthly[['PF_Satis', 'Rakip_Satis']].set_index(month_period).reindex(month_period - 12)
+    if last_year['PF_Satis'].notna().any():
+        with np.errstate(divide='ignore', invalid='ignore'):
+            monthly['YoY_PF_Growth'] = (monthly['PF_Satis'].to_numpy() / last_year['PF_Satis'].to_numpy() - 1) * 100
+            monthly['YoY_Rakip_Growth'] = (monthly['Rakip_Satis'].to_numpy() / last_year['Rakip_Satis'].to_numpy() - 1) * 100
     
     # Mevsimsellik indeksi (basitleştirilmiş)
     if len(monthly) >= 12:
@@ -760,6 +998,439 @@ def calculate_advanced_time_series(df, product, territory=None, date_filter=None
     
     return monthly
 
+# Panel çıktısında grup kolonunun görünen adı
+LEVEL_LABELS = {'TERRITORIES': 'Territory', 'CITY': 'City', 'REGION': 'Region', 'MANAGER': 'Manager'}
+
+# Portföy taramalarında seçilebilen seviyeler
+LEVEL_OPTIONS = {"Territory": 'TERRITORIES', "Şehir": 'CITY', "Manager": 'MANAGER'}
+
+def calculate_panel_time_series(df, product, date_filter=None, level='TERRITORIES'):
+    """Tüm territory'ler için aylık zaman serisi metrikleri tek geçişte (uzun format)
+    
+    Metrikler calculate_advanced_time_series ile aynıdır; pencereler her grup
+    içinde ayrı ayrı hesaplanır.
+    """
+    cols = get_product_columns(product)
+    name_col = LEVEL_LABELS[level]
+    
+    panel = aggregate_all_products(df, (level, 'YIL_AY'), date_filter)
+    panel = panel[[level, 'YIL_AY', cols['pf'], cols['rakip'], 'DATE']]
+    panel.columns = [name_col, 'YIL_AY', 'PF_Satis', 'Rakip_Satis', 'DATE']
+    panel = decategorize(panel).sort_values([name_col, 'YIL_AY'], kind='stable').reset_index(drop=True)
+    
+    panel['YIL_AY'] = format_month_key(panel['YIL_AY'])
+    panel['Toplam_Pazar'] = panel['PF_Satis'] + panel['Rakip_Satis']
+    panel['Pazar_Payi_%'] = safe_divide(panel['PF_Satis'], panel['Toplam_Pazar']) * 100
+    
+    groups = panel[name_col]
+    
+    def grouped(col):
+        return panel[col].groupby(groups, sort=False)
+    
+    def rolling(col, window, min_periods=1):
+        return grouped(col).rolling(window, min_periods=min_periods)
+    
+    def ungroup(result):
+        return result.reset_index(level=0, drop=True)
+    
+    # Temel büyüme oranları
+    panel['PF_Buyume_%'] = grouped('PF_Satis').pct_change() * 100
+    panel['Rakip_Buyume_%'] = grouped('Rakip_Satis').pct_change() * 100
+    panel['Goreceli_Buyume_%'] = panel['PF_Buyume_%'] - panel['Rakip_Buyume_%']
+    
+    # Hareketli ortalamalar ve büyümeleri
+    for window in (3, 6, 12):
+        panel[f'MA_{window}'] = ungroup(rolling('PF_Satis', window).mean())
+    for window in (3, 6, 12):
+        panel[f'MA_{window}_Growth'] = grouped(f'MA_{window}').pct_change() * 100
+    
+    # Pazar Payı Hareketli Ortalamaları
+    panel['PP_MA_3'] = ungroup(rolling('Pazar_Payi_%', 3).mean())
+    panel['PP_MA_6'] = ungroup(rolling('Pazar_Payi_%', 6).mean())
+    
+    # Yıllık Büyüme (YoY) - aynı grubun 12 ay önceki dönemi
+    panel['DATE_DT'] = pd.to_datetime(panel['YIL_AY'] + '-01')
+    panel['Year'] = panel['DATE_DT'].dt.year
+    panel['Month'] = panel['DATE_DT'].dt.month
+    
+    month_period = pd.PeriodIndex(panel['DATE_DT'], freq='M')
+    keyed = panel[['PF_Satis', 'Rakip_Satis']].set_index([groups, month_period])
+    last_year = keyed.reindex(pd.MultiIndex.from_arrays([groups, month_period - 12]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        panel['YoY_PF_Growth'] = (panel['PF_Satis'].to_numpy() / last_year['PF_Satis'].to_numpy() - 1) * 100
+        panel['YoY_Rakip_Growth'] = (panel['Rakip_Satis'].to_numpy() / last_year['Rakip_Satis'].to_numpy() - 1) * 100
+    
+    # Mevsimsellik indeksi (en az 12 ayı olan gruplar)
+    group_size = grouped('PF_Satis').transform('size')
+    month_avg = panel.groupby([name_col, 'Month'])['PF_Satis'].mean()
+    seasonality_base = panel[name_col].map(month_avg.groupby(level=0).mean())
+    month_mean = panel.groupby([name_col, 'Month'])['PF_Satis'].transform('mean')
+    panel['Seasonality_Index'] = (month_mean / seasonality_base * 100).where((group_size >= 12) & (seasonality_base > 0))
+    
+    # Son 3/6 ay vs önceki 3/6 ay (her grubun son satırında)
+    is_last = ~groups.duplicated(keep='last')
+    for window in (3, 6):
+        recent = ungroup(rolling('PF_Satis', window, min_periods=window).mean())
+        previous = recent.groupby(groups, sort=False).shift(window)
+        panel[f'QoQ_Growth_{window}M'] = ((recent / previous - 1) * 100).where(is_last & (previous > 0))
+    
+    # Volatilite
+    panel['PF_Volatility'] = ungroup(rolling('PF_Satis', 6, min_periods=3).std())
+    panel['PF_CV'] = safe_divide(panel['PF_Volatility'], panel['PF_Satis']) * 100
+    
+    # Momentum indikatörleri
+    panel['Momentum_3M'] = panel['PF_Satis'] - grouped('PF_Satis').shift(3)
+    panel['Momentum_6M'] = panel['PF_Satis'] - grouped('PF_Satis').shift(6)
+    
+    # Performans skoru (basitleştirilmiş)
+    panel['Performance_Score'] = (
+        (panel['Pazar_Payi_%'] / 100) * 0.4 +
+        (np.minimum(panel['PF_Buyume_%'].fillna(0), 50) / 50) * 0.3 +
+        (1 - np.minimum(panel['PF_CV'].fillna(50), 100) / 100) * 0.3
+    ) * 100
+    
+    return panel
+
+def complete_monthly_series(months, values):
+    """Eksik ayları 0 ile doldurarak seriyi kesintisiz aylık dizine genişlet
+    
+    seasonal_decompose periyodu satır sayısıyla ölçer; boşluklu serilerde 12 satır 12 ay olmaz.
+    """
+    periods = pd.PeriodIndex(pd.to_datetime(pd.Series(months).astype(str), format='%Y-%m'), freq='M')
+    full = pd.period_range(periods.min(), periods.max(), freq='M')
+    filled = pd.Series(values, index=periods).reindex(full, fill_value=0.0)
+    return full.strftime('%Y-%m').to_numpy(), filled.to_numpy(dtype=float)
+
+def decompose_series_worker(task):
+    """Tek seri için toplamsal ayrıştırma ve ADF testi (süreç havuzu işçisi)"""
+    name, months, values, period = task
+    result = {'name': name, 'months': months, 'values': values, 'adf_stat': np.nan, 'adf_p': np.nan}
+    
+    try:
+        decomposition = seasonal_decompose(values, model='additive', period=period)
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+    
+    result['trend'] = np.asarray(decomposition.trend)
+    result['seasonal'] = np.asarray(decomposition.seasonal)
+    result['resid'] = np.asarray(decomposition.resid)
+    
+    try:
+        result['adf_stat'], result['adf_p'] = adfuller(values, autolag='AIC')[:2]
+    except Exception:
+        pass
+    
+    return result
+
+def calculate_seasonal_decomposition(df, product, date_filter=None, period=12, max_workers=None):
+    """Toplam seri ve tüm territory'ler için mevsimsel ayrıştırma + durağanlık testi
+    
+    (bileşenler, özet) döner; bileşenler uzun formattadır.
+    """
+    total = calculate_advanced_time_series(df, product, None, date_filter)
+    panel = calculate_panel_time_series(df, product, date_filter)
+    
+    series = [("TÜMÜ", total)] + list(panel.groupby('Territory', sort=True))
+    tasks = [(name, *complete_monthly_series(group['YIL_AY'], group['PF_Satis'].to_numpy(dtype=float)), period)
+             for name, group in series if len(group) > 0]
+    tasks = [task for task in tasks if len(task[2]) >= period * 2]
+    
+    components, summary = [], []
+    for result in run_in_process_pool(decompose_series_worker, tasks, max_workers):
+        if 'error' in result:
+            continue
+        
+        trend, seasonal, resid = result['trend'], result['seasonal'], result['resid']
+        components.append(pd.DataFrame({
+            'Territory': result['name'],
+            'YIL_AY': result['months'],
+            'PF_Satis': result['values'],
+            'Trend': trend,
+            'Mevsimsel': seasonal,
+            'Artik': resid
+        }))
+        
+        # Trend/mevsimsellik gücü: 1 - Var(artık) / Var(bileşen + artık)
+        resid_var = np.nanvar(resid)
+        seasonal_strength = max(0.0, 1 - resid_var / np.nanvar(seasonal + resid)) if np.nanvar(seasonal + resid) > 0 else 0.0
+        trend_strength = max(0.0, 1 - resid_var / np.nanvar(trend + resid)) if np.nanvar(trend + resid) > 0 else 0.0
+        
+        summary.append({
+            'Territory': result['name'],
+            'Ay_Sayisi': len(result['values']),
+            'Mevsimsel_Genlik': np.nanmax(seasonal) - np.nanmin(seasonal),
+            'Mevsimsellik_Gucu_%': seasonal_strength * 100,
+            'Trend_Gucu_%': trend_strength * 100,
+            'ADF_Istatistik': result['adf_stat'],
+            'ADF_p': result['adf_p'],
+            'Duragan': "Evet" if result['adf_p'] < 0.05 else "Hayır"
+        })
+    
+    if not components:
+        return pd.DataFrame(), pd.DataFrame()
+    return pd.concat(components, ignore_index=True), pd.DataFrame(summary)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_seasonal_decomposition(scope, _df, product, date_filter=None):
+    """Mevsimsel ayrıştırmayı yükleme/filtre kapsamı başına bir kez hesapla"""
+    return calculate_seasonal_decomposition(_df, product, date_filter)
+
+def build_series_matrix(panel, name_col, value_col):
+    """Uzun formatlı paneli (seri x ay) matrisine çevir
+    
+    Her seri kendi ilk ayından başlayarak sola hizalanır. (isimler, matris, uzunluklar) döner.
+    """
+    codes, names = pd.factorize(panel[name_col], sort=True)
+    position = panel.groupby(codes, sort=False).cumcount().to_numpy()
+    lengths = np.bincount(codes, minlength=len(names))
+    
+    matrix = np.full((len(names), lengths.max() if len(names) else 0), np.nan)
+    matrix[codes, position] = panel[value_col].to_numpy(dtype=float)
+    return names, matrix, lengths
+
+def calculate_trend_leaderboard(df, product, date_filter=None, level='TERRITORIES'):
+    """Tüm territory/şehir/manager serileri için toplu trend sınıflandırması"""
+    panel = calculate_panel_time_series(df, product, date_filter, level)
+    name_col = LEVEL_LABELS[level]
+    
+    names, pf, lengths = build_series_matrix(panel, name_col, 'PF_Satis')
+    if len(names) == 0:
+        return pd.DataFrame()
+    
+    leaderboard = pd.DataFrame({name_col: names, 'Ay_Sayisi': lengths})
+    
+    pf_slope, pf_mean = batch_trend_slopes(pf, lengths)
+    leaderboard['Son_PF_Satis'] = pf[np.arange(len(names)), lengths - 1]
+    leaderboard['Trend_Egimi'] = pf_slope
+    with np.errstate(divide='ignore', invalid='ignore'):
+        leaderboard['Trend_Egimi_%'] = np.where(pf_mean != 0, pf_slope / pf_mean * 100, 0)
+    leaderboard['Temel_Trend'] = batch_classify_trend(pf_slope, pf_mean, lengths)
+    
+    for value_col, label in [('MA_3', 'MA3_Trend'), ('MA_6', 'MA6_Trend'), ('Pazar_Payi_%', 'Pazar_Payi_Trendi')]:
+        _, matrix, _ = build_series_matrix(panel, name_col, value_col)
+        slope, mean = batch_trend_slopes(matrix, lengths)
+        leaderboard[label] = batch_classify_trend(slope, mean, lengths)
+    
+    # Volatilite (örneklem std / ortalama)
+    pf_std = np.nanstd(pf, axis=1, ddof=1) if pf.shape[1] > 1 else np.zeros(len(names))
+    cv = np.where((lengths > 1) & (pf_mean > 0), pf_std / np.where(pf_mean > 0, pf_mean, 1) * 100, 0)
+    leaderboard['CV_%'] = cv
+    leaderboard['Volatilite'] = np.select([cv < 20, cv < 50], ["Düşük", "Orta"], default="Yüksek")
+    
+    # Momentum (son ay - 3/6 ay önce)
+    rows = np.arange(len(names))
+    last = pf[rows, lengths - 1]
+    for months in (3, 6):
+        back = pf[rows, np.maximum(lengths - 1 - months, 0)]
+        leaderboard[f'Momentum_{months}M'] = np.where(lengths > months, last - back, 0)
+    
+    return leaderboard.sort_values('Trend_Egimi_%', ascending=False).reset_index(drop=True)
+
+def calculate_seasonality_scan(df, product, date_filter=None, level='TERRITORIES'):
+    """Tüm territory/şehir serileri için toplu mevsimsellik taraması"""
+    panel = calculate_panel_time_series(df, product, date_filter, level)
+    name_col = LEVEL_LABELS[level]
+    
+    names, pf, lengths = build_series_matrix(panel, name_col, 'PF_Satis')
+    labels, dominant_period, strength = batch_seasonality(pf, lengths)
+    
+    scan = pd.DataFrame({
+        name_col: names,
+        'Ay_Sayisi': lengths,
+        'Mevsimsellik': labels,
+        'Baskin_Periyot': np.round(dominant_period, 1),
+        'Mevsimsellik_Gucu_%': strength * 100
+    })
+    return scan.sort_values('Mevsimsellik_Gucu_%', ascending=False, na_position='last').reset_index(drop=True)
+
+# İstatistiksel tahmin ailesi (seri matrisi üzerinde vektörel)
+STAT_METHODS = ['Mevsimsel Naif', 'Drift', 'SES', 'Holt', 'Holt-Winters']
+STAT_PERIOD = 12
+STAT_EVAL_START = 13  # Tüm yöntemlerin tek adım tahmininin tanımlı olduğu ilk ay
+STAT_ALPHA_GRID = np.round(np.arange(0.1, 1.0, 0.1), 2)
+STAT_BETA_GRID = np.array([0.05, 0.1, 0.2, 0.3])
+STAT_GAMMA_GRID = np.array([0.05, 0.1, 0.2, 0.3])
+
+def smoothing_pass(values, lengths, alpha, beta, gamma, trend, seasonal, period=STAT_PERIOD, keep_one_step=False):
+    """Toplamsal üssel düzeltme özyinelemesi; seriler x parametre kombinasyonu üzerinde tek zaman döngüsü
+    
+    values sola hizalı (seri x ay) matristir; alpha/beta/gamma (seri veya 1) x kombinasyon dizileridir.
+    (kare hata toplamı, tek adım tahminleri, son seviye, son trend, son mevsimsel bileşenler) döner;
+    mevsimsel bileşenler (periyot x seri x kombinasyon) biçimindedir. Tek adım tahminleri yalnızca
+    keep_one_step ile tutulur (ızgara aramasında bellek için kapalı).
+    """
+    n_series, n_months = values.shape
+    shape = np.broadcast(alpha, beta, gamma, np.empty((n_series, 1))).shape
+    
+    if seasonal:
+        first = np.nanmean(values[:, :period], axis=1)[:, None]
+        second = np.nanmean(values[:, period:2 * period], axis=1)[:, None] if n_months >= 2 * period else first
+        level = np.broadcast_to(first, shape).copy()
+        slope = np.broadcast_to((second - first) / period if trend else 0.0, shape).copy()
+        season = np.broadcast_to((values[:, :period] - first).T[:, :, None], (period,) + shape).copy()
+        start = period
+    else:
+        level = np.broadcast_to(values[:, :1], shape).copy()
+        slope = np.zeros(shape)
+        season = np.zeros((period,) + shape)
+        start = 1
+    
+    sse = np.zeros(shape)
+    one_step = np.full(shape + (n_months,), np.nan) if keep_one_step else None
+    
+    # Seri bittikten sonra değerler NaN olur; durum her serinin son ayında saklanır
+    ends = lengths - 1
+    final_level, final_slope, final_season = level.copy(), slope.copy(), season.copy()
+    
+    for t in range(start, n_months):
+        y = values[:, t][:, None]
+        s_t = season[t % period]
+        
+        prediction = level + slope + s_t
+        if keep_one_step:
+            one_step[..., t] = prediction
+        
+        error = y - prediction
+        squared = error * error
+        np.add(sse, squared, out=sse, where=~np.isnan(squared))
+        
+        new_level = level + slope + alpha * error
+        if trend:
+            slope = slope + beta * (new_level - level - slope)
+        if seasonal:
+            season[t % period] = s_t + gamma * (y - new_level - s_t)
+        level = new_level
+        
+        done = ends == t
+        if done.any():
+            final_level[done] = level[done]
+            final_slope[done] = slope[done]
+            final_season[:, done] = season[:, done]
+    
+    return sse, one_step, final_level, final_slope, final_season
+
+def statistical_forecast_matrix(values, lengths, forecast_periods=6, period=STAT_PERIOD):
+    """Mevsimsel naif, drift, SES, Holt ve Holt-Winters'ı tüm seriler için birlikte uygula
+    
+    Düzeltme parametreleri seri başına ızgara aramasıyla (tek adım kare hata) seçilir.
+    {yöntem: tahmin matrisi (seri x ufuk)} ve {yöntem: tek adım MAPE'si (STAT_EVAL_START sonrası)} döner.
+    """
+    n_series, n_months = values.shape
+    rows = np.arange(n_series)
+    last_idx = np.maximum(lengths - 1, 0)
+    last = values[rows, last_idx]
+    steps = np.arange(1, forecast_periods + 1)
+    
+    forecasts, one_steps = {}, {}
+    
+    # Mevsimsel naif: bir yıl önceki aynı ay
+    season_idx = lengths[:, None] - period + (steps[None, :] - 1) % period
+    forecasts['Mevsimsel Naif'] = np.where(lengths[:, None] >= period,
+                                           values[rows[:, None], np.maximum(season_idx, 0)], np.nan)
+    one_step = np.full(values.shape, np.nan)
+    one_step[:, period:] = values[:, :-period] if n_months > period else one_step[:, period:]
+    one_steps['Mevsimsel Naif'] = one_step
+    
+    # Drift: ilk ve son gözlemi birleştiren doğru
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drift = (last - values[:, 0]) / (lengths - 1)
+        forecasts['Drift'] = last[:, None] + drift[:, None] * steps[None, :]
+        months = np.arange(n_months)
+        one_step = np.full(values.shape, np.nan)
+        one_step[:, 2:] = values[:, 1:-1] + (values[:, 1:-1] - values[:, :1]) / months[1:-1]
+        one_steps['Drift'] = one_step
+    
+    # Üssel düzeltme ailesi - ızgara araması, ardından seçilen parametrelerle son geçiş
+    specs = {
+        'SES': (STAT_ALPHA_GRID, np.zeros(1), np.zeros(1), False, False, 0),
+        'Holt': (STAT_ALPHA_GRID, STAT_BETA_GRID, np.zeros(1), True, False, 0),
+        'Holt-Winters': (STAT_ALPHA_GRID, STAT_BETA_GRID, STAT_GAMMA_GRID, True, True, 2 * period),
+    }
+    for method, (alphas, betas, gammas, trend, seasonal, min_months) in specs.items():
+        grid = np.array(np.meshgrid(alphas, betas, gammas, indexing='ij')).reshape(3, -1)
+        
+        if seasonal and n_months < min_months:
+            forecasts[method] = np.full((n_series, forecast_periods), np.nan)
+            one_steps[method] = np.full(values.shape, np.nan)
+            continue
+        
+        sse = smoothing_pass(values, lengths, grid[0][None, :], grid[1][None, :], grid[2][None, :], trend, seasonal, period)[0]
+        best = np.argmin(sse, axis=1)
+        _, one_step, level, slope, season = smoothing_pass(
+            values, lengths, grid[0][best][:, None], grid[1][best][:, None], grid[2][best][:, None], trend, seasonal, period,
+            keep_one_step=True)
+        
+        future_season = season[(lengths[:, None] + steps[None, :] - 1) % period, rows[:, None], 0]
+        forecast = level + slope * steps[None, :] + future_season
+        valid = (lengths >= min_months)[:, None]
+        forecasts[method] = np.where(valid, forecast, np.nan)
+        one_steps[method] = np.where(valid, one_step[:, 0, :], np.nan)
+    
+    # Karşılaştırılabilir tek adım MAPE'si (tüm yöntemler için aynı pencere)
+    months = np.arange(n_months)[None, :]
+    window = (months >= STAT_EVAL_START) & (months < lengths[:, None])
+    mape = {}
+    with np.errstate(invalid='ignore'):
+        for method in STAT_METHODS:
+            ape = np.abs(values - one_steps[method]) / np.maximum(values, 1) * 100
+            ape = np.where(window, ape, np.nan)
+            counts = np.sum(window & ~np.isnan(ape), axis=1)
+            mape[method] = np.where(counts > 0, np.nansum(ape, axis=1) / np.maximum(counts, 1), np.nan)
+        
+        for method in STAT_METHODS:
+            forecasts[method] = np.maximum(forecasts[method], 0)
+    
+    return forecasts, mape
+
+def select_statistical_forecast(forecasts, mape):
+    """Seri başına en düşük tek adım MAPE'li yöntem: (yöntem adları, tahmin matrisi, MAPE) döner"""
+    mape_matrix = np.column_stack([mape[method] for method in STAT_METHODS])
+    usable = ~np.isnan(mape_matrix)
+    best = np.argmin(np.where(usable, mape_matrix, np.inf), axis=1)
+    rows = np.arange(len(best))
+    
+    stacked = np.stack([forecasts[method] for method in STAT_METHODS], axis=1)
+    methods = np.where(usable.any(axis=1), np.array(STAT_METHODS, dtype=object)[best], None)
+    return methods, stacked[rows, best], mape_matrix[rows, best]
+
+def calculate_statistical_forecast(df, product, date_filter=None, level='TERRITORIES', forecast_periods=6):
+    """İstatistiksel yöntem ailesiyle portföy tahmini; calculate_portfolio_forecast ile aynı (tahminler, özet) biçimi"""
+    name_col = LEVEL_LABELS[level]
+    panel = calculate_panel_time_series(df, product, date_filter, level)
+    
+    names, pf, lengths = build_series_matrix(panel, name_col, 'PF_Satis')
+    forecasts, mape = statistical_forecast_matrix(pf, lengths, forecast_periods)
+    methods, forecast, best_mape = select_statistical_forecast(forecasts, mape)
+    fitted = methods != None  # noqa: E711 - object dizisinde eleman bazlı karşılaştırma
+    
+    last_periods = pd.PeriodIndex(panel.groupby(name_col, sort=True)['DATE'].max(), freq='M')
+    steps = np.arange(1, forecast_periods + 1)
+    periods = pd.PeriodIndex(np.repeat(last_periods.to_numpy(), forecast_periods)) + np.tile(steps - 1, len(names)) + 1
+    
+    table = pd.DataFrame({
+        name_col: np.repeat(names, forecast_periods),
+        'DATE': periods.to_timestamp(),
+        'YIL_AY': periods.strftime('%Y-%m'),
+        'PF_Tahmin': forecast.ravel(),
+        'Model': np.repeat(methods, forecast_periods),
+        'MAPE': np.repeat(best_mape, forecast_periods)
+    })
+    table = table[np.repeat(fitted, forecast_periods)].reset_index(drop=True)
+    
+    summary = pd.DataFrame({
+        name_col: names,
+        'Ay_Sayisi': lengths,
+        'Model': methods,
+        'MAPE': best_mape,
+        'MAE': np.nan,
+        'R2': np.nan,
+        'Toplam_Tahmin': np.where(fitted, forecast.sum(axis=1), np.nan),
+        'Durum': np.where(fitted, "Tamam", "Yetersiz veri")
+    })
+    summary = summary.sort_values('Toplam_Tahmin', ascending=False, na_position='last').reset_index(drop=True)
+    return table, summary
+
 def perform_trend_analysis(monthly_df):
     """Detaylı trend analizi"""
     if len(monthly_df) < 6:
@@ -895,10 +1566,53 @@ def create_comparative_analysis(monthly_df, periods=[3, 6, 12]):
 # DATA LOADING
 # =============================================================================
 
-@st.cache_data
-def load_excel_data(file):
-    """Excel dosyasını yükle"""
-    df = pd.read_excel(file)
+def hash_file_bytes(file_bytes):
+    """Dosya içeriğinin SHA-256 özeti (önbellek anahtarı)"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def get_data_cache_path(dataset_hash, compact=True):
+    """Veri setinin kolonlu önbellek dosyası"""
+    suffix = ".compact" if compact else ""
+    return DATA_CACHE_DIR / f"{dataset_hash}{suffix}.parquet"
+
+def read_columnar_cache(dataset_hash, compact=True):
+    """Önbellekteki Parquet dosyasını memory-map ile oku"""
+    if not PARQUET_AVAILABLE:
+        return None
+    
+    path = get_data_cache_path(dataset_hash, compact)
+    if not path.exists():
+        return None
+    
+    try:
+        df = pd.read_parquet(path, engine='pyarrow', memory_map=True)
+    except Exception:
+        # Bozuk önbellek dosyası - Excel'den yeniden üretilecek
+        return None
+    
+    # Kompakt gösterimde YIL_AY aylık Period'dur; diğer moda ait kayıt yeniden üretilir
+    if isinstance(df['YIL_AY'].dtype, pd.PeriodDtype) != compact:
+        return None
+    return df
+
+def write_columnar_cache(df, dataset_hash, compact=True):
+    """Türetilmiş kolonlarla birlikte veri setini Parquet olarak kaydet"""
+    if not PARQUET_AVAILABLE:
+        return
+    
+    path = get_data_cache_path(dataset_hash, compact)
+    tmp_path = path.with_suffix('.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(tmp_path, engine='pyarrow', index=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        # Önbellek yazılamazsa uygulama normal çalışmaya devam eder
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def prepare_sales_frame(df):
+    """Ham satış verisine türetilmiş kolonları ekle"""
     df['DATE'] = pd.to_datetime(df['DATE'])
     df['YIL_AY'] = df['DATE'].dt.strftime('%Y-%m')
     df['AY'] = df['DATE'].dt.month
@@ -906,12 +1620,179 @@ def load_excel_data(file):
     
     df['TERRITORIES'] = df['TERRITORIES'].str.upper().str.strip()
     df['CITY'] = df['CITY'].str.strip()
-    df['CITY_NORMALIZED'] = df['CITY'].apply(normalize_city_name_fixed)
+    df['CITY_NORMALIZED'] = normalize_city_column(df['CITY'])
     df['REGION'] = df['REGION'].str.upper().str.strip()
     df['MANAGER'] = df['MANAGER'].str.upper().str.strip()
     
     return df
 
+def compact_sales_frame(df):
+    """Kompakt gösterim: kategorik boyutlar, küçük tamsayı YIL/AY,
+    YIL_AY yerine aylık Period anahtarı ve float32 ölçüler"""
+    for col in MEASURE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+    
+    for col in DIMENSION_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    
+    df['YIL_AY'] = df['DATE'].dt.to_period('M')
+    df['AY'] = df['AY'].astype('int8')
+    df['YIL'] = df['YIL'].astype('int16')
+    
+    return df
+
+def concat_compact_chunks(chunks):
+    """Parçaları birleştir; kategorik kolonlar ortak kategori kümesine taşınır"""
+    if len(chunks) == 1:
+        return chunks[0]
+    
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            categories = union_categoricals([chunk[col] for chunk in chunks], sort_categories=True).categories
+            for chunk in chunks:
+                chunk[col] = chunk[col].cat.set_categories(categories)
+    
+    return pd.concat(chunks, ignore_index=True)
+
+def read_excel_streaming(file, compact=True, chunk_rows=STREAM_CHUNK_ROWS):
+    """Büyük çalışma kitaplarını openpyxl read-only modunda parça parça oku
+    
+    Her parça ayrı ayrı türetilir, normalize edilir ve compact=True iken kompakt
+    gösterime çevrilir; böylece bellekte aynı anda en fazla bir ham parça ve kompakt
+    veri seti bulunur. compact=False iken kolon tipleri küçük dosyalardaki
+    pd.read_excel yolu ile aynıdır. Ham parçaların toplam boyutu bellek raporu için
+    'before_mb' olarak saklanır.
+    """
+    from openpyxl import load_workbook
+    
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        n_cols = len(header)
+        
+        chunks, buffer = [], []
+        raw_mb = 0.0
+        for row in rows:
+            if row is None or all(value is None for value in row):
+                continue
+            buffer.append(row[:n_cols] + (None,) * (n_cols - len(row)))
+            
+            if len(buffer) >= chunk_rows:
+                chunk = prepare_sales_frame(pd.DataFrame.from_records(buffer, columns=header))
+                raw_mb += memory_usage_mb(chunk)
+                chunks.append(compact_sales_frame(chunk) if compact else chunk)
+                buffer = []
+        
+        if buffer or not chunks:
+            chunk = prepare_sales_frame(pd.DataFrame.from_records(buffer, columns=header))
+            raw_mb += memory_usage_mb(chunk)
+            chunks.append(compact_sales_frame(chunk) if compact else chunk)
+    finally:
+        wb.close()
+    
+    df = concat_compact_chunks(chunks)
+    df.attrs['memory_report'] = {'before_mb': raw_mb, 'after_mb': memory_usage_mb(df)}
+    return df
+
+@st.cache_data
+def load_excel_data(file, compact=True):
+    """Excel dosyasını yükle
+    
+    Her yükleme içerik özetiyle (SHA-256) anahtarlanır. İlk yüklemede Excel
+    okunur ve türetilmiş kolonlarla (YIL_AY, AY, YIL, CITY_NORMALIZED) birlikte
+    Parquet önbelleğine yazılır; sonraki oturumlar ve yeniden başlatmalar
+    Excel'i hiç parse etmeden bu dosyayı memory-map ile okur. Büyük .xlsx
+    dosyaları read_excel_streaming ile parça parça okunur; kolon tipleri
+    dosya boyutuna değil yalnızca compact'a bağlıdır.
+    
+    compact=True iken veri compact_sales_frame ile küçültülür; dönüşüm
+    öncesi/sonrası bellek kullanımı df.attrs['memory_report'] içinde döner.
+    Dönen veri tarihe göre sıralıdır ve DATE üzerinde sıralı indekse sahiptir.
+    """
+    file_bytes = file.getvalue()
+    dataset_hash = hash_file_bytes(file_bytes)
+    
+    df = read_columnar_cache(dataset_hash, compact)
+    if df is None:
+        is_xlsx = not str(getattr(file, 'name', '')).lower().endswith('.xls')
+        if is_xlsx and len(file_bytes) >= STREAMING_THRESHOLD_BYTES:
+            df = read_excel_streaming(BytesIO(file_bytes), compact)
+        else:
+            df = prepare_sales_frame(pd.read_excel(BytesIO(file_bytes)))
+            memory_before = memory_usage_mb(df)
+            if compact:
+                df = compact_sales_frame(df)
+            df.attrs['memory_report'] = {'before_mb': memory_before, 'after_mb': memory_usage_mb(df)}
+        df = df.sort_values('DATE', kind='stable', ignore_index=True)
+        write_columnar_cache(df, dataset_hash, compact)
+    
+    df = index_by_date(df)
+    
+    if 'memory_report' not in df.attrs:
+        df.attrs['memory_report'] = {'before_mb': None, 'after_mb': memory_usage_mb(df)}
+    
+    df.attrs['dataset_hash'] = dataset_hash
+    return df
+
+# Küpün granülaritesi: ay × territory × şehir × bölge × manager
+CUBE_DIMENSIONS = ['YIL_AY', 'TERRITORIES', 'CITY', 'CITY_NORMALIZED', 'REGION', 'MANAGER']
+
+def build_sales_cube(df):
+    """Tüm ürün ve rakip ölçülerini içeren önceden toplanmış OLAP küpü
+    
+    Analiz fonksiyonları ham veri ile aynı kolon adlarını kullandığından küp
+    üzerinde değişiklik olmadan çalışır. DATE kolonu her ayın ilk tarihini
+    taşır; tarih filtreleri küp üzerinde ay çözünürlüğünde uygulanır.
+    """
+    measures = [col for col in MEASURE_COLUMNS if col in df.columns]
+    agg_spec = {col: 'sum' for col in measures}
+    
+    cube = df.groupby(CUBE_DIMENSIONS, observed=True, dropna=False).agg(agg_spec).reset_index()
+    cube[measures] = cube[measures].astype('float64')
+    cube['DATE'] = month_start(cube['YIL_AY'])
+    
+    return index_by_date(cube.sort_values('DATE', kind='stable'))
+
+@st.cache_data(show_spinner=False, persist="disk")
+def load_sales_cube(dataset_hash, compact, _df):
+    """Yükleme başına bir kez küp oluştur (veri seti özetiyle anahtarlanır)"""
+    return build_sales_cube(_df)
+
+# Sidebar filtrelerinin kullandığı boyutlar
+FILTER_COLUMNS = ['TERRITORIES', 'REGION', 'MANAGER']
+
+def build_filter_index(df, columns=FILTER_COLUMNS):
+    """Her filtre değeri için sıralı satır pozisyonu listeleri (ters indeks)"""
+    return {
+        col: {value: positions.astype(np.int32) for value, positions in df.groupby(col, observed=True).indices.items()}
+        for col in columns
+    }
+
+@st.cache_data(show_spinner=False)
+def load_filter_index(dataset_hash, compact, _cube):
+    """Küp için filtre indeksini yükleme başına bir kez oluştur"""
+    return build_filter_index(_cube)
+
+def apply_filter_index(df, filter_index, selections):
+    """Seçili filtre değerlerinin satır listelerini kesiştirerek veriyi süz
+    
+    Hiç filtre seçilmemişse veri kopyalanmadan aynen döner; aksi halde yalnızca
+    eşleşen satırlar (tarih sırası korunarak) alınır.
+    """
+    positions = None
+    for col, value in selections.items():
+        if value == "TÜMÜ":
+            continue
+        rows = filter_index[col].get(value, np.empty(0, dtype=np.int32))
+        positions = rows if positions is None else np.intersect1d(positions, rows, assume_unique=True)
+    
+    if positions is None:
+        return df
+    return df.iloc[positions]
+
 @st.cache_resource
 def load_geojson_gpd():
     """GeoPandas ile GeoJSON yükle"""
@@ -979,7 +1860,7 @@ def create_modern_turkey_map(city_data, gdf, title="Türkiye Satış Haritası",
     
     # Veriyi hazırla
     city_data = city_data.copy()
-    city_data['City_Fixed'] = city_data['City'].apply(normalize_city_name_fixed)
+    city_data['City_Fixed'] = normalize_city_column(city_data['City']).astype(object)
     city_data['City_Fixed'] = city_data['City_Fixed'].str.upper()
     
     # Eksik şehirleri kontrol et ve ekle
@@ -1194,29 +2075,52 @@ def create_modern_turkey_map(city_data, gdf, title="Türkiye Satış Haritası",
 # ML FEATURE ENGINEERING - GELİŞTİRİLMİŞ
 # =============================================================================
 
+# Modelde kullanılan feature'lar (sıra, tahmin tamponundaki vektörün sırasıdır)
+ML_FEATURE_COLUMNS = [
+    'lag_1', 'lag_2', 'lag_3', 'lag_6', 'lag_12',
+    'rolling_mean_3', 'rolling_mean_6', 'rolling_mean_12',
+    'rolling_std_3', 'rolling_std_6',
+    'ema_3', 'ema_6',
+    'month', 'quarter', 'year',
+    'month_sin', 'month_cos',
+    'trend_index',
+    'growth_1m', 'growth_3m',
+    'momentum_3m', 'momentum_6m',
+    'volatility_3m'
+]
+ML_LAGS = [1, 2, 3, 4, 5, 6, 12]
+ML_WINDOWS = [3, 6, 12]
+ML_EMA_SPANS = [3, 6, 12]
+ML_WARMUP = max(ML_LAGS)  # Tüm lag'leri gerçek geçmişten gelmeyen ilk aylar eğitime alınmaz
+
 def create_advanced_ml_features(df):
-    """GELİŞTİRİLMİŞ ML için feature oluştur"""
+    """GELİŞTİRİLMİŞ ML için feature oluştur
+    
+    Satır t'deki tüm feature'lar yalnızca t-1 ve öncesinden hesaplanır (hedef sızıntısı yok),
+    böylece aynı feature'lar tahmin sırasında ileriye doğru üretilebilir. Lag'leri eksik olan ilk
+    ML_WARMUP ay geriye doldurulmak yerine atılır; dönen satır i, serinin ML_WARMUP + i. ayıdır.
+    """
     df = df.copy()
     df = df.sort_values('DATE').reset_index(drop=True)
+    past = df['PF_Satis'].shift(1)
     
     # Lag features (3, 6, 12 ay)
-    for lag in [1, 2, 3, 4, 5, 6, 12]:
+    for lag in ML_LAGS:
         if lag < len(df):
             df[f'lag_{lag}'] = df['PF_Satis'].shift(lag)
     
     # Rolling statistics
-    windows = [3, 6, 12]
-    for window in windows:
+    for window in ML_WINDOWS:
         if window <= len(df):
-            df[f'rolling_mean_{window}'] = df['PF_Satis'].rolling(window=window, min_periods=1).mean()
-            df[f'rolling_std_{window}'] = df['PF_Satis'].rolling(window=window, min_periods=1).std()
-            df[f'rolling_min_{window}'] = df['PF_Satis'].rolling(window=window, min_periods=1).min()
-            df[f'rolling_max_{window}'] = df['PF_Satis'].rolling(window=window, min_periods=1).max()
+            df[f'rolling_mean_{window}'] = past.rolling(window=window, min_periods=1).mean()
+            df[f'rolling_std_{window}'] = past.rolling(window=window, min_periods=1).std()
+            df[f'rolling_min_{window}'] = past.rolling(window=window, min_periods=1).min()
+            df[f'rolling_max_{window}'] = past.rolling(window=window, min_periods=1).max()
     
     # Exponential moving averages
-    for span in [3, 6, 12]:
+    for span in ML_EMA_SPANS:
         if span <= len(df):
-            df[f'ema_{span}'] = df['PF_Satis'].ewm(span=span, adjust=False).mean()
+            df[f'ema_{span}'] = past.ewm(span=span, adjust=False).mean()
     
     # Date features
     df['month'] = df['DATE'].dt.month
@@ -1236,63 +2140,113 @@ def create_advanced_ml_features(df):
     
     # Interaction features
     if 'Pazar_Payi_%' in df.columns:
-        df['share_trend'] = df['Pazar_Payi_%'].rolling(window=3, min_periods=1).mean()
+        df['share_trend'] = df['Pazar_Payi_%'].shift(1).rolling(window=3, min_periods=1).mean()
     
     # Growth features
-    df['growth_1m'] = df['PF_Satis'].pct_change(periods=1) * 100
-    df['growth_3m'] = df['PF_Satis'].pct_change(periods=3) * 100
-    df['growth_6m'] = df['PF_Satis'].pct_change(periods=6) * 100
+    df['growth_1m'] = past.pct_change(periods=1) * 100
+    df['growth_3m'] = past.pct_change(periods=3) * 100
+    df['growth_6m'] = past.pct_change(periods=6) * 100
     
     # Momentum features
     if len(df) >= 3:
-        df['momentum_3m'] = df['PF_Satis'] - df['PF_Satis'].shift(3)
-        df['momentum_6m'] = df['PF_Satis'] - df['PF_Satis'].shift(6)
+        df['momentum_3m'] = past - past.shift(3)
+        df['momentum_6m'] = past - past.shift(6)
     
     # Volatility features
-    df['volatility_3m'] = df['PF_Satis'].rolling(window=3, min_periods=1).std()
-    df['volatility_6m'] = df['PF_Satis'].rolling(window=6, min_periods=1).std()
+    df['volatility_3m'] = past.rolling(window=3, min_periods=1).std()
+    df['volatility_6m'] = past.rolling(window=6, min_periods=1).std()
     
-    # Fill NaN
-    df = df.fillna(method='bfill').fillna(method='ffill').fillna(0)
+    # Isınma aylarını at (geriye doldurma gelecekteki değerleri sızdırırdı); sıfır aydan
+    # bölünen büyüme oranları (±inf) next_step_features ile aynı şekilde 0 yapılır
+    df = df.iloc[ML_WARMUP:].reset_index(drop=True)
+    df = df.replace([np.inf, -np.inf], 0).fillna(0)
     
     return df
 
-def train_advanced_ml_models(df, forecast_periods=3):
-    """GELİŞTİRİLMİŞ ML modelleri ile tahmin"""
-    if len(df) < 24:  # En az 2 yıllık veri
-        return None, None, None
+def next_step_features(buffer, t, month, year, ema_states, trend_index=None):
+    """Tampondaki ilk t değerden t. adımın feature'larını hesapla
     
-    df_features = create_advanced_ml_features(df)
+    create_advanced_ml_features ile aynı tanımlar; ema_states, t-1'e kadar güncellenmiş EMA değerleridir.
+    buffer 2 boyutlu (seri x ay) olabilir; bu durumda month/year/trend_index seri başına dizilerdir.
+    """
+    features = {f'lag_{lag}': buffer[..., t - lag] for lag in ML_LAGS}
+    
+    for window in ML_WINDOWS:
+        values = buffer[..., t - window:t]
+        features[f'rolling_mean_{window}'] = values.mean(axis=-1)
+        features[f'rolling_std_{window}'] = values.std(ddof=1, axis=-1)
+        features[f'rolling_min_{window}'] = values.min(axis=-1)
+        features[f'rolling_max_{window}'] = values.max(axis=-1)
+    
+    for span in ML_EMA_SPANS:
+        features[f'ema_{span}'] = ema_states[span]
+    
+    quarter = (month - 1) // 3 + 1
+    features.update({
+        'month': month,
+        'quarter': quarter,
+        'year': year,
+        'month_sin': np.sin(2 * np.pi * month / 12),
+        'month_cos': np.cos(2 * np.pi * month / 12),
+        'quarter_sin': np.sin(2 * np.pi * quarter / 4),
+        'quarter_cos': np.cos(2 * np.pi * quarter / 4),
+        'trend_index': t if trend_index is None else trend_index,
+        'is_q1': 1 * (quarter == 1),
+        'is_q2': 1 * (quarter == 2),
+        'is_q3': 1 * (quarter == 3),
+        'is_q4': 1 * (quarter == 4),
+    })
     
-    # Feature selection
-    feature_cols = [
-        'lag_1', 'lag_2', 'lag_3', 'lag_6', 'lag_12',
-        'rolling_mean_3', 'rolling_mean_6', 'rolling_mean_12',
-        'rolling_std_3', 'rolling_std_6',
-        'ema_3', 'ema_6',
-        'month', 'quarter', 'year',
-        'month_sin', 'month_cos',
-        'trend_index',
-        'growth_1m', 'growth_3m',
-        'momentum_3m', 'momentum_6m',
-        'volatility_3m'
-    ]
+    last = buffer[..., t - 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for months in [1, 3, 6]:
+            growth = (last / buffer[..., t - 1 - months] - 1) * 100
+            features[f'growth_{months}m'] = np.where(np.isfinite(growth), growth, 0.0)
+    features['momentum_3m'] = last - buffer[..., t - 4]
+    features['momentum_6m'] = last - buffer[..., t - 7]
+    features['volatility_3m'] = features['rolling_std_3']
+    features['volatility_6m'] = features['rolling_std_6']
+    
+    return features
+
+def recursive_forecast(model, feature_cols, history, forecast_periods):
+    """Modeli ay ay ileri yuvarlayarak tahmin et
     
-    # Sadece mevcut kolonları kullan
-    available_cols = [col for col in feature_cols if col in df_features.columns]
+    Seri önceden ayrılmış bir tampona kopyalanır; her adımda yalnızca yeni satırın feature'ları
+    hesaplanır ve tahmin tampona yazılarak sonraki adımın lag/rolling girdisi olur.
+    """
+    values = history['PF_Satis'].to_numpy(dtype=float)
+    n = len(values)
     
-    # Train/Test split (zaman bazlı - son %20 test)
-    split_idx = int(len(df_features) * 0.8)
+    buffer = np.empty(n + forecast_periods)
+    buffer[:n] = values
     
-    train_df = df_features.iloc[:split_idx]
-    test_df = df_features.iloc[split_idx:]
+    # Geçmişe kaydırılmış EMA'nın bir sonraki adımdaki değeri = tüm geçmişin EMA'sı
+    ema_states = {span: history['PF_Satis'].ewm(span=span, adjust=False).mean().iloc[-1] for span in ML_EMA_SPANS}
+    alphas = {span: 2 / (span + 1) for span in ML_EMA_SPANS}
     
-    X_train = train_df[available_cols]
-    y_train = train_df['PF_Satis']
-    X_test = test_df[available_cols]
-    y_test = test_df['PF_Satis']
+    last_date = history['DATE'].iloc[-1]
+    dates = [last_date + pd.DateOffset(months=i+1) for i in range(forecast_periods)]
+    row = np.empty((1, len(feature_cols)))
     
-    # Gelişmiş modeller
+    for step, date in enumerate(dates):
+        t = n + step
+        features = next_step_features(buffer, t, date.month, date.year, ema_states)
+        row[0] = [features[col] for col in feature_cols]
+        
+        # Negatif olmamasını sağla
+        buffer[t] = max(0.0, float(model.predict(row)[0]))
+        
+        for span in ML_EMA_SPANS:
+            ema_states[span] = alphas[span] * buffer[t] + (1 - alphas[span]) * ema_states[span]
+    
+    return dates, buffer[n:]
+
+def build_forecast_models(n_jobs=-1, params=None):
+    """Aday modellerin eğitilmemiş örnekleri
+    
+    params verilirse ({model adı: hiperparametreler}) varsayılanların üzerine yazılır.
+    """
     models = {
         'Linear Regression': LinearRegression(),
         'Ridge Regression': Ridge(alpha=1.0),
@@ -1301,64 +2255,92 @@ def train_advanced_ml_models(df, forecast_periods=3):
             random_state=42,
             max_depth=10,
             min_samples_split=5,
-            n_jobs=-1
+            n_jobs=n_jobs
         )
     }
+    for name, overrides in (params or {}).items():
+        if name in models:
+            models[name].set_params(**overrides)
+    return models
+
+def evaluate_forecast_model(model, X_test, y_test):
+    """Test dönemi metrikleri (negatif tahminler 0'a çekilir)"""
+    y_pred = np.maximum(model.predict(X_test), 0)
+    
+    return {
+        'model': model,
+        'MAE': mean_absolute_error(y_test, y_pred),
+        'RMSE': np.sqrt(mean_squared_error(y_test, y_pred)),
+        'MAPE': np.mean(np.abs((y_test - y_pred) / np.maximum(y_test, 1))) * 100,
+        'R2': r2_score(y_test, y_pred),
+        'y_pred': y_pred
+    }
+
+def fit_forecast_models(df, n_jobs=-1, report_errors=True, params=None):
+    """Modelleri eğit ve test dönemi metriklerini hesapla (tahmin ufkundan bağımsız)
+    
+    Süreç havuzu işçilerinden çağrılırken n_jobs=1 ve report_errors=False verilir.
+    """
+    if len(df) < 24:  # En az 2 yıllık veri
+        return None, None
+    
+    df_features = create_advanced_ml_features(df)
+    
+    # Sadece mevcut kolonları kullan
+    available_cols = [col for col in ML_FEATURE_COLUMNS if col in df_features.columns]
+    
+    # Train/Test split (zaman bazlı - son %20 test)
+    split_idx = int(len(df_features) * 0.8)
+    
+    train_df = df_features.iloc[:split_idx]
+    test_df = df_features.iloc[split_idx:]
+    
+    X_train = train_df[available_cols].to_numpy()
+    y_train = train_df['PF_Satis']
+    X_test = test_df[available_cols].to_numpy()
+    y_test = test_df['PF_Satis']
+    
+    models = build_forecast_models(n_jobs, params)
     
     results = {}
     
     for name, model in models.items():
         try:
             model.fit(X_train, y_train)
-            y_pred = model.predict(X_test)
-            
-            # Negatif tahminleri 0 yap
-            y_pred = np.maximum(y_pred, 0)
-            
-            mae = mean_absolute_error(y_test, y_pred)
-            rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-            mape = np.mean(np.abs((y_test - y_pred) / np.maximum(y_test, 1))) * 100
-            r2 = r2_score(y_test, y_pred)
-            
-            results[name] = {
-                'model': model,
-                'MAE': mae,
-                'RMSE': rmse,
-                'MAPE': mape,
-                'R2': r2,
-                'y_pred': y_pred
-            }
+            results[name] = evaluate_forecast_model(model, X_test, y_test)
+            results[name]['features'] = available_cols
         except Exception as e:
-            st.warning(f"{name} modeli eğitilemedi: {str(e)}")
+            if report_errors:
+                st.warning(f"{name} modeli eğitilemedi: {str(e)}")
             continue
     
     if not results:
-        return None, None, None
+        return None, None
     
     # En iyi model (MAPE'e göre)
     best_model_name = min(results.keys(), key=lambda x: results[x]['MAPE'])
-    best_model = results[best_model_name]['model']
     
-    # Gelecek tahmin için basitleştirilmiş yöntem
-    forecast_data = []
-    last_date = df_features['DATE'].iloc[-1]
-    last_values = df_features['PF_Satis'].values[-6:]  # Son 6 ay
+    # Seçilen modeli tahmin için tüm geçmişle yeniden eğit
+    best = results[best_model_name]
+    try:
+        best['final_model'] = clone(best['model']).fit(df_features[available_cols].to_numpy(), df_features['PF_Satis'])
+    except Exception:
+        best['final_model'] = best['model']
     
-    for i in range(forecast_periods):
-        next_date = last_date + pd.DateOffset(months=i+1)
-        
-        # Basit bir projeksiyon: son 6 ayın ortalaması * mevsimsellik faktörü
-        if len(last_values) > 0:
-            base_value = np.mean(last_values)
-            month = next_date.month
-            # Mevsimsellik faktörü (basit)
-            seasonal_factor = 1.0 + 0.1 * np.sin(2 * np.pi * month / 12)
-            next_pred = base_value * seasonal_factor
-        else:
-            next_pred = df_features['PF_Satis'].iloc[-1]
-        
-        next_pred = max(0, next_pred)  # Negatif olmamasını sağla
-        
+    return results, best_model_name
+
+def forecast_with_models(df, results, best_model_name, forecast_periods=3):
+    """Eğitilmiş modellerin seçimiyle gelecek dönem tahminleri"""
+    history = df.sort_values('DATE')
+    last_date = history['DATE'].iloc[-1]
+    
+    # Seçilen modelle özyinelemeli (ay ay) tahmin
+    best = results[best_model_name]
+    model = best.get('final_model', best['model'])
+    forecast_dates, forecast_values = recursive_forecast(model, best['features'], history, forecast_periods)
+    
+    forecast_data = []
+    for next_date, next_pred in zip(forecast_dates, forecast_values):
         forecast_data.append({
             'DATE': next_date,
             'YIL_AY': next_date.strftime('%Y-%m'),
@@ -1373,7 +2355,7 @@ def train_advanced_ml_models(df, forecast_periods=3):
     simple_forecasts = []
     
     # 1. Son değer yöntemi
-    last_value = df_features['PF_Satis'].iloc[-1]
+    last_value = history['PF_Satis'].iloc[-1]
     for i in range(forecast_periods):
         simple_forecasts.append({
             'DATE': last_date + pd.DateOffset(months=i+1),
@@ -1384,7 +2366,7 @@ def train_advanced_ml_models(df, forecast_periods=3):
         })
     
     # 2. Hareketli ortalama yöntemi
-    ma_value = df_features['PF_Satis'].tail(6).mean()
+    ma_value = history['PF_Satis'].tail(6).mean()
     for i in range(forecast_periods):
         simple_forecasts.append({
             'DATE': last_date + pd.DateOffset(months=i+1),
@@ -1394,30 +2376,906 @@ def train_advanced_ml_models(df, forecast_periods=3):
             'Tahmin_Tipi': 'Basit Tahmin'
         })
     
+    # 3. İstatistiksel yöntem ailesinden seriye en uygun olanı (tek adım MAPE'ye göre)
+    values = history['PF_Satis'].to_numpy(dtype=float)
+    stat_forecasts, stat_mape = statistical_forecast_matrix(values[None, :], np.array([len(values)]), forecast_periods)
+    stat_methods, stat_forecast, _ = select_statistical_forecast(stat_forecasts, stat_mape)
+    if stat_methods[0] is not None:
+        for i in range(forecast_periods):
+            simple_forecasts.append({
+                'DATE': last_date + pd.DateOffset(months=i+1),
+                'YIL_AY': (last_date + pd.DateOffset(months=i+1)).strftime('%Y-%m'),
+                'PF_Satis': stat_forecast[0, i],
+                'Model': stat_methods[0],
+                'Tahmin_Tipi': 'Basit Tahmin'
+            })
+    
     simple_forecast_df = pd.DataFrame(simple_forecasts)
     
     # Tüm tahminleri birleştir
-    all_forecasts = pd.concat([forecast_df, simple_forecast_df], ignore_index=True)
+    return pd.concat([forecast_df, simple_forecast_df], ignore_index=True)
+
+def train_advanced_ml_models(df, forecast_periods=3):
+    """GELİŞTİRİLMİŞ ML modelleri ile tahmin"""
+    results, best_model_name = fit_forecast_models(df)
+    if results is None:
+        return None, None, None
+    
+    return results, best_model_name, forecast_with_models(df, results, best_model_name, forecast_periods)
+
+# =============================================================================
+# WALK-FORWARD BACKTEST
+# =============================================================================
+
+BACKTEST_MIN_TRAIN = 24  # İlk tahmin orijininden önceki en az ay sayısı (ısınma + 12 eğitim satırı)
+
+def backtest_fold_worker(task):
+    """Tek orijin: adayları orijine kadarki satırlarla eğit, ufuk boyunca özyinelemeli tahmin et
+    
+    Süreç havuzu işçisi; feature matrisi tüm orijinler için bir kez üretilip dilimlenir.
+    X satırları ısınma aylarından sonra başlar (X[i], y[ML_WARMUP + i] içindir).
+    """
+    origin, X, y, dates, feature_cols, max_horizon = task
+    horizon = min(max_horizon, len(y) - origin)
+    history = pd.DataFrame({'DATE': dates[:origin], 'PF_Satis': y[:origin]})
+    actual = y[origin:origin + horizon]
+    
+    forecasts = {'Son Değer': np.repeat(y[origin - 1], horizon)}
+    for name, model in build_forecast_models(n_jobs=1).items():
+        try:
+            model.fit(X[:origin - ML_WARMUP], y[ML_WARMUP:origin])
+            forecasts[name] = recursive_forecast(model, feature_cols, history, horizon)[1]
+        except Exception:
+            continue
+    
+    rows = []
+    for name, predicted in forecasts.items():
+        for step in range(horizon):
+            rows.append({
+                'Model': name,
+                'Orijin': dates[origin - 1].strftime('%Y-%m'),
+                'Ufuk': step + 1,
+                'Gercek': actual[step],
+                'Tahmin': predicted[step]
+            })
+    return rows
+
+def backtest_forecast_models(df, max_horizon=6, min_train=BACKTEST_MIN_TRAIN, max_workers=None):
+    """Kayan orijinli (walk-forward) backtest
+    
+    Her ay sonu bir tahmin orijinidir; (hatalar, özet) döner. Özet, model x ufuk başına MAE/MAPE içerir.
+    """
+    min_train = max(min_train, ML_WARMUP + 1)
+    if len(df) < min_train + 1:
+        return None, None
+    
+    history = df.sort_values('DATE').reset_index(drop=True)
+    df_features = create_advanced_ml_features(history)
+    feature_cols = [col for col in ML_FEATURE_COLUMNS if col in df_features.columns]
+    
+    # Geçmiş ve gerçekler tüm seriden, eğitim satırları ısınma sonrası feature matrisinden
+    X = df_features[feature_cols].to_numpy()
+    y = history['PF_Satis'].to_numpy(dtype=float)
+    dates = list(history['DATE'])
+    
+    tasks = [(origin, X, y, dates, feature_cols, max_horizon)
+             for origin in range(min_train, len(y))]
+    errors = pd.DataFrame([row for rows in run_in_process_pool(backtest_fold_worker, tasks, max_workers) for row in rows])
+    
+    errors['Hata'] = errors['Tahmin'] - errors['Gercek']
+    errors['APE'] = errors['Hata'].abs() / np.maximum(errors['Gercek'], 1) * 100
+    
+    summary = errors.groupby(['Model', 'Ufuk']).agg(
+        MAE=('Hata', lambda x: x.abs().mean()),
+        MAPE=('APE', 'mean'),
+        Orijin_Sayisi=('Orijin', 'count')
+    ).reset_index()
+    return errors, summary
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_forecast_backtest(cache_key, _df, max_horizon=6):
+    """Backtest'i seri parmak izi (model önbellek anahtarı) ve ufuk başına bir kez çalıştır"""
+    return backtest_forecast_models(_df, max_horizon)
+
+# =============================================================================
+# HİPERPARAMETRE AYARI - ZAMAN SIRALI CV + SUCCESSIVE HALVING
+# =============================================================================
+
+TUNING_GRID = {
+    'Ridge Regression': [{'alpha': alpha} for alpha in [0.01, 0.1, 1.0, 10.0, 100.0]],
+    'Random Forest': [
+        {'max_depth': depth, 'min_samples_split': split, 'max_features': features}
+        for depth in [4, 6, 10, None]
+        for split in [2, 5, 10]
+        for features in [1.0, 0.5, 'sqrt']
+    ]
+}
+TUNING_RUNGS = [(25, 2), (75, 3), (200, 5)]  # (ağaç sayısı, katlama sayısı) - her turda bütçe artar
+TUNING_ETA = 3  # Her turda adayların 1/ETA'sı bir sonraki tura geçer
+TUNING_RETUNE_GROWTH = 1.25  # Seri ayarlandığı uzunluğun bu katına ulaşınca arama yeniden yapılır
+_TUNING_LOCK = threading.Lock()
+
+def tuning_folds(n_rows, n_folds=TUNING_RUNGS[-1][1], min_train=8):
+    """Zaman sıralı (genişleyen pencere) CV katlamaları: (orijin, doğrulama genişliği) listesi, en yenisi sonda
+    
+    n_rows ve orijinler ısınma sonrası feature satırları cinsindendir.
+    """
+    width = max(2, n_rows // 10)
+    origins = [n_rows - width * (n_folds - i) for i in range(n_folds)]
+    return [(origin, width) for origin in origins if origin >= min_train]
+
+def tuning_fold_worker(task):
+    """Tek yapılandırma x tek katlama doğrulama MAPE'si (süreç havuzu işçisi)
+    
+    Tek adım ileri skordur: doğrulama satırlarının lag'leri gerçek değerlerdir. Uygulamanın
+    özyinelemeli çok adımlı tahmini için hata ufukla artar (bkz. walk-forward backtest).
+    """
+    model_name, params, n_trees, X, y, origin, width = task
+    try:
+        model = build_forecast_models(n_jobs=1, params={model_name: params})[model_name]
+        if isinstance(model, RandomForestRegressor):
+            model.set_params(n_estimators=n_trees)
+        model.fit(X[:origin], y[:origin])
+        actual = y[origin:origin + width]
+        predicted = np.maximum(model.predict(X[origin:origin + width]), 0)
+        return float(np.mean(np.abs(actual - predicted) / np.maximum(actual, 1)) * 100)
+    except Exception:
+        return np.inf
+
+def tune_forecast_models(df, max_workers=None):
+    """Successive halving ile hiperparametre araması
+    
+    Her turda adaylar en yeni katlamalarda, artan ağaç sayısıyla değerlendirilir; ortalama
+    MAPE'ye göre en iyi 1/TUNING_ETA'lık kısım bir sonraki tura geçer. Feature matrisi bir kez
+    üretilir. Arama yalnızca fit_forecast_models'in eğitim satırlarında (ilk %80) yapılır; son
+    %20'lik test dönemi model seçimi ve raporlanan MAPE için dokunulmadan kalır.
+    (kazanan ayarlar, CV MAPE'leri, tur geçmişi) döner.
+    """
+    df_features = create_advanced_ml_features(df)
+    feature_cols = [col for col in ML_FEATURE_COLUMNS if col in df_features.columns]
+    split_idx = int(len(df_features) * 0.8)
+    X = df_features[feature_cols].to_numpy(dtype=float)[:split_idx]
+    y = df_features['PF_Satis'].to_numpy(dtype=float)[:split_idx]
+    folds = tuning_folds(len(y))
+    
+    if not folds:
+        return {}, {}, []
+    
+    candidates = {name: list(grid) for name, grid in TUNING_GRID.items()}
+    scores = {}
+    history = []
+    
+    for round_no, (n_trees, n_folds) in enumerate(TUNING_RUNGS, start=1):
+        round_folds = folds[-n_folds:]
+        keys = [(name, i) for name, configs in candidates.items() for i in range(len(configs))]
+        tasks = [(name, candidates[name][i], n_trees, X, y, origin, width)
+                 for name, i in keys for origin, width in round_folds]
+        fold_scores = np.array(run_in_process_pool(tuning_fold_worker, tasks, max_workers)).reshape(len(keys), len(round_folds))
+        
+        round_scores = {}
+        for (name, i), score in zip(keys, fold_scores.mean(axis=1)):
+            round_scores.setdefault(name, []).append((score, candidates[name][i]))
+            history.append({
+                'Tur': round_no,
+                'Model': name,
+                'Parametreler': json.dumps(candidates[name][i], sort_keys=True),
+                'Agac': n_trees if name == 'Random Forest' else None,
+                'Katlama': len(round_folds),
+                'CV_MAPE': score
+            })
+        
+        for name, ranked in round_scores.items():
+            ranked.sort(key=lambda item: item[0])
+            keep = ranked if round_no == len(TUNING_RUNGS) else ranked[:max(1, len(ranked) // TUNING_ETA)]
+            candidates[name] = [config for _, config in keep]
+            scores[name] = keep[0][0]
+    
+    best_params = {name: configs[0] for name, configs in candidates.items()}
+    return best_params, scores, history
+
+def read_tuning_cache():
+    try:
+        with open(TUNING_CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def get_tuning_key(scope, series_name):
+    """Ayar anahtarı: ürün + filtreler + tarih aralığı + seri adı (veri yüklemesinden bağımsız)"""
+    key = (MODEL_CACHE_VERSION, TUNING_CACHE_VERSION, scope[2:], series_name)
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+def get_tuned_params(scope, series_name, df):
+    """Kapsam/seri için kazanan ayarları önbellekten getir; yoksa ya da seri belirgin uzadıysa aramayı çalıştırıp kaydet"""
+    key = get_tuning_key(scope, series_name)
+    
+    with _TUNING_LOCK:
+        entry = read_tuning_cache().get(key)
+    if entry is not None and len(df) < entry['n_rows'] * TUNING_RETUNE_GROWTH:
+        return entry
+    
+    best_params, scores, history = tune_forecast_models(df)
+    entry = {
+        'params': best_params,
+        'cv_mape': scores,
+        'history': history,
+        'n_rows': len(df),
+        'tuned_at': datetime.now().isoformat(timespec='seconds')
+    }
+    
+    with _TUNING_LOCK:
+        cache = read_tuning_cache()
+        cache[key] = entry
+        tmp_path = TUNING_CACHE_PATH.with_suffix('.tmp')
+        try:
+            TUNING_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, TUNING_CACHE_PATH)
+        except OSError:
+            pass
+    
+    return entry
+
+# =============================================================================
+# ARTIMLI MODEL YENİLEME
+# =============================================================================
+
+RF_REFRESH_TREES = 50  # Her yenilemede en az bu kadar yeni ağaç eklenir (ve en eskileri emekliye ayrılır)
+REFRESH_MAX_MAPE_RATIO = 1.25  # Yenilenen bir modelin MAPE'si önbellektekinin bu katını aşarsa sıfırdan eğitilir
+
+def linear_stats(X, y):
+    """Doğrusal modeller için yeterli istatistikler (satır sayısı, toplamlar, çapraz çarpımlar)"""
+    return {'n': len(y), 'sx': X.sum(axis=0), 'sy': float(np.sum(y)), 'sxx': X.T @ X, 'sxy': X.T @ y}
+
+def update_linear_stats(stats, X_new, y_new):
+    """Yeni gözlemleri istatistiklere ekle (eski satırlar yeniden işlenmez)"""
+    return {
+        'n': stats['n'] + len(y_new),
+        'sx': stats['sx'] + X_new.sum(axis=0),
+        'sy': stats['sy'] + float(np.sum(y_new)),
+        'sxx': stats['sxx'] + X_new.T @ X_new,
+        'sxy': stats['sxy'] + X_new.T @ y_new
+    }
+
+def solve_linear_stats(model, stats):
+    """Eğitilmiş LinearRegression/Ridge modelinin katsayılarını istatistiklerden yeniden çöz
+    
+    sklearn ile aynı: X ve y merkezlenir, sabit terim cezalandırılmaz.
+    """
+    n = stats['n']
+    mean_x = stats['sx'] / n
+    mean_y = stats['sy'] / n
+    sxx = stats['sxx'] - n * np.outer(mean_x, mean_x)
+    sxy = stats['sxy'] - n * mean_x * mean_y
+    
+    alpha = getattr(model, 'alpha', 0.0)
+    if alpha > 0:
+        coef = np.linalg.solve(sxx + alpha * np.eye(len(sxy)), sxy)
+    else:
+        coef = np.linalg.lstsq(sxx, sxy, rcond=None)[0]
+    
+    model.coef_ = coef
+    model.intercept_ = mean_y - mean_x @ coef
+    return model
+
+def grow_forest(model, X, y, rows_added):
+    """Yeni ağaçları güncel veriyle eğit (warm start), aynı sayıda en eski ağacı emekliye ayır
+    
+    Orman boyutu sabit kalır; yeni ağaçların payı en az yeni satırların payı kadardır.
+    (yeniden kullanılan, yeni eğitilen) ağaç sayısını döner.
+    """
+    n_trees = len(model.estimators_)
+    extra_trees = min(max(RF_REFRESH_TREES, int(np.ceil(n_trees * rows_added / len(y)))), n_trees)
+    model.set_params(warm_start=True, n_estimators=n_trees + extra_trees)
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+    
+    model.estimators_ = model.estimators_[extra_trees:]
+    model.set_params(n_estimators=n_trees)
+    return n_trees - extra_trees, extra_trees
+
+def refresh_degraded(results, refreshed):
+    """Yenilenen bir Random Forest önbellekteki MAPE'sinden belirgin kötüyse True (sıfırdan eğitim gerekir)
+    
+    Doğrusal modeller yeterli istatistiklerden tam çözüldüğü için sıfırdan eğitimle aynıdır; yalnızca
+    eski ağaçları taşıyan ormanlar sınanır.
+    """
+    return any(refreshed[name]['MAPE'] > results[name]['MAPE'] * REFRESH_MAX_MAPE_RATIO
+               for name, entry in refreshed.items()
+               if isinstance(entry['model'], RandomForestRegressor) and name in results)
+
+def build_refresh_state(df, results):
+    """Artımlı yenileme için eğitim durumu: feature matrisi, hedef, tüm seri, EMA durumları, yeterli istatistikler
+    
+    X ve y ısınma sonrası satırlardır; 'series' lag'ler ve EMA için tüm seriyi tutar.
+    """
+    history = df.sort_values('DATE').reset_index(drop=True)
+    df_features = create_advanced_ml_features(history)
+    feature_cols = next(iter(results.values()))['features']
+    
+    X = df_features[feature_cols].to_numpy(dtype=float)
+    y = df_features['PF_Satis'].to_numpy(dtype=float)
+    split_idx = int(len(y) * 0.8)
+    
+    return {
+        'X': X,
+        'y': y,
+        'series': history['PF_Satis'].to_numpy(dtype=float),
+        'split_idx': split_idx,
+        'ema': {span: history['PF_Satis'].ewm(span=span, adjust=False).mean().iloc[-1] for span in ML_EMA_SPANS},
+        'train_stats': linear_stats(X[:split_idx], y[:split_idx]),
+        'full_stats': linear_stats(X, y)
+    }
+
+def refresh_forecast_models(fitted, state, df):
+    """Sonuna yeni ay(lar) eklenmiş seri için modelleri sıfırdan eğitmeden güncelle
+    
+    Feature matrisi yalnızca yeni satırlarla uzatılır; doğrusal modeller yeterli istatistiklerden
+    çözülür, Random Forest'a warm start ile yeni ağaçlar eklenir, metrikler yeni test döneminde
+    yeniden hesaplanıp en iyi model yeniden seçilir. (fitted, state, yenileme özeti) döner.
+    """
+    results, best_model_name = fitted
+    history = df.sort_values('DATE').reset_index(drop=True)
+    feature_cols = next(iter(results.values()))['features']
+    
+    n_old = len(state['series'])
+    series = history['PF_Satis'].to_numpy(dtype=float)
+    n_new = len(series)
+    
+    # Feature tamponunu yalnızca yeni aylarla uzat
+    ema_states = dict(state['ema'])
+    new_rows = np.empty((n_new - n_old, len(feature_cols)))
+    for i, t in enumerate(range(n_old, n_new)):
+        date = history['DATE'].iloc[t]
+        features = next_step_features(series, t, date.month, date.year, ema_states)
+        new_rows[i] = [features[col] for col in feature_cols]
+        for span in ML_EMA_SPANS:
+            alpha = 2 / (span + 1)
+            ema_states[span] = alpha * series[t] + (1 - alpha) * ema_states[span]
+    X = np.vstack([state['X'], new_rows])
+    y = series[ML_WARMUP:]
+    
+    split_old, split_new = state['split_idx'], int(len(y) * 0.8)
+    train_stats = update_linear_stats(state['train_stats'], X[split_old:split_new], y[split_old:split_new])
+    full_stats = update_linear_stats(state['full_stats'], new_rows, series[n_old:])
+    
+    refresh = {'rows_reused': n_old, 'rows_added': n_new - n_old, 'trees_reused': 0, 'trees_trained': 0}
+    
+    refreshed = {}
+    for name, entry in results.items():
+        model = entry['model']
+        if isinstance(model, RandomForestRegressor):
+            reused, trained = grow_forest(model, X[:split_new], y[:split_new], split_new - split_old)
+            refresh['trees_reused'] += reused
+            refresh['trees_trained'] += trained
+        else:
+            solve_linear_stats(model, train_stats)
+        refreshed[name] = evaluate_forecast_model(model, X[split_new:], y[split_new:])
+        refreshed[name]['features'] = feature_cols
+    
+    new_best_name = min(refreshed.keys(), key=lambda x: refreshed[x]['MAPE'])
+    best = refreshed[new_best_name]
+    
+    # Tüm geçmişle eğitilmiş model: aynı model seçiliyse öncekini güncelle
+    previous_final = results[new_best_name].get('final_model') if new_best_name == best_model_name else None
+    final_model = previous_final if previous_final is not None else copy.deepcopy(best['model'])
+    if isinstance(final_model, RandomForestRegressor):
+        reused, trained = grow_forest(final_model, X, y, n_new - n_old)
+        refresh['trees_reused'] += reused
+        refresh['trees_trained'] += trained
+    else:
+        solve_linear_stats(final_model, full_stats)
+    best['final_model'] = final_model
+    
+    new_state = {
+        'X': X,
+        'y': y,
+        'series': series,
+        'split_idx': split_new,
+        'ema': ema_states,
+        'train_stats': train_stats,
+        'full_stats': full_stats
+    }
+    return (refreshed, new_best_name), new_state, refresh
+
+# =============================================================================
+# MODEL ÖNBELLEĞİ - DİSK ÜZERİNDE LRU
+# =============================================================================
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: yalnızca süreç içi kilit kullanılır
+    fcntl = None
+
+_MODEL_CACHE_LOCK = threading.Lock()
+
+@contextmanager
+def model_cache_lock():
+    """Kayıt defterinin okuma-değiştirme-yazma kilidi
+    
+    İş parçacıkları threading kilidiyle, ayrı süreçler (başka Streamlit süreçleri, havuz
+    işçileri) manifest.lock üzerindeki dosya kilidiyle sıralanır. Kilit dosyası açılamazsa
+    yalnızca süreç içi kilitle devam edilir.
+    """
+    with _MODEL_CACHE_LOCK:
+        lock_file = None
+        if fcntl is not None:
+            try:
+                MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                lock_file = open(MODEL_CACHE_DIR / "manifest.lock", 'a')
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except OSError:
+                if lock_file is not None:
+                    lock_file.close()
+                lock_file = None
+        try:
+            yield
+        finally:
+            if lock_file is not None:
+                lock_file.close()  # Dosyayı kapatmak kilidi bırakır
+
+def read_model_pickle(path, sha256):
+    """Kaydı kayıt defterindeki SHA-256 özetiyle doğrulayıp yükle; eşleşmezse None"""
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    if sha256 is None or hashlib.sha256(data).hexdigest() != sha256:
+        return None
+    return pickle.loads(data)
+
+def read_model_manifest():
+    """Model önbelleği kayıt defteri (girdiler ve isabet/eğitim/çıkarma sayaçları)"""
+    try:
+        with open(MODEL_CACHE_DIR / "manifest.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'entries': {}, 'hits': 0, 'misses': 0, 'evictions': 0}
+
+def write_model_manifest(manifest):
+    """Kayıt defterini atomik olarak yaz"""
+    path = MODEL_CACHE_DIR / "manifest.json"
+    tmp_path = path.with_suffix('.tmp')
+    try:
+        MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+def evict_model_cache(manifest, keep_key=None):
+    """Toplam boyut sınırı aşılırsa en uzun süre kullanılmayan kayıtları sil"""
+    entries = manifest['entries']
+    total = sum(entry['size'] for entry in entries.values())
+    
+    for key in sorted(entries, key=lambda k: entries[k]['last_used']):
+        if total <= MODEL_CACHE_MAX_BYTES:
+            break
+        if key == keep_key:
+            continue
+        total -= entries.pop(key)['size']
+        manifest['evictions'] += 1
+        try:
+            (MODEL_CACHE_DIR / f"{key}.pkl").unlink()
+        except OSError:
+            pass
+
+def get_model_cache_key(scope, series_name, df, params=None):
+    """Model anahtarı: veri/filtre kapsamı + seri adı + hiperparametreler + serinin içerik özeti"""
+    fingerprint = pd.util.hash_pandas_object(df[['DATE', 'PF_Satis']], index=False).to_numpy().tobytes()
+    key = (MODEL_CACHE_VERSION, scope, series_name, json.dumps(params, sort_keys=True))
+    return hashlib.sha256(repr(key).encode('utf-8') + fingerprint).hexdigest()
+
+def get_model_lineage_key(scope, series_name, params=None):
+    """Veri yüklemesinden bağımsız seri kimliği: yeni ay eklenmiş yüklemeler aynı soya düşer"""
+    key = (MODEL_CACHE_VERSION, scope[1:], series_name, json.dumps(params, sort_keys=True))
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+def series_digest(df, n_rows=None):
+    """Serinin (ilk n_rows ayının) içerik özeti; önbellekteki serinin yeni serinin öneki olup olmadığını sınar"""
+    rows = df.sort_values('DATE')[['DATE', 'PF_Satis']]
+    if n_rows is not None:
+        rows = rows.iloc[:n_rows]
+    return hashlib.sha256(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes()).hexdigest()
+
+def find_refresh_base(manifest, lineage_key, df):
+    """Aynı soydaki, yeni serinin öneki olan en uzun önbellek kaydını bul (yoksa None)"""
+    candidates = sorted(
+        ((key, entry) for key, entry in manifest['entries'].items()
+         if entry.get('lineage') == lineage_key and entry.get('n_rows', len(df)) < len(df)),
+        key=lambda item: item[1]['n_rows'], reverse=True
+    )
+    for key, entry in candidates:
+        if entry['digest'] == series_digest(df, entry['n_rows']):
+            return key
+    return None
+
+def load_forecast_models(cache_key, df, lineage_key=None, params=None):
+    """Eğitilmiş modelleri disk önbelleğinden getir; yoksa eğitip kaydet
+    
+    lineage_key verilirse ve önbellekte bu serinin sonuna ay eklenmemiş hali varsa,
+    modeller sıfırdan eğitilmek yerine artımlı olarak güncellenir.
+    """
+    path = MODEL_CACHE_DIR / f"{cache_key}.pkl"
+    base_key, base_sha256 = None, None
+    
+    with model_cache_lock():
+        manifest = read_model_manifest()
+        entry = manifest['entries'].get(cache_key)
+        if entry is not None:
+            try:
+                payload = read_model_pickle(path, entry.get('sha256'))
+            except Exception:
+                payload = None
+            if payload is not None:
+                entry['last_used'] = datetime.now().timestamp()
+                manifest['hits'] += 1
+                write_model_manifest(manifest)
+                return payload['fitted']
+            # Eksik, bozuk veya değiştirilmiş kayıt - yeniden eğitilecek
+        
+        if lineage_key is not None:
+            base_key = find_refresh_base(manifest, lineage_key, df)
+            if base_key is not None:
+                base_sha256 = manifest['entries'][base_key].get('sha256')
+    
+    fitted, state, refresh = None, None, None
+    if base_key is not None:
+        try:
+            base = read_model_pickle(MODEL_CACHE_DIR / f"{base_key}.pkl", base_sha256)
+            fitted, state, refresh = refresh_forecast_models(base['fitted'], base['state'], df)
+        except Exception:
+            # Yenilenemezse sıfırdan eğitilir
+            fitted, state, refresh = None, None, None
+        
+        if fitted is not None and refresh_degraded(base['fitted'][0], fitted[0]):
+            # Eski ağaçlar yeni veriye uymuyor - tam eğitime düş
+            fitted, state, refresh = None, None, None
+            with model_cache_lock():
+                manifest = read_model_manifest()
+                manifest['refresh_fallbacks'] = manifest.get('refresh_fallbacks', 0) + 1
+                write_model_manifest(manifest)
+    
+    if fitted is None:
+        fitted = fit_forecast_models(df, params=params)
+        if fitted[0] is not None:
+            state = build_refresh_state(df, fitted[0])
+    
+    payload = None
+    if fitted[0] is not None:
+        try:
+            payload = pickle.dumps({'fitted': fitted, 'state': state}, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # Serileştirilemezse model yine de kullanılır
+            payload = None
+    
+    with model_cache_lock():
+        manifest = read_model_manifest()
+        if fitted[0] is not None:
+            if refresh is not None:
+                manifest['refreshes'] = manifest.get('refreshes', 0) + 1
+                for counter in ['rows_reused', 'trees_reused', 'trees_trained']:
+                    manifest[counter] = manifest.get(counter, 0) + refresh[counter]
+            else:
+                manifest['misses'] += 1
+            tmp_path = path.with_suffix('.tmp')
+            try:
+                MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                with open(tmp_path, 'wb') as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+                manifest['entries'][cache_key] = {
+                    'size': len(payload),
+                    'sha256': hashlib.sha256(payload).hexdigest(),
+                    'last_used': datetime.now().timestamp(),
+                    'lineage': lineage_key,
+                    'n_rows': len(df),
+                    'digest': series_digest(df)
+                }
+                evict_model_cache(manifest, keep_key=cache_key)
+            except Exception:
+                # Önbellek yazılamazsa model yine de kullanılır
+                if tmp_path.exists():
+                    tmp_path.unlink()
+        write_model_manifest(manifest)
+    
+    return fitted
+
+def get_model_cache_stats():
+    """Sidebar için önbellek özeti"""
+    manifest = read_model_manifest()
+    return {
+        'hits': manifest['hits'],
+        'misses': manifest['misses'],
+        'evictions': manifest['evictions'],
+        'refreshes': manifest.get('refreshes', 0),
+        'rows_reused': manifest.get('rows_reused', 0),
+        'trees_reused': manifest.get('trees_reused', 0),
+        'trees_trained': manifest.get('trees_trained', 0),
+        'refresh_fallbacks': manifest.get('refresh_fallbacks', 0),
+        'entries': len(manifest['entries']),
+        'size_mb': sum(entry['size'] for entry in manifest['entries'].values()) / 1024 ** 2
+    }
+
+# Portföy tahmininde seçilebilen seviyeler
+FORECAST_LEVEL_OPTIONS = {"Territory": 'TERRITORIES', "Şehir": 'CITY', "Bölge": 'REGION'}
+
+def forecast_series_worker(task):
+    """Tek seri için model seçimi + tahmin (süreç havuzu işçisi, Streamlit çağrısı yapmaz)"""
+    name, series_df, forecast_periods = task
+    summary = {'Seri': name, 'Ay_Sayisi': len(series_df), 'Model': None,
+               'MAPE': np.nan, 'MAE': np.nan, 'R2': np.nan, 'Toplam_Tahmin': np.nan}
+    
+    try:
+        results, best_model_name = fit_forecast_models(series_df, n_jobs=1, report_errors=False)
+        if results is None:
+            summary['Durum'] = "Yetersiz veri"
+            return summary, []
+        forecasts = forecast_with_models(series_df, results, best_model_name, forecast_periods)
+    except Exception as e:
+        # Tek serinin hatası tüm portföy taramasını durdurmasın
+        summary['Durum'] = f"Hata: {e}"
+        return summary, []
+    
+    ml_forecast = forecasts[forecasts['Tahmin_Tipi'] == 'ML Tahmin']
+    best = results[best_model_name]
+    
+    summary.update({
+        'Model': best_model_name,
+        'MAPE': best['MAPE'],
+        'MAE': best['MAE'],
+        'R2': best['R2'],
+        'Toplam_Tahmin': ml_forecast['PF_Satis'].sum(),
+        'Durum': "Tamam"
+    })
+    rows = [{'Seri': name, 'DATE': row.DATE, 'YIL_AY': row.YIL_AY, 'PF_Tahmin': row.PF_Satis,
+             'Model': best_model_name, 'MAPE': best['MAPE']}
+            for row in ml_forecast.itertuples(index=False)]
+    return summary, rows
+
+def calculate_portfolio_forecast(df, product, date_filter=None, level='TERRITORIES', forecast_periods=6, max_workers=None):
+    """Seviyedeki her seri için ML tahmini (süreç havuzunda)
+    
+    (tahminler, özet) döner; tahminler seri x ay düzeyinde uzun tablodur.
+    """
+    name_col = LEVEL_LABELS[level]
+    panel = calculate_panel_time_series(df, product, date_filter, level)
+    
+    tasks = [(name, group[['DATE', 'YIL_AY', 'PF_Satis', 'Pazar_Payi_%']].reset_index(drop=True), forecast_periods)
+             for name, group in panel.groupby(name_col, sort=True)]
+    outputs = run_in_process_pool(forecast_series_worker, tasks, max_workers)
+    
+    summary = pd.DataFrame([summary for summary, _ in outputs])
+    forecasts = pd.DataFrame([row for _, rows in outputs for row in rows],
+                             columns=['Seri', 'DATE', 'YIL_AY', 'PF_Tahmin', 'Model', 'MAPE'])
+    
+    if len(summary) > 0:
+        summary = summary.rename(columns={'Seri': name_col}).sort_values('Toplam_Tahmin', ascending=False, na_position='last')
+    forecasts = forecasts.rename(columns={'Seri': name_col})
+    return forecasts, summary.reset_index(drop=True)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def load_portfolio_forecast(scope, _df, product, date_filter=None, level='TERRITORIES', forecast_periods=6):
+    """Portföy tahminini yükleme/filtre kapsamı, seviye ve ufuk başına bir kez hesapla"""
+    return calculate_portfolio_forecast(_df, product, date_filter, level, forecast_periods)
+
+def get_ml_forecast(cache_key, df, forecast_periods, lineage_key=None, params=None):
+    """Önbellekteki (veya yeni eğitilen) modellerle tahmin; ufuk değişimi yeniden eğitim gerektirmez"""
+    results, best_model_name = load_forecast_models(cache_key, df, lineage_key, params)
+    if results is None:
+        return None, None, None
+    
+    return results, best_model_name, forecast_with_models(df, results, best_model_name, forecast_periods)
+
+# =============================================================================
+# GLOBAL (HAVUZ) TAHMİN MODELİ
+# =============================================================================
+
+GLOBAL_MODEL_NAME = 'Global Random Forest'
+GLOBAL_MIN_MONTHS = 15  # En az 12 aylık geçmişi olan birkaç eğitim satırı için
+GLOBAL_ENCODING_COLUMNS = ['series_log_scale', 'series_cv']
+GLOBAL_FEATURE_COLUMNS = ML_FEATURE_COLUMNS + GLOBAL_ENCODING_COLUMNS
+
+# Satış birimindeki feature'lar seri ölçeğine bölünür; büyüme/takvim feature'ları birimsizdir
+GLOBAL_SCALED_COLUMNS = [col for col in ML_FEATURE_COLUMNS
+                         if col.startswith(('lag_', 'rolling_', 'ema_', 'momentum_', 'volatility_'))]
+
+def fit_global_model(panel, name_col, n_jobs=-1):
+    """Tüm serilerin feature'larını alt alta yığıp tek model eğit
+    
+    Hedef ve seviye feature'ları seri ortalamasına bölünür; seri kimliği log ölçek ve
+    değişkenlik katsayısıyla kodlanır. Önce son %20 takvim ayında seri bazlı MAPE ölçülür,
+    sonra model tüm satırlarla yeniden eğitilir.
+    """
+    frames = []
+    series = {}
+    
+    for name, group in panel.groupby(name_col, sort=True):
+        if len(group) < GLOBAL_MIN_MONTHS:
+            continue
+        
+        history = group[['DATE', 'PF_Satis']].sort_values('DATE').reset_index(drop=True)
+        values = history['PF_Satis'].to_numpy(dtype=float)
+        scale = max(values.mean(), 1.0)
+        cv = values.std() / scale
+        
+        features = create_advanced_ml_features(history)
+        features[GLOBAL_SCALED_COLUMNS] = features[GLOBAL_SCALED_COLUMNS] / scale
+        features['series_log_scale'] = np.log1p(scale)
+        features['series_cv'] = cv
+        features['scale'] = scale
+        features['Seri'] = name
+        
+        frames.append(features)
+        series[name] = (history, scale, cv)
+    
+    if not frames:
+        return None
+    
+    stacked = pd.concat(frames, ignore_index=True)
+    X = stacked[GLOBAL_FEATURE_COLUMNS].to_numpy(dtype=float)
+    X = np.where(np.isfinite(X), X, 0.0)
+    y = (stacked['PF_Satis'] / stacked['scale']).to_numpy()
+    
+    months = np.sort(stacked['DATE'].unique())
+    test = (stacked['DATE'] >= months[int(len(months) * 0.8)]).to_numpy()
+    
+    series_mape, series_mae = {}, {}
+    if test.any() and (~test).any():
+        model = build_forecast_models(n_jobs)['Random Forest'].fit(X[~test], y[~test])
+        test_df = stacked.loc[test, ['Seri', 'PF_Satis', 'scale']].copy()
+        test_df['Hata'] = (np.maximum(model.predict(X[test]), 0) * test_df['scale'] - test_df['PF_Satis']).abs()
+        test_df['APE'] = test_df['Hata'] / np.maximum(test_df['PF_Satis'], 1) * 100
+        series_mape = test_df.groupby('Seri')['APE'].mean().to_dict()
+        series_mae = test_df.groupby('Seri')['Hata'].mean().to_dict()
+    
+    model = build_forecast_models(n_jobs)['Random Forest'].fit(X, y)
+    
+    return {
+        'model': model,
+        'series': series,
+        'mape': series_mape,
+        'mae': series_mae,
+        'train_rows': len(stacked)
+    }
+
+def forecast_global_model(artifact, forecast_periods=6):
+    """Tüm serileri tek tamponda ay ay ileri taşı; her adımda tek predict çağrısı
+    
+    Seriler sağa hizalanır (son gözlem aynı sütunda), böylece lag/rolling pencereleri ortak indekslenir.
+    """
+    names = list(artifact['series'].keys())
+    histories = [artifact['series'][name][0] for name in names]
+    scales = np.array([artifact['series'][name][1] for name in names])
+    cvs = np.array([artifact['series'][name][2] for name in names])
+    lengths = np.array([len(history) for history in histories])
+    
+    width = lengths.max()
+    buffer = np.full((len(names), width + forecast_periods), np.nan)
+    for i, history in enumerate(histories):
+        buffer[i, width - lengths[i]:width] = history['PF_Satis'].to_numpy(dtype=float)
+    
+    ema_states = {span: np.array([history['PF_Satis'].ewm(span=span, adjust=False).mean().iloc[-1] for history in histories])
+                  for span in ML_EMA_SPANS}
+    alphas = {span: 2 / (span + 1) for span in ML_EMA_SPANS}
+    
+    last_periods = pd.PeriodIndex([history['DATE'].iloc[-1] for history in histories], freq='M')
+    scaled_idx = [GLOBAL_FEATURE_COLUMNS.index(col) for col in GLOBAL_SCALED_COLUMNS]
+    
+    X = np.empty((len(names), len(GLOBAL_FEATURE_COLUMNS)))
+    X[:, -2] = np.log1p(scales)
+    X[:, -1] = cvs
+    
+    rows = []
+    for step in range(forecast_periods):
+        t = width + step
+        periods = last_periods + (step + 1)
+        features = next_step_features(buffer, t, periods.month.to_numpy(), periods.year.to_numpy(),
+                                      ema_states, trend_index=lengths + step)
+        
+        for j, col in enumerate(ML_FEATURE_COLUMNS):
+            X[:, j] = features[col]
+        X[:, scaled_idx] /= scales[:, None]
+        
+        buffer[:, t] = np.maximum(artifact['model'].predict(X), 0) * scales
+        
+        for span in ML_EMA_SPANS:
+            ema_states[span] = alphas[span] * buffer[:, t] + (1 - alphas[span]) * ema_states[span]
+        
+        rows.append(pd.DataFrame({
+            'Seri': names,
+            'DATE': periods.to_timestamp(),
+            'YIL_AY': periods.strftime('%Y-%m'),
+            'PF_Tahmin': buffer[:, t]
+        }))
+    
+    return pd.concat(rows, ignore_index=True)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_global_model(scope, _df, product, date_filter=None, level='TERRITORIES'):
+    """Global modeli yükleme/filtre kapsamı ve seviye başına bir kez eğit (ufuktan bağımsız)"""
+    panel = calculate_panel_time_series(_df, product, date_filter, level)
+    return fit_global_model(panel, LEVEL_LABELS[level])
+
+def calculate_global_forecast(scope, df, product, date_filter=None, level='TERRITORIES', forecast_periods=6):
+    """Global modelle portföy tahmini; calculate_portfolio_forecast ile aynı (tahminler, özet) biçimi"""
+    name_col = LEVEL_LABELS[level]
+    panel = calculate_panel_time_series(df, product, date_filter, level)
+    summary = panel.groupby(name_col, sort=True).size().rename('Ay_Sayisi').reset_index()
     
-    return results, best_model_name, all_forecasts
+    empty = pd.DataFrame(columns=[name_col, 'DATE', 'YIL_AY', 'PF_Tahmin', 'Model', 'MAPE'])
+    try:
+        artifact = load_global_model(scope, df, product, date_filter, level)
+        if artifact is None:
+            summary['Durum'] = "Yetersiz veri"
+            return empty, summary
+        forecasts = forecast_global_model(artifact, forecast_periods)
+    except Exception as e:
+        # Tek model tüm serileri taşıdığından hata her seriye yazılır; arayüz uyarı gösterir
+        summary['Durum'] = f"Hata: {e}"
+        return empty, summary
+    
+    forecasts['Model'] = GLOBAL_MODEL_NAME
+    forecasts['MAPE'] = forecasts['Seri'].map(artifact['mape'])
+    forecasts = forecasts.rename(columns={'Seri': name_col})
+    
+    fitted = summary[name_col].isin(artifact['series'])
+    summary['Model'] = np.where(fitted, GLOBAL_MODEL_NAME, None)
+    summary['MAPE'] = summary[name_col].map(artifact['mape'])
+    summary['MAE'] = summary[name_col].map(artifact['mae'])
+    summary['R2'] = np.nan
+    summary['Toplam_Tahmin'] = summary[name_col].map(forecasts.groupby(name_col)['PF_Tahmin'].sum())
+    summary['Durum'] = np.where(fitted, "Tamam", "Yetersiz veri")
+    
+    summary = summary.sort_values('Toplam_Tahmin', ascending=False, na_position='last').reset_index(drop=True)
+    return forecasts, summary
 
 # =============================================================================
 # ANALYSIS FUNCTIONS
 # =============================================================================
 
+def compute_product_aggregate(df, group_cols, date_filter=None, territory=None):
+    """Sekiz ürün/rakip ölçüsünü tek gruplama geçişinde topla (önbelleksiz)"""
+    if territory and territory != "TÜMÜ":
+        df = df[df['TERRITORIES'] == territory]
+    df = filter_date_range(df, date_filter)
+    
+    agg_spec = {col: 'sum' for col in MEASURE_COLUMNS if col in df.columns}
+    agg_spec['DATE'] = 'min'
+    
+    return df.groupby(list(group_cols), observed=True).agg(agg_spec).reset_index()
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def load_product_aggregate(frame_key, _df, group_cols, date_filter=None, territory=None):
+    """Toplamı veri kapsamı anahtarıyla önbellekle (çerçevenin kendisi hash'lenmez)"""
+    return compute_product_aggregate(_df, group_cols, date_filter, territory)
+
+def aggregate_all_products(df, group_cols, date_filter=None, territory=None):
+    """Sekiz ürün/rakip ölçüsünü tek gruplama geçişinde topla
+    
+    Sonuç ürün seçiminden bağımsızdır; ürün değiştirmek yalnızca hazır kolonları seçer.
+    Çerçeve df.attrs['frame_key'] (veri seti özeti + filtreler) taşıyorsa sonuç bu anahtar,
+    tarih aralığı ve territory ile önbelleğe alınır; anahtarsız (ör. türetilmiş) çerçeveler her
+    seferinde hesaplanır. Alt kümeler dilimlenmiş çerçeve yerine date_filter/territory ile
+    istenmelidir. DATE kolonu her grubun ilk tarihidir.
+    """
+    frame_key = df.attrs.get('frame_key')
+    if frame_key is None:
+        return compute_product_aggregate(df, group_cols, date_filter, territory)
+    return load_product_aggregate(frame_key, df, group_cols, date_filter, territory)
+
 def calculate_city_performance(df, product, date_filter=None):
     """Şehir bazlı performans"""
     cols = get_product_columns(product)
     
-    if date_filter:
-        df = df[(df['DATE'] >= date_filter[0]) & (df['DATE'] <= date_filter[1])]
-    
-    city_perf = df.groupby(['CITY_NORMALIZED', 'REGION']).agg({
-        cols['pf']: 'sum',
-        cols['rakip']: 'sum'
-    }).reset_index()
+    city_perf = aggregate_all_products(df, ('CITY_NORMALIZED', 'REGION'), date_filter)
+    city_perf = city_perf[['CITY_NORMALIZED', 'REGION', cols['pf'], cols['rakip']]]
     
     city_perf.columns = ['City', 'Region', 'PF_Satis', 'Rakip_Satis']
+    city_perf = decategorize(city_perf)
     city_perf['Toplam_Pazar'] = city_perf['PF_Satis'] + city_perf['Rakip_Satis']
     city_perf['Pazar_Payi_%'] = safe_divide(city_perf['PF_Satis'], city_perf['Toplam_Pazar']) * 100
     
@@ -1430,15 +3288,11 @@ def calculate_territory_performance(df, product, date_filter=None):
     """Territory bazlı performans"""
     cols = get_product_columns(product)
     
-    if date_filter:
-        df = df[(df['DATE'] >= date_filter[0]) & (df['DATE'] <= date_filter[1])]
-    
-    terr_perf = df.groupby(['TERRITORIES', 'REGION', 'CITY', 'MANAGER']).agg({
-        cols['pf']: 'sum',
-        cols['rakip']: 'sum'
-    }).reset_index()
+    terr_perf = aggregate_all_products(df, ('TERRITORIES', 'REGION', 'CITY', 'MANAGER'), date_filter)
+    terr_perf = terr_perf[['TERRITORIES', 'REGION', 'CITY', 'MANAGER', cols['pf'], cols['rakip']]]
     
     terr_perf.columns = ['Territory', 'Region', 'City', 'Manager', 'PF_Satis', 'Rakip_Satis']
+    terr_perf = decategorize(terr_perf)
     terr_perf['Toplam_Pazar'] = terr_perf['PF_Satis'] + terr_perf['Rakip_Satis']
     terr_perf['Pazar_Payi_%'] = safe_divide(terr_perf['PF_Satis'], terr_perf['Toplam_Pazar']) * 100
     
@@ -1452,15 +3306,11 @@ def calculate_competitor_analysis(df, product, date_filter=None):
     """Rakip analizi"""
     cols = get_product_columns(product)
     
-    if date_filter:
-        df = df[(df['DATE'] >= date_filter[0]) & (df['DATE'] <= date_filter[1])]
-    
-    monthly = df.groupby('YIL_AY').agg({
-        cols['pf']: 'sum',
-        cols['rakip']: 'sum'
-    }).reset_index().sort_values('YIL_AY')
+    monthly = aggregate_all_products(df, ('YIL_AY',), date_filter)
+    monthly = monthly[['YIL_AY', cols['pf'], cols['rakip']]].sort_values('YIL_AY')
     
     monthly.columns = ['YIL_AY', 'PF', 'Rakip']
+    monthly['YIL_AY'] = format_month_key(monthly['YIL_AY'])
     monthly['PF_Pay_%'] = (monthly['PF'] / (monthly['PF'] + monthly['Rakip'])) * 100
     monthly['Rakip_Pay_%'] = 100 - monthly['PF_Pay_%']
     monthly['PF_Buyume'] = monthly['PF'].pct_change() * 100
@@ -1469,53 +3319,128 @@ def calculate_competitor_analysis(df, product, date_filter=None):
     
     return monthly
 
-def calculate_bcg_matrix(df, product, date_filter=None):
-    """BCG Matrix"""
+def calculate_level_performance(df, product, level, date_filter=None):
+    """Şehir / manager gibi tek bir boyut seviyesinde performans
+    
+    Her isim tek satırdır; bölge olarak en yüksek PF satışının geldiği bölge alınır.
+    """
     cols = get_product_columns(product)
+    name_col = LEVEL_LABELS[level]
     
-    if date_filter:
-        df_filtered = df[(df['DATE'] >= date_filter[0]) & (df['DATE'] <= date_filter[1])]
-    else:
-        df_filtered = df.copy()
+    perf = aggregate_all_products(df, (level, 'REGION'), date_filter)
+    perf = decategorize(perf[[level, 'REGION', cols['pf'], cols['rakip']]])
+    perf.columns = [name_col, 'Region', 'PF_Satis', 'Rakip_Satis']
     
-    terr_perf = calculate_territory_performance(df_filtered, product)
+    perf = perf.sort_values('PF_Satis', ascending=False, kind='stable')
+    perf = perf.groupby(name_col, sort=False).agg(
+        Region=('Region', 'first'), PF_Satis=('PF_Satis', 'sum'), Rakip_Satis=('Rakip_Satis', 'sum')
+    ).reset_index()
     
-    df_sorted = df_filtered.sort_values('DATE')
-    mid_point = len(df_sorted) // 2
+    perf['Toplam_Pazar'] = perf['PF_Satis'] + perf['Rakip_Satis']
+    perf['Pazar_Payi_%'] = safe_divide(perf['PF_Satis'], perf['Toplam_Pazar']) * 100
     
-    first_half = df_sorted.iloc[:mid_point].groupby('TERRITORIES')[cols['pf']].sum()
-    second_half = df_sorted.iloc[mid_point:].groupby('TERRITORIES')[cols['pf']].sum()
+    total_pf = perf['PF_Satis'].sum()
+    perf['Agirlik_%'] = safe_divide(perf['PF_Satis'], total_pf) * 100
+    perf['Goreceli_Pazar_Payi'] = safe_divide(perf['PF_Satis'], perf['Rakip_Satis'])
     
-    growth_rate = {}
-    for terr in first_half.index:
-        if terr in second_half.index and first_half[terr] > 0:
-            growth_rate[terr] = ((second_half[terr] - first_half[terr]) / first_half[terr]) * 100
-        else:
-            growth_rate[terr] = 0
+    return perf.sort_values('PF_Satis', ascending=False)
+
+def calculate_period_growth(df, product, level='TERRITORIES'):
+    """Dönemin ilk yarısına göre ikinci yarısındaki PF büyümesi (%)
+    
+    Dönem takvim aylarına göre ikiye bölünür; ay sayısı tekse ortadaki ay
+    karşılaştırmaya katılmaz. İlk yarıda satışı olmayan veya ikinci yarıda
+    hiç kaydı bulunmayan isimler için büyüme 0 kabul edilir.
+    """
+    cols = get_product_columns(product)
+    if len(df) == 0:
+        return pd.Series(dtype=float)
+    
+    month_index = (df['DATE'].dt.year * 12 + df['DATE'].dt.month).to_numpy()
+    offset = month_index - month_index.min()
+    n_months = offset.max() + 1
+    half_len = n_months // 2
+    half = np.select([offset < half_len, offset >= n_months - half_len], [0, 1], default=-1)
+    
+    in_halves = half >= 0
+    halves = (
+        df.loc[in_halves, cols['pf']]
+        .groupby([df.loc[in_halves, level].to_numpy(), half[in_halves]])
+        .sum()
+        .unstack()
+        .reindex(columns=[0, 1])
+    )
     
-    terr_perf['Pazar_Buyume_%'] = terr_perf['Territory'].map(growth_rate).fillna(0)
+    first, second = halves[0], halves[1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where((first > 0) & second.notna(), (second - first) / first * 100, 0)
+    return pd.Series(growth, index=halves.index.astype(str))
+
+def calculate_bcg_matrix(df, product, date_filter=None, level='TERRITORIES'):
+    """BCG Matrix (territory, şehir veya manager seviyesinde)"""
+    name_col = LEVEL_LABELS[level]
     
-    median_share = terr_perf['Goreceli_Pazar_Payi'].median()
-    median_growth = terr_perf['Pazar_Buyume_%'].median()
+    if level == 'TERRITORIES':
+        bcg_df = calculate_territory_performance(df, product, date_filter)
+    else:
+        bcg_df = calculate_level_performance(df, product, level, date_filter)
     
-    def assign_bcg(row):
-        if row['Goreceli_Pazar_Payi'] >= median_share and row['Pazar_Buyume_%'] >= median_growth:
-            return "⭐ Star"
-        elif row['Goreceli_Pazar_Payi'] >= median_share and row['Pazar_Buyume_%'] < median_growth:
-            return "🐄 Cash Cow"
-        elif row['Goreceli_Pazar_Payi'] < median_share and row['Pazar_Buyume_%'] >= median_growth:
-            return "❓ Question Mark"
-        else:
-            return "🐶 Dog"
+    growth_rate = calculate_period_growth(filter_date_range(df, date_filter), product, level)
+    bcg_df['Pazar_Buyume_%'] = bcg_df[name_col].astype(str).map(growth_rate).fillna(0)
     
-    terr_perf['BCG_Kategori'] = terr_perf.apply(assign_bcg, axis=1)
+    median_share = bcg_df['Goreceli_Pazar_Payi'].median()
+    median_growth = bcg_df['Pazar_Buyume_%'].median()
     
-    return terr_perf
+    high_share = (bcg_df['Goreceli_Pazar_Payi'] >= median_share).to_numpy()
+    high_growth = (bcg_df['Pazar_Buyume_%'] >= median_growth).to_numpy()
+    bcg_df['BCG_Kategori'] = np.select(
+        [high_share & high_growth, high_share, high_growth],
+        ["⭐ Star", "🐄 Cash Cow", "❓ Question Mark"],
+        default="🐶 Dog"
+    ).astype(object)
+    
+    return bcg_df
 
 # =============================================================================
 # YATIRIM STRATEJİSİ - GELİŞTİRİLMİŞ ALGORİTMA
 # =============================================================================
 
+# Yatırım stratejisi kuralları: sırayla değerlendirilir, ilk eşleşen kural atanır.
+# Her kural segment kolonu -> kabul edilen segment değerleri eşlemesidir.
+INVESTMENT_STRATEGY_RULES = [
+    ("🚀 Agresif", {
+        "Pazar_Büyüklüğü": ["Büyük", "Orta"],
+        "Pazar_Payı_Segment": ["Düşük"],
+        "Büyüme_Potansiyeli": ["Yüksek", "Orta"]
+    }),
+    ("⚡ Hızlandırılmış", {
+        "Pazar_Büyüklüğü": ["Büyük", "Orta"],
+        "Pazar_Payı_Segment": ["Orta"],
+        "Performans": ["Orta", "Yüksek"]
+    }),
+    ("🛡️ Koruma", {
+        "Pazar_Büyüklüğü": ["Büyük"],
+        "Pazar_Payı_Segment": ["Yüksek"]
+    }),
+    ("💎 Potansiyel", {
+        "Pazar_Büyüklüğü": ["Küçük"],
+        "Büyüme_Potansiyeli": ["Yüksek"],
+        "Performans": ["Orta", "Yüksek"]
+    })
+]
+INVESTMENT_DEFAULT_STRATEGY = "👁️ İzleme"
+
+def assign_investment_strategy(df, rules=INVESTMENT_STRATEGY_RULES, default=INVESTMENT_DEFAULT_STRATEGY):
+    """Kural tablosunu tüm satırlara dizi işlemleriyle uygula"""
+    conditions = []
+    for _, criteria in rules:
+        matched = np.ones(len(df), dtype=bool)
+        for col, allowed in criteria.items():
+            matched &= df[col].isin(allowed).to_numpy()
+        conditions.append(matched)
+    
+    return np.select(conditions, [strategy for strategy, _ in rules], default=default).astype(object)
+
 def calculate_investment_strategy(city_perf):
     """
     Geliştirilmiş Yatırım Stratejisi Algoritması
@@ -1572,35 +3497,7 @@ def calculate_investment_strategy(city_perf):
         df["Büyüme_Potansiyeli"] = "Orta"
     
     # 5. STRATEJİ ATAMA
-    def assign_strategy(row):
-        pazar_buyuklugu = str(row["Pazar_Büyüklüğü"])
-        pazar_payi = str(row["Pazar_Payı_Segment"])
-        buyume_potansiyeli = str(row["Büyüme_Potansiyeli"])
-        performans = str(row["Performans"])
-        
-        if (pazar_buyuklugu in ["Büyük", "Orta"] and 
-            pazar_payi == "Düşük" and 
-            buyume_potansiyeli in ["Yüksek", "Orta"]):
-            return "🚀 Agresif"
-        
-        elif (pazar_buyuklugu in ["Büyük", "Orta"] and 
-              pazar_payi == "Orta" and
-              performans in ["Orta", "Yüksek"]):
-            return "⚡ Hızlandırılmış"
-        
-        elif (pazar_buyuklugu == "Büyük" and 
-              pazar_payi == "Yüksek"):
-            return "🛡️ Koruma"
-        
-        elif (pazar_buyuklugu == "Küçük" and 
-              buyume_potansiyeli == "Yüksek" and
-              performans in ["Orta", "Yüksek"]):
-            return "💎 Potansiyel"
-        
-        else:
-            return "👁️ İzleme"
-    
-    df["Yatırım_Stratejisi"] = df.apply(assign_strategy, axis=1)
+    df["Yatırım_Stratejisi"] = assign_investment_strategy(df)
     
     return df
 
@@ -1891,6 +3788,72 @@ def create_comparative_period_chart(comparisons_df):
     
     return fig
 
+def create_decomposition_chart(components):
+    """Trend / mevsimsel / artık bileşen grafiği"""
+    if components is None or len(components) == 0:
+        return None
+    
+    x = pd.to_datetime(components['YIL_AY'] + '-01')
+    
+    fig = go.Figure()
+    
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=components['PF_Satis'],
+        mode='lines',
+        name='PF Satış',
+        line=dict(color='rgba(148, 163, 184, 0.6)', width=1.5)
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=components['Trend'],
+        mode='lines',
+        name='Trend',
+        line=dict(color=PERFORMANCE_COLORS['high'], width=3)
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=components['Mevsimsel'],
+        mode='lines+markers',
+        name='Mevsimsel',
+        line=dict(color=PERFORMANCE_COLORS['medium'], width=2),
+        yaxis='y2'
+    ))
+    
+    fig.add_trace(go.Bar(
+        x=x,
+        y=components['Artik'],
+        name='Artık',
+        marker_color='rgba(100, 116, 139, 0.5)',
+        yaxis='y2'
+    ))
+    
+    fig.update_layout(
+        title=dict(
+            text='<b>Mevsimsel Ayrıştırma (Trend + Mevsimsel + Artık)</b>',
+            font=dict(size=22, color='white', family='Inter')
+        ),
+        xaxis_title='<b>Tarih</b>',
+        yaxis=dict(title='<b>PF Satış / Trend</b>'),
+        yaxis2=dict(title='<b>Mevsimsel / Artık</b>', overlaying='y', side='right', showgrid=False),
+        height=500,
+        hovermode='x unified',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='#e2e8f0', family='Inter'),
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        )
+    )
+    
+    return fig
+
 def create_seasonality_chart(monthly_df):
     """Mevsimsellik analizi grafiği"""
     if 'Month' not in monthly_df.columns or len(monthly_df) < 12:
@@ -2147,7 +4110,7 @@ def create_modern_growth_chart(comp_data):
     
     return fig
 
-def create_modern_bcg_chart(bcg_df):
+def create_modern_bcg_chart(bcg_df, name_col='Territory'):
     """Modern BCG Matrix - McKinsey tarzı"""
     fig = px.scatter(
         bcg_df,
@@ -2156,7 +4119,7 @@ def create_modern_bcg_chart(bcg_df):
         size='PF_Satis',
         color='BCG_Kategori',
         color_discrete_map=BCG_COLORS,
-        hover_name='Territory',
+        hover_name=name_col,
         hover_data={
             'Region': True,
             'PF_Satis': ':,.0f',
@@ -2323,1236 +4286,1732 @@ def style_dataframe(df, color_column=None, gradient_columns=None):
     return styled_df
 
 # =============================================================================
-# MAIN APP - GELİŞTİRİLMİŞ VERSİYON
+# HESAPLAMA GRAFI - SEKMELER ARASI PAYLAŞILAN SONUÇLAR
 # =============================================================================
 
-def main():
-    # Başlık ve açıklama
-    st.markdown('<h1 class="main-header">🎯 GELİŞMİŞ TİCARİ PORTFÖY ANALİZ SİSTEMİ</h1>', unsafe_allow_html=True)
-    st.markdown('<div style="text-align: center; font-size: 1.2rem; color: #94a3b8; margin-bottom: 3rem;">'
-                'GERÇEK ML Tahminleme • Gelişmiş Zaman Serisi Analizi • Modern Harita • Rakip Analizi'
-                '</div>', unsafe_allow_html=True)
-    
-    # SIDEBAR
-    with st.sidebar:
-        st.markdown('<div style="background: linear-gradient(135deg, #3B82F6 0%, #10B981 100%); '
-                   'padding: 1rem; border-radius: 12px; margin-bottom: 2rem;">'
-                   '<h3 style="color: white; margin: 0; text-align: center;">📂 VERİ YÜKLEME</h3>'
-                   '</div>', unsafe_allow_html=True)
+CALC_GRAPH_MAX_ENTRIES = 64
+
+def get_calc_graph():
+    """Oturumdaki hesaplama grafını döndür (yoksa oluştur)"""
+    if '_calc_graph' not in st.session_state:
+        st.session_state['_calc_graph'] = {
+            'results': {},
+            'hits': 0, 'misses': 0,
+            'run_hits': 0, 'run_misses': 0
+        }
+    return st.session_state['_calc_graph']
+
+def start_calc_run():
+    """Yeni bir rerun için tur sayaçlarını sıfırla"""
+    graph = get_calc_graph()
+    graph['run_hits'] = 0
+    graph['run_misses'] = 0
+    return graph
+
+def make_calc_scope(dataset_hash, compact, product, filters, date_filter):
+    """Ürün, filtreler ve tarih aralığından hesaplama kapsamı anahtarı"""
+    return (dataset_hash, compact, product, tuple(sorted(filters.items())), date_filter)
+
+def _share_result(value):
+    """Paylaşılan sonucun derin kopyası
+    
+    Çağıranlar tabloları yerinde değiştirebilir (df.loc[...] =, fillna(inplace=True)); yüzeysel
+    kopya bu yazımları diğer sekmelerle paylaşılan önbellek nesnesine geçirirdi. Sonuçlar küçük
+    türetilmiş tablolar olduğundan kopya maliyeti hesaplamaya göre ihmal edilebilir.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=True)
+    if isinstance(value, tuple):
+        return tuple(_share_result(v) for v in value)
+    return value
+
+def compute_node(scope, node, func, *args):
+    """Türetilmiş tabloyu kapsam başına bir kez hesapla, sonraki çağrılarda paylaş
+    
+    node: düğüm adı veya kapsama ek parametreleri içeren tuple
+    """
+    graph = get_calc_graph()
+    results = graph['results']
+    key = (scope, node)
+    
+    if key in results:
+        graph['hits'] += 1
+        graph['run_hits'] += 1
+        results[key] = results.pop(key)  # en son kullanılan sona
+        return _share_result(results[key])
+    
+    graph['misses'] += 1
+    graph['run_misses'] += 1
+    value = func(*args)
+    results[key] = value
+    while len(results) > CALC_GRAPH_MAX_ENTRIES:
+        results.pop(next(iter(results)))
+    return _share_result(value)
+
+# =============================================================================
+# SEKME İÇERİKLERİ
+# =============================================================================
+
+def render_overview_tab(ctx):
+    """Genel bakış sekmesi"""
+    selected_product = ctx['selected_product']
+    cube_filtered = ctx['cube_filtered']
+    date_filter = ctx['date_filter']
+    calc_scope = ctx['calc_scope']
+    
+    st.header("📊 Genel Performans Özeti")
+    
+    cols = get_product_columns(selected_product)
+    
+    df_period = filter_date_range(cube_filtered, date_filter)
+    
+    # Metrikler
+    total_pf = df_period[cols['pf']].sum()
+    total_rakip = df_period[cols['rakip']].sum()
+    total_market = total_pf + total_rakip
+    market_share = (total_pf / total_market * 100) if total_market > 0 else 0
+    active_territories = df_period['TERRITORIES'].nunique()
+    avg_monthly_pf = total_pf / df_period['YIL_AY'].nunique() if df_period['YIL_AY'].nunique() > 0 else 0
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("💊 PF Satış", format_number(total_pf), f"{format_number(avg_monthly_pf)}/ay")
+    with col2:
+        st.metric("🏪 Toplam Pazar", format_number(total_market), f"{format_number(total_rakip)} rakip")
+    with col3:
+        st.metric("📊 Pazar Payı", format_percentage(market_share), 
+                 f"{format_percentage(100-market_share)} rakip")
+    with col4:
+        st.metric("🏢 Active Territory", str(active_territories), 
+                 f"{df_period['MANAGER'].nunique()} manager")
+    
+    st.markdown("---")
+    
+    # Top 10 Territory
+    st.subheader("🏆 Top 10 Territory Performansı")
+    terr_perf = compute_node(calc_scope, 'territory_performance',
+                             calculate_territory_performance, cube_filtered, selected_product, date_filter)
+    top10 = terr_perf.head(10)
+    
+    # Toplam Pazar % ekle
+    total_market_all = terr_perf['Toplam_Pazar'].sum()
+    top10['Toplam_Pazar_%'] = safe_divide(top10['Toplam_Pazar'], total_market_all) * 100
+    
+    col_chart1, col_chart2 = st.columns([2, 1])
+    
+    with col_chart1:
+        fig_top10 = go.Figure()
         
-        uploaded_file = st.file_uploader("Excel Dosyası Yükleyin", type=['xlsx', 'xls'])
+        pf_texts = [format_number(x) for x in top10['PF_Satis']]
+        rakip_texts = [format_number(x) for x in top10['Rakip_Satis']]
         
-        if not uploaded_file:
-            st.info("👈 Lütfen sol taraftan Excel dosyasını yükleyin")
-            st.stop()
+        fig_top10.add_trace(go.Bar(
+            x=top10['Territory'],
+            y=top10['PF_Satis'],
+            name='PF Satış',
+            marker_color=PERFORMANCE_COLORS['success'],
+            text=pf_texts,
+            textposition='outside',
+            marker=dict(
+                line=dict(width=2, color='rgba(255, 255, 255, 0.8)')
+            )
+        ))
         
-        try:
-            df = load_excel_data(uploaded_file)
-            gdf = load_geojson_gpd()
-            geojson = load_geojson_json()
-            st.success(f"✅ **{len(df):,}** satır veri yüklendi")
-        except Exception as e:
-            st.error(f"❌ Veri yükleme hatası: {str(e)}")
-            st.stop()
+        fig_top10.add_trace(go.Bar(
+            x=top10['Territory'],
+            y=top10['Rakip_Satis'],
+            name='Rakip Satış',
+            marker_color=PERFORMANCE_COLORS['danger'],
+            text=rakip_texts,
+            textposition='outside',
+            marker=dict(
+                line=dict(width=2, color='rgba(255, 255, 255, 0.8)')
+            )
+        ))
         
-        st.markdown("---")
+        fig_top10.update_layout(
+            title=dict(
+                text='<b>Top 10 Territory - PF vs Rakip</b>',
+                font=dict(size=18, color='white')
+            ),
+            xaxis_title='<b>Territory</b>',
+            yaxis_title='<b>Satış</b>',
+            barmode='group',
+            height=500,
+            xaxis=dict(tickangle=-45),
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='#e2e8f0'),
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1
+            ),
+            yaxis=dict(
+                tickformat=',.0f'
+            )
+        )
         
-        # Ürün Seçimi
-        st.markdown('<div style="background: rgba(30, 41, 59, 0.7); padding: 1rem; border-radius: 10px; margin: 1rem 0;">'
-                   '<h4 style="color: #e2e8f0; margin: 0 0 1rem 0;">💊 ÜRÜN SEÇİMİ</h4>', unsafe_allow_html=True)
-        selected_product = st.selectbox("", ["TROCMETAM", "CORTIPOL", "DEKSAMETAZON", "PF IZOTONIK"], label_visibility="collapsed")
-        st.markdown('</div>', unsafe_allow_html=True)
+        st.plotly_chart(fig_top10, use_container_width=True)
+    
+    with col_chart2:
+        top5 = top10.head(5)
+        fig_pie = px.pie(
+            top5,
+            values='PF_Satis',
+            names='Territory',
+            title='<b>Top 5 Territory Dağılımı</b>',
+            color_discrete_sequence=GRADIENT_SCALES['blue_green'],
+            hole=0.4
+        )
         
-        st.markdown("---")
+        fig_pie.update_layout(
+            height=500,
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='#e2e8f0'),
+            legend=dict(
+                orientation="v",
+                yanchor="middle",
+                y=0.5,
+                xanchor="right",
+                x=1.3
+            )
+        )
         
-        # Tarih Aralığı
-        st.markdown('<div style="background: rgba(30, 41, 59, 0.7); padding: 1rem; border-radius: 10px; margin: 1rem 0;">'
-                   '<h4 style="color: #e2e8f0; margin: 0 0 1rem 0;">📅 TARİH ARALIĞI</h4>', unsafe_allow_html=True)
+        fig_pie.update_traces(
+            textposition='inside',
+            textinfo='percent+label',
+            marker=dict(line=dict(color='rgba(255, 255, 255, 0.8)', width=2))
+        )
         
-        min_date = df['DATE'].min()
-        max_date = df['DATE'].max()
+        st.plotly_chart(fig_pie, use_container_width=True)
+    
+    # Detaylı Tablo
+    st.markdown("---")
+    st.subheader("📋 Top 10 Territory Detayları")
+    
+    display_cols = ['Territory', 'Region', 'City', 'Manager', 'PF_Satis', 'Toplam_Pazar', 'Toplam_Pazar_%', 'Pazar_Payi_%', 'Agirlik_%']
+    
+    top10_display = top10[display_cols].copy()
+    top10_display.columns = ['Territory', 'Region', 'City', 'Manager', 'PF Satış', 'Toplam Pazar', 'Toplam Pazar %', 'Pazar Payı %', 'Ağırlık %']
+    top10_display.index = range(1, len(top10_display) + 1)
+    
+    styled_df = style_dataframe(
+        top10_display,
+        color_column='Pazar Payı %',
+        gradient_columns=['Toplam Pazar %', 'Ağırlık %']
+    )
+    
+    st.dataframe(
+        styled_df,
+        use_container_width=True,
+        height=400
+    )
+
+def render_map_tab(ctx):
+    """Modern harita sekmesi"""
+    selected_product = ctx['selected_product']
+    cube_filtered = ctx['cube_filtered']
+    date_filter = ctx['date_filter']
+    calc_scope = ctx['calc_scope']
+    gdf = ctx['gdf']
+    view_mode = ctx['view_mode']
+    selected_strateji = ctx['selected_strateji']
+    
+    st.header("🗺️ Modern Türkiye Haritası")
+    
+    # Harita için Bölge Filtresi
+    col_map_filter1, col_map_filter2 = st.columns(2)
+    with col_map_filter1:
+        unique_regions = ["TÜMÜ"] + sorted(cube_filtered['REGION'].dropna().unique())
+        selected_map_region = st.selectbox(
+            "Harita için Bölge Seçin",
+            unique_regions,
+            key='map_region_filter'
+        )
+    
+    # Şehir performans verisini BÖLGEYE GÖRE FİLTRELE
+    city_data = compute_node(calc_scope, 'city_performance',
+                             calculate_city_performance, cube_filtered, selected_product, date_filter)
+    if selected_map_region != "TÜMÜ":
+        city_data = city_data[city_data['Region'] == selected_map_region]
+    
+    # Yatırım stratejisini FİLTRELENMİŞ veri ile hesapla
+    investment_df = calculate_investment_strategy(city_data)
+    filtered_pf_toplam = city_data['PF_Satis'].sum()
+    
+    # Quick Stats
+    col1, col2, col3, col4, col5 = st.columns(5)
+    
+    total_pf = city_data['PF_Satis'].sum()
+    total_market = city_data['Toplam_Pazar'].sum()
+    avg_share = city_data['Pazar_Payi_%'].mean()
+    active_cities = len(city_data[city_data['PF_Satis'] > 0])
+    top_city = city_data.loc[city_data['PF_Satis'].idxmax(), 'City'] if len(city_data) > 0 else "Yok"
+    
+    with col1:
+        st.metric("💊 PF Satış", format_number(total_pf))
+    with col2:
+        st.metric("🏪 Toplam Pazar", format_number(total_market))
+    with col3:
+        st.metric("📊 Ort. Pazar Payı", format_percentage(avg_share))
+    with col4:
+        st.metric("🏙️ Aktif Şehir", str(active_cities))
+    with col5:
+        st.metric("🏆 Lider Şehir", top_city)
+    
+    st.markdown("---")
+    
+    # Modern Harita
+    if gdf is not None:
+        st.subheader(f"📍 İl Bazlı Dağılım - {selected_map_region if selected_map_region != 'TÜMÜ' else 'Tüm Bölgeler'}")
         
-        date_option = st.selectbox("Dönem Seçin", ["Tüm Veriler", "Son 3 Ay", "Son 6 Ay", "Son 1 Yıl", "2025", "2024", "Özel Aralık"])
+        turkey_map = create_modern_turkey_map(
+            city_data, 
+            gdf, 
+            title=f"{selected_product} - {view_mode} - {selected_map_region if selected_map_region != 'TÜMÜ' else 'Tüm Bölgeler'}",
+            view_mode=view_mode,
+            filtered_pf_toplam=filtered_pf_toplam
+        )
         
-        if date_option == "Tüm Veriler":
-            date_filter = None
-        elif date_option == "Son 3 Ay":
-            start_date = max_date - pd.DateOffset(months=3)
-            date_filter = (start_date, max_date)
-        elif date_option == "Son 6 Ay":
-            start_date = max_date - pd.DateOffset(months=6)
-            date_filter = (start_date, max_date)
-        elif date_option == "Son 1 Yıl":
-            start_date = max_date - pd.DateOffset(years=1)
-            date_filter = (start_date, max_date)
-        elif date_option == "2025":
-            date_filter = (pd.to_datetime('2025-01-01'), pd.to_datetime('2025-12-31'))
-        elif date_option == "2024":
-            date_filter = (pd.to_datetime('2024-01-01'), pd.to_datetime('2024-12-31'))
+        if turkey_map:
+            st.plotly_chart(turkey_map, use_container_width=True)
         else:
-            col_date1, col_date2 = st.columns(2)
-            with col_date1:
-                start_date = st.date_input("Başlangıç", min_date, min_value=min_date, max_value=max_date)
-            with col_date2:
-                end_date = st.date_input("Bitiş", max_date, min_value=min_date, max_value=max_date)
-            date_filter = (pd.to_datetime(start_date), pd.to_datetime(end_date))
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        st.markdown("---")
-        
-        # Filtreler
-        st.markdown('<div style="background: rgba(30, 41, 59, 0.7); padding: 1rem; border-radius: 10px; margin: 1rem 0;">'
-                   '<h4 style="color: #e2e8f0; margin: 0 0 1rem 0;">🔍 FİLTRELER</h4>', unsafe_allow_html=True)
+            st.error("❌ Harita oluşturulamadı")
+    else:
+        st.warning("⚠️ turkey.geojson bulunamadı")
+    
+    st.markdown("---")
+    
+    # Şehir Analizi
+    col_analysis1, col_analysis2 = st.columns(2)
+    
+    with col_analysis1:
+        st.subheader("🏆 Top 10 Şehir")
+        top_cities = city_data.nlargest(10, 'PF_Satis')
         
-        territories = ["TÜMÜ"] + sorted(df['TERRITORIES'].unique())
-        selected_territory = st.selectbox("Territory", territories)
+        bar_texts = [format_number(x) for x in top_cities['PF_Satis']]
         
-        regions = ["TÜMÜ"] + sorted(df['REGION'].unique())
-        selected_region = st.selectbox("Bölge", regions)
+        fig_bar = px.bar(
+            top_cities,
+            x='City',
+            y='PF_Satis',
+            title='<b>En Yüksek Satış Yapan Şehirler</b>',
+            color='Region',
+            color_discrete_map=REGION_COLORS,
+            hover_data=['Region', 'PF_Satis', 'Pazar_Payi_%'],
+            text=bar_texts
+        )
         
-        managers = ["TÜMÜ"] + sorted(df['MANAGER'].unique())
-        selected_manager = st.selectbox("Manager", managers)
+        fig_bar.update_layout(
+            height=500,
+            xaxis_tickangle=-45,
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='#e2e8f0'),
+            yaxis_title='<b>PF Satış</b>',
+            xaxis_title='<b>Şehir</b>',
+            yaxis=dict(
+                tickformat=',.0f'
+            )
+        )
         
-        st.markdown('</div>', unsafe_allow_html=True)
+        fig_bar.update_traces(
+            textposition='outside',
+            marker=dict(line=dict(width=2, color='rgba(255, 255, 255, 0.8)'))
+        )
         
-        # Veri filtreleme
-        df_filtered = df.copy()
-        if selected_territory != "TÜMÜ":
-            df_filtered = df_filtered[df_filtered['TERRITORIES'] == selected_territory]
-        if selected_region != "TÜMÜ":
-            df_filtered = df_filtered[df_filtered['REGION'] == selected_region]
-        if selected_manager != "TÜMÜ":
-            df_filtered = df_filtered[df_filtered['MANAGER'] == selected_manager]
+        st.plotly_chart(fig_bar, use_container_width=True)
+    
+    with col_analysis2:
+        st.subheader("🗺️ Bölge Dağılımı")
         
-        st.markdown("---")
+        region_perf = city_data.groupby('Region', observed=True).agg({
+            'PF_Satis': 'sum',
+            'Toplam_Pazar': 'sum'
+        }).reset_index()
         
-        # Harita Ayarları
-        st.markdown('<div style="background: rgba(30, 41, 59, 0.7); padding: 1rem; border-radius: 10px; margin: 1rem 0;">'
-                   '<h4 style="color: #e2e8f0; margin: 0 0 1rem 0;">🗺️ HARİTA AYARLARI</h4>', unsafe_allow_html=True)
+        region_perf['Pazar_Payi_%'] = safe_divide(region_perf['PF_Satis'], region_perf['Toplam_Pazar']) * 100
         
-        view_mode = st.radio(
-            "Görünüm Modu",
-            ["Bölge Görünümü", "Şehir Görünümü"],
-            index=0
+        fig_pie = px.pie(
+            region_perf,
+            values='PF_Satis',
+            names='Region',
+            title='<b>Bölgelere Göre Satış Dağılımı</b>',
+            color='Region',
+            color_discrete_map=REGION_COLORS,
+            hole=0.3
         )
         
-        # Yatırım stratejisi filtresi
-        strateji_list = ["Tümü", "🚀 Agresif", "⚡ Hızlandırılmış", "🛡️ Koruma", "💎 Potansiyel", "👁️ İzleme"]
-        selected_strateji = st.selectbox("Yatırım Stratejisi", strateji_list)
+        fig_pie.update_layout(
+            height=500,
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='#e2e8f0'),
+            showlegend=True,
+            legend=dict(
+                orientation="v",
+                yanchor="middle",
+                y=0.5,
+                xanchor="right",
+                x=1.3
+            )
+        )
         
-        st.markdown('</div>', unsafe_allow_html=True)
+        fig_pie.update_traces(
+            textposition='inside',
+            textinfo='percent+label',
+            marker=dict(line=dict(color='rgba(255, 255, 255, 0.8)', width=2))
+        )
         
-        # Renk Legend
-        st.markdown("---")
-        st.markdown('<h4 style="color: #e2e8f0;">🎨 BÖLGE RENKLERİ</h4>', unsafe_allow_html=True)
-        for region, color in list(REGION_COLORS.items())[:5]:
-            st.markdown(f'<div style="display: flex; align-items: center; margin: 0.3rem 0;">'
-                       f'<div style="width: 12px; height: 12px; background-color: {color}; border-radius: 2px; margin-right: 8px;"></div>'
-                       f'<span style="color: #cbd5e1; font-size: 0.9rem;">{region}</span>'
-                       f'</div>', unsafe_allow_html=True)
+        st.plotly_chart(fig_pie, use_container_width=True)
     
-    # ANA İÇERİK - TAB'LER
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
-        "📊 Genel Bakış",
-        "🗺️ Modern Harita",
-        "🏢 Territory Analizi",
-        "📈 Gelişmiş Zaman Serisi",
-        "🎯 Rakip Analizi",
-        "⭐ BCG & Strateji",
-        "📥 Raporlar"
-    ])
+    # Yatırım Stratejisi
+    st.markdown("---")
+    st.subheader("🎯 Yatırım Stratejisi Analizi")
     
-    # TAB 1: GENEL BAKIŞ
-    with tab1:
-        st.header("📊 Genel Performans Özeti")
-        
-        cols = get_product_columns(selected_product)
-        
-        if date_filter:
-            df_period = df_filtered[(df_filtered['DATE'] >= date_filter[0]) & (df_filtered['DATE'] <= date_filter[1])]
-        else:
-            df_period = df_filtered
+    if len(investment_df) > 0:
+        strategy_counts = investment_df['Yatırım_Stratejisi'].value_counts()
         
-        # Metrikler
-        total_pf = df_period[cols['pf']].sum()
-        total_rakip = df_period[cols['rakip']].sum()
-        total_market = total_pf + total_rakip
-        market_share = (total_pf / total_market * 100) if total_market > 0 else 0
-        active_territories = df_period['TERRITORIES'].nunique()
-        avg_monthly_pf = total_pf / df_period['YIL_AY'].nunique() if df_period['YIL_AY'].nunique() > 0 else 0
-        
-        col1, col2, col3, col4 = st.columns(4)
+        cols_strategy = st.columns(5)
+        strategy_metrics = [
+            ("🚀 Agresif", "Agresif"),
+            ("⚡ Hızlandırılmış", "Hızlandırılmış"),
+            ("🛡️ Koruma", "Koruma"),
+            ("💎 Potansiyel", "Potansiyel"),
+            ("👁️ İzleme", "İzleme")
+        ]
         
-        with col1:
-            st.metric("💊 PF Satış", format_number(total_pf), f"{format_number(avg_monthly_pf)}/ay")
-        with col2:
-            st.metric("🏪 Toplam Pazar", format_number(total_market), f"{format_number(total_rakip)} rakip")
-        with col3:
-            st.metric("📊 Pazar Payı", format_percentage(market_share), 
-                     f"{format_percentage(100-market_share)} rakip")
-        with col4:
-            st.metric("🏢 Active Territory", str(active_territories), 
-                     f"{df_period['MANAGER'].nunique()} manager")
+        for idx, (strategy_key, strategy_name) in enumerate(strategy_metrics):
+            with cols_strategy[idx]:
+                count = strategy_counts.get(strategy_key, 0)
+                total_value = investment_df[investment_df['Yatırım_Stratejisi'] == strategy_key]['PF_Satis'].sum()
+                st.metric(
+                    strategy_name,
+                    f"{count} şehir",
+                    f"{format_number(total_value)} PF"
+                )
         
         st.markdown("---")
         
-        # Top 10 Territory
-        st.subheader("🏆 Top 10 Territory Performansı")
-        terr_perf = calculate_territory_performance(df_filtered, selected_product, date_filter)
-        top10 = terr_perf.head(10)
-        
-        # Toplam Pazar % ekle
-        total_market_all = terr_perf['Toplam_Pazar'].sum()
-        top10['Toplam_Pazar_%'] = safe_divide(top10['Toplam_Pazar'], total_market_all) * 100
-        
-        col_chart1, col_chart2 = st.columns([2, 1])
-        
-        with col_chart1:
-            fig_top10 = go.Figure()
-            
-            pf_texts = [format_number(x) for x in top10['PF_Satis']]
-            rakip_texts = [format_number(x) for x in top10['Rakip_Satis']]
-            
-            fig_top10.add_trace(go.Bar(
-                x=top10['Territory'],
-                y=top10['PF_Satis'],
-                name='PF Satış',
-                marker_color=PERFORMANCE_COLORS['success'],
-                text=pf_texts,
-                textposition='outside',
-                marker=dict(
-                    line=dict(width=2, color='rgba(255, 255, 255, 0.8)')
-                )
-            ))
-            
-            fig_top10.add_trace(go.Bar(
-                x=top10['Territory'],
-                y=top10['Rakip_Satis'],
-                name='Rakip Satış',
-                marker_color=PERFORMANCE_COLORS['danger'],
-                text=rakip_texts,
-                textposition='outside',
-                marker=dict(
-                    line=dict(width=2, color='rgba(255, 255, 255, 0.8)')
-                )
-            ))
-            
-            fig_top10.update_layout(
-                title=dict(
-                    text='<b>Top 10 Territory - PF vs Rakip</b>',
-                    font=dict(size=18, color='white')
-                ),
-                xaxis_title='<b>Territory</b>',
-                yaxis_title='<b>Satış</b>',
-                barmode='group',
-                height=500,
-                xaxis=dict(tickangle=-45),
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#e2e8f0'),
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1
-                ),
-                yaxis=dict(
-                    tickformat=',.0f'
-                )
-            )
-            
-            st.plotly_chart(fig_top10, use_container_width=True)
-        
-        with col_chart2:
-            top5 = top10.head(5)
-            fig_pie = px.pie(
-                top5,
-                values='PF_Satis',
-                names='Territory',
-                title='<b>Top 5 Territory Dağılımı</b>',
-                color_discrete_sequence=GRADIENT_SCALES['blue_green'],
-                hole=0.4
-            )
-            
-            fig_pie.update_layout(
-                height=500,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#e2e8f0'),
-                legend=dict(
-                    orientation="v",
-                    yanchor="middle",
-                    y=0.5,
-                    xanchor="right",
-                    x=1.3
-                )
-            )
-            
-            fig_pie.update_traces(
-                textposition='inside',
-                textinfo='percent+label',
-                marker=dict(line=dict(color='rgba(255, 255, 255, 0.8)', width=2))
-            )
-            
-            st.plotly_chart(fig_pie, use_container_width=True)
+        # Detaylı tablo
+        st.subheader("📋 Detaylı Şehir Listesi")
         
-        # Detaylı Tablo
-        st.markdown("---")
-        st.subheader("📋 Top 10 Territory Detayları")
+        investment_display = investment_df.copy()
+        if selected_strateji != "Tümü":
+            investment_display = investment_display[investment_display['Yatırım_Stratejisi'] == selected_strateji]
         
-        display_cols = ['Territory', 'Region', 'City', 'Manager', 'PF_Satis', 'Toplam_Pazar', 'Toplam_Pazar_%', 'Pazar_Payi_%', 'Agirlik_%']
+        city_display = investment_display.sort_values('PF_Satis', ascending=False).copy()
         
-        top10_display = top10[display_cols].copy()
-        top10_display.columns = ['Territory', 'Region', 'City', 'Manager', 'PF Satış', 'Toplam Pazar', 'Toplam Pazar %', 'Pazar Payı %', 'Ağırlık %']
-        top10_display.index = range(1, len(top10_display) + 1)
+        display_cols = ['City', 'Region', 'PF_Satis', 'Toplam_Pazar', 'Pazar_Payi_%', 'Yatırım_Stratejisi']
+        city_display_formatted = city_display[display_cols].copy()
+        city_display_formatted.columns = ['Şehir', 'Bölge', 'PF Satış', 'Toplam Pazar', 'Pazar Payı %', 'Strateji']
+        city_display_formatted.index = range(1, len(city_display_formatted) + 1)
         
-        styled_df = style_dataframe(
-            top10_display,
+        styled_cities = style_dataframe(
+            city_display_formatted,
             color_column='Pazar Payı %',
-            gradient_columns=['Toplam Pazar %', 'Ağırlık %']
+            gradient_columns=['PF Satış']
         )
         
         st.dataframe(
-            styled_df,
+            styled_cities,
             use_container_width=True,
             height=400
         )
+
+def render_territory_tab(ctx):
+    """Territory analizi sekmesi"""
+    selected_product = ctx['selected_product']
+    cube_filtered = ctx['cube_filtered']
+    date_filter = ctx['date_filter']
+    calc_scope = ctx['calc_scope']
+    
+    st.header("🏢 Territory Bazlı Detaylı Analiz")
+    
+    terr_perf = compute_node(calc_scope, 'territory_performance',
+                             calculate_territory_performance, cube_filtered, selected_product, date_filter)
+    
+    # TOPLAM PAZAR YÜZDESİ HESAPLA
+    total_market_all = terr_perf['Toplam_Pazar'].sum()
+    terr_perf['Toplam_Pazar_%'] = safe_divide(terr_perf['Toplam_Pazar'], total_market_all) * 100
+    
+    # Filtreleme ve sıralama
+    col_filter1, col_filter2 = st.columns([1, 2])
+    
+    with col_filter1:
+        sort_options = {
+            'PF_Satis': 'PF Satış',
+            'Pazar_Payi_%': 'Pazar Payı %',
+            'Toplam_Pazar': 'Toplam Pazar',
+            'Toplam_Pazar_%': 'Toplam Pazar %',
+            'Agirlik_%': 'Ağırlık %'
+        }
+        sort_by = st.selectbox(
+            "Sıralama Kriteri",
+            options=list(sort_options.keys()),
+            format_func=lambda x: sort_options[x]
+        )
     
-    # TAB 2: MODERN HARİTA
-    with tab2:
-        st.header("🗺️ Modern Türkiye Haritası")
-        
-        # Harita için Bölge Filtresi
-        col_map_filter1, col_map_filter2 = st.columns(2)
-        with col_map_filter1:
-            unique_regions = ["TÜMÜ"] + sorted(df_filtered['REGION'].dropna().unique())
-            selected_map_region = st.selectbox(
-                "Harita için Bölge Seçin",
-                unique_regions,
-                key='map_region_filter'
-            )
+    with col_filter2:
+        show_n = st.slider("Gösterilecek Territory Sayısı", 10, 100, 25, 5)
+    
+    terr_sorted = terr_perf.sort_values(sort_by, ascending=False).head(show_n)
+    
+    # Visualizations
+    col_viz1, col_viz2 = st.columns(2)
+    
+    with col_viz1:
+        st.subheader("📊 PF vs Rakip Satış")
         
-        # Şehir performans verisini BÖLGEYE GÖRE FİLTRELE
-        city_data = calculate_city_performance(df_filtered, selected_product, date_filter)
-        if selected_map_region != "TÜMÜ":
-            city_data = city_data[city_data['Region'] == selected_map_region]
+        pf_texts = [format_number(x) for x in terr_sorted['PF_Satis']]
+        rakip_texts = [format_number(x) for x in terr_sorted['Rakip_Satis']]
         
-        # Yatırım stratejisini FİLTRELENMİŞ veri ile hesapla
-        investment_df = calculate_investment_strategy(city_data)
-        filtered_pf_toplam = city_data['PF_Satis'].sum()
+        fig_bar = go.Figure()
         
-        # Quick Stats
-        col1, col2, col3, col4, col5 = st.columns(5)
+        fig_bar.add_trace(go.Bar(
+            x=terr_sorted['Territory'],
+            y=terr_sorted['PF_Satis'],
+            name='PF Satış',
+            marker_color=PERFORMANCE_COLORS['success'],
+            text=pf_texts,
+            textposition='outside',
+            marker=dict(
+                line=dict(width=1.5, color='rgba(255, 255, 255, 0.8)')
+            )
+        ))
         
-        total_pf = city_data['PF_Satis'].sum()
-        total_market = city_data['Toplam_Pazar'].sum()
-        avg_share = city_data['Pazar_Payi_%'].mean()
-        active_cities = len(city_data[city_data['PF_Satis'] > 0])
-        top_city = city_data.loc[city_data['PF_Satis'].idxmax(), 'City'] if len(city_data) > 0 else "Yok"
+        fig_bar.add_trace(go.Bar(
+            x=terr_sorted['Territory'],
+            y=terr_sorted['Rakip_Satis'],
+            name='Rakip Satış',
+            marker_color=PERFORMANCE_COLORS['danger'],
+            text=rakip_texts,
+            textposition='outside',
+            marker=dict(
+                line=dict(width=1.5, color='rgba(255, 255, 255, 0.8)')
+            )
+        ))
         
-        with col1:
-            st.metric("💊 PF Satış", format_number(total_pf))
-        with col2:
-            st.metric("🏪 Toplam Pazar", format_number(total_market))
-        with col3:
-            st.metric("📊 Ort. Pazar Payı", format_percentage(avg_share))
-        with col4:
-            st.metric("🏙️ Aktif Şehir", str(active_cities))
-        with col5:
-            st.metric("🏆 Lider Şehir", top_city)
+        fig_bar.update_layout(
+            title=dict(
+                text=f'<b>Top {show_n} Territory - PF vs Rakip</b>',
+                font=dict(size=18, color='white')
+            ),
+            xaxis_title='<b>Territory</b>',
+            yaxis_title='<b>Satış</b>',
+            barmode='group',
+            height=600,
+            xaxis=dict(tickangle=-45),
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='#e2e8f0'),
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1
+            ),
+            yaxis=dict(
+                tickformat=',.0f'
+            )
+        )
         
-        st.markdown("---")
+        st.plotly_chart(fig_bar, use_container_width=True)
+    
+    with col_viz2:
+        st.subheader("🎯 Pazar Payı Dağılımı")
         
-        # Modern Harita
-        if gdf is not None:
-            st.subheader(f"📍 İl Bazlı Dağılım - {selected_map_region if selected_map_region != 'TÜMÜ' else 'Tüm Bölgeler'}")
-            
-            turkey_map = create_modern_turkey_map(
-                city_data, 
-                gdf, 
-                title=f"{selected_product} - {view_mode} - {selected_map_region if selected_map_region != 'TÜMÜ' else 'Tüm Bölgeler'}",
-                view_mode=view_mode,
-                filtered_pf_toplam=filtered_pf_toplam
+        fig_scatter = px.scatter(
+            terr_sorted,
+            x='PF_Satis',
+            y='Pazar_Payi_%',
+            size='Toplam_Pazar',
+            color='Region',
+            color_discrete_map=REGION_COLORS,
+            hover_name='Territory',
+            hover_data={
+                'Region': True,
+                'PF_Satis': ':,.0f',
+                'Rakip_Satis': ':,.0f',
+                'Pazar_Payi_%': ':.1f',
+                'Toplam_Pazar_%': ':.1f'
+            },
+            size_max=50,
+            title=f'<b>Territory Performans Haritası</b>'
+        )
+        
+        fig_scatter.update_layout(
+            height=600,
+            plot_bgcolor='rgba(15, 23, 41, 0.9)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='#e2e8f0'),
+            xaxis_title='<b>PF Satış</b>',
+            yaxis_title='<b>Pazar Payı %</b>',
+            legend=dict(
+                title='<b>Bölge</b>',
+                bgcolor='rgba(30, 41, 59, 0.8)'
+            ),
+            xaxis=dict(
+                tickformat=',.0f'
+            ),
+            yaxis=dict(
+                ticksuffix='%'
             )
-            
-            if turkey_map:
-                st.plotly_chart(turkey_map, use_container_width=True)
-            else:
-                st.error("❌ Harita oluşturulamadı")
-        else:
-            st.warning("⚠️ turkey.geojson bulunamadı")
+        )
+        
+        st.plotly_chart(fig_scatter, use_container_width=True)
+    
+    st.markdown("---")
+    
+    # Detaylı Territory Listesi
+    st.subheader(f"📋 Detaylı Territory Listesi (Top {show_n})")
+    
+    display_cols = [
+        'Territory', 'Region', 'City', 'Manager',
+        'PF_Satis', 'Rakip_Satis', 'Toplam_Pazar', 'Toplam_Pazar_%',
+        'Pazar_Payi_%', 'Goreceli_Pazar_Payi', 'Agirlik_%'
+    ]
+    
+    terr_display = terr_sorted[display_cols].copy()
+    terr_display.columns = [
+        'Territory', 'Region', 'City', 'Manager',
+        'PF Satış', 'Rakip Satış', 'Toplam Pazar', 'Toplam Pazar %',
+        'Pazar Payı %', 'Göreceli Pay', 'Ağırlık %'
+    ]
+    terr_display.index = range(1, len(terr_display) + 1)
+    
+    styled_territory = style_dataframe(
+        terr_display,
+        color_column='Pazar Payı %',
+        gradient_columns=['Toplam Pazar %', 'Ağırlık %', 'Göreceli Pay']
+    )
+    
+    st.dataframe(
+        styled_territory,
+        use_container_width=True,
+        height=600
+    )
+    
+    # Özet İstatistikler
+    st.markdown("---")
+    st.subheader("📊 Territory Performans Özeti")
+    
+    col_sum1, col_sum2, col_sum3, col_sum4 = st.columns(4)
+    
+    with col_sum1:
+        avg_pazar_payi = terr_sorted['Pazar_Payi_%'].mean()
+        st.metric("📊 Ort. Pazar Payı", format_percentage(avg_pazar_payi))
+    
+    with col_sum2:
+        total_pf = terr_sorted['PF_Satis'].sum()
+        st.metric("💰 Toplam PF Satış", format_number(total_pf))
+    
+    with col_sum3:
+        avg_toplam_pazar_yuzde = terr_sorted['Toplam_Pazar_%'].mean()
+        st.metric("🏪 Ort. Pazar Payı", format_percentage(avg_toplam_pazar_yuzde))
+    
+    with col_sum4:
+        dominant_region = terr_display['Region'].mode()[0] if len(terr_display) > 0 else "Yok"
+        region_color = REGION_COLORS.get(dominant_region, "#64748B")
+        st.markdown(
+            f'<div style="color:{region_color}; font-size:1.2rem; font-weight:bold; text-align: center;">'
+            f'🏆 {dominant_region}</div>',
+            unsafe_allow_html=True
+        )
+
+def render_time_series_tab(ctx):
+    """Gelişmiş zaman serisi sekmesi"""
+    selected_product = ctx['selected_product']
+    cube_filtered = ctx['cube_filtered']
+    date_filter = ctx['date_filter']
+    calc_scope = ctx['calc_scope']
+    
+    st.header("📈 Gelişmiş Zaman Serisi Analizi & ML Tahminleme")
+    
+    col_ts1, col_ts2 = st.columns(2)
+    
+    with col_ts1:
+        territory_for_ts = st.selectbox(
+            "Territory Seçin",
+            ["TÜMÜ"] + sorted(cube_filtered['TERRITORIES'].unique()),
+            key='ts_territory'
+        )
+    
+    with col_ts2:
+        analysis_type = st.selectbox(
+            "Analiz Türü",
+            ["Temel Zaman Serisi", "Trend Analizi", "Karşılaştırmalı Analiz", "Mevsimsellik Analizi", "Volatilite Analizi",
+             "Panel Analizi (Tüm Territory'ler)", "Portföy Tahmini"]
+        )
+    
+    # Gelişmiş zaman serisi hesapla
+    monthly_df = compute_node(calc_scope, ('time_series', territory_for_ts),
+                              calculate_advanced_time_series, cube_filtered, selected_product, territory_for_ts, date_filter)
+    
+    if len(monthly_df) == 0:
+        st.warning("⚠️ Seçilen filtrelerde veri bulunamadı")
+    else:
+        # Özet Metrikler
+        col_ts1, col_ts2, col_ts3, col_ts4 = st.columns(4)
+        
+        with col_ts1:
+            avg_pf = monthly_df['PF_Satis'].mean()
+            st.metric("📊 Ort. Aylık PF", format_number(avg_pf))
+        
+        with col_ts2:
+            avg_growth = monthly_df['PF_Buyume_%'].mean() if 'PF_Buyume_%' in monthly_df.columns else 0
+            st.metric("📈 Ort. Büyüme", format_percentage(avg_growth))
+        
+        with col_ts3:
+            avg_share = monthly_df['Pazar_Payi_%'].mean() if 'Pazar_Payi_%' in monthly_df.columns else 0
+            st.metric("🎯 Ort. Pazar Payı", format_percentage(avg_share))
+        
+        with col_ts4:
+            total_months = len(monthly_df)
+            st.metric("📅 Veri Dönemi", f"{total_months} ay")
         
         st.markdown("---")
         
-        # Şehir Analizi
-        col_analysis1, col_analysis2 = st.columns(2)
+        # Trend analizi yap
+        trend_analysis = perform_trend_analysis(monthly_df)
         
-        with col_analysis1:
-            st.subheader("🏆 Top 10 Şehir")
-            top_cities = city_data.nlargest(10, 'PF_Satis')
-            
-            bar_texts = [format_number(x) for x in top_cities['PF_Satis']]
+        # Trend bilgilerini göster
+        if 'error' not in trend_analysis:
+            col_trend1, col_trend2, col_trend3, col_trend4 = st.columns(4)
             
-            fig_bar = px.bar(
-                top_cities,
-                x='City',
-                y='PF_Satis',
-                title='<b>En Yüksek Satış Yapan Şehirler</b>',
-                color='Region',
-                color_discrete_map=REGION_COLORS,
-                hover_data=['Region', 'PF_Satis', 'Pazar_Payi_%'],
-                text=bar_texts
-            )
+            with col_trend1:
+                st.metric("📈 Temel Trend", trend_analysis.get('temel_trend', 'Bilinmiyor'))
             
-            fig_bar.update_layout(
-                height=500,
-                xaxis_tickangle=-45,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#e2e8f0'),
-                yaxis_title='<b>PF Satış</b>',
-                xaxis_title='<b>Şehir</b>',
-                yaxis=dict(
-                    tickformat=',.0f'
-                )
-            )
+            with col_trend2:
+                st.metric("🔄 Mevsimsellik", trend_analysis.get('mevsimsellik', 'Bilinmiyor'))
             
-            fig_bar.update_traces(
-                textposition='outside',
-                marker=dict(line=dict(width=2, color='rgba(255, 255, 255, 0.8)'))
-            )
+            with col_trend3:
+                volatility = trend_analysis.get('volatilite', 'Bilinmiyor')
+                volatility_val = trend_analysis.get('volatilite_degeri', 0)
+                st.metric("📉 Volatilite", volatility, f"{volatility_val:.1f}%")
             
-            st.plotly_chart(fig_bar, use_container_width=True)
+            with col_trend4:
+                momentum = trend_analysis.get('momentum_3m', 0)
+                st.metric("⚡ 3 Aylık Momentum", format_number(momentum))
         
-        with col_analysis2:
-            st.subheader("🗺️ Bölge Dağılımı")
-            
-            region_perf = city_data.groupby('Region').agg({
-                'PF_Satis': 'sum',
-                'Toplam_Pazar': 'sum'
-            }).reset_index()
-            
-            region_perf['Pazar_Payi_%'] = safe_divide(region_perf['PF_Satis'], region_perf['Toplam_Pazar']) * 100
+        st.markdown("---")
+        
+        # Analiz türüne göre grafik göster
+        if analysis_type == "Temel Zaman Serisi":
+            st.subheader("📊 Temel Zaman Serisi Analizi")
             
-            fig_pie = px.pie(
-                region_perf,
-                values='PF_Satis',
-                names='Region',
-                title='<b>Bölgelere Göre Satış Dağılımı</b>',
-                color='Region',
-                color_discrete_map=REGION_COLORS,
-                hole=0.3
-            )
+            # ML tahmini
+            forecast_months = st.slider("Tahmin Periyodu (Ay)", 1, 12, 6)
+            use_tuning = st.checkbox("🎛️ Hiperparametre ayarı (zaman sıralı CV + successive halving)", value=False,
+                                     key='use_tuning')
             
-            fig_pie.update_layout(
-                height=500,
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#e2e8f0'),
-                showlegend=True,
-                legend=dict(
-                    orientation="v",
-                    yanchor="middle",
-                    y=0.5,
-                    xanchor="right",
-                    x=1.3
-                )
-            )
+            if len(monthly_df) >= 12:
+                tuning = None
+                if use_tuning and len(monthly_df) >= 24:
+                    with st.spinner("Hiperparametreler aranıyor (kapsam/territory başına bir kez)..."):
+                        tuning = compute_node(calc_scope, ('model_tuning', territory_for_ts),
+                                              get_tuned_params, calc_scope, territory_for_ts, monthly_df)
+                tuned_params = tuning['params'] if tuning else None
+                
+                with st.spinner("ML modelleri eğitiliyor..."):
+                    model_key = get_model_cache_key(calc_scope, territory_for_ts, monthly_df, tuned_params)
+                    ml_results, best_model_name, forecast_df = compute_node(
+                        calc_scope, ('ml_forecast', territory_for_ts, forecast_months) + (('tuned',) if tuned_params else ()),
+                        get_ml_forecast, model_key, monthly_df, forecast_months,
+                        get_model_lineage_key(calc_scope, territory_for_ts, tuned_params), tuned_params)
+                
+                if ml_results is not None:
+                    # Model Performansı
+                    st.subheader("🤖 Model Performans Karşılaştırması")
+                    
+                    perf_data = []
+                    for name, metrics in ml_results.items():
+                        perf_data.append({
+                            'Model': name,
+                            'MAE': metrics['MAE'],
+                            'RMSE': metrics['RMSE'],
+                            'MAPE (%)': metrics['MAPE'],
+                            'R²': metrics['R2']
+                        })
+                    
+                    perf_df = pd.DataFrame(perf_data)
+                    perf_df = perf_df.sort_values('MAPE (%)')
+                    
+                    col_ml1, col_ml2 = st.columns([2, 1])
+                    
+                    with col_ml1:
+                        styled_perf = style_dataframe(
+                            perf_df,
+                            color_column='MAPE (%)',
+                            gradient_columns=['MAE', 'RMSE', 'R²']
+                        )
+                        st.dataframe(styled_perf, use_container_width=True)
+                    
+                    with col_ml2:
+                        best_mape = ml_results[best_model_name]['MAPE']
+                        
+                        if best_mape < 10:
+                            confidence_level = "🟢 YÜKSEK"
+                            confidence_color = "#06B6D4"
+                        elif best_mape < 20:
+                            confidence_level = "🟡 ORTA"
+                            confidence_color = "#F59E0B"
+                        else:
+                            confidence_level = "🔴 DÜŞÜK"
+                            confidence_color = "#64748B"
+                        
+                        st.markdown(f'<div style="background: rgba(30, 41, 59, 0.8); padding: 1.5rem; border-radius: 12px; border: 2px solid {confidence_color}; margin-top: 1rem;">'
+                                   f'<h3 style="color: white; margin: 0 0 1rem 0;">🏆 En İyi Model</h3>'
+                                   f'<p style="color: {confidence_color}; font-size: 1.5rem; font-weight: 700; margin: 0 0 0.5rem 0;">{best_model_name}</p>'
+                                   f'<p style="color: #94a3b8; margin: 0 0 1rem 0;">MAPE: <span style="color: {confidence_color}; font-weight: 700;">{best_mape:.2f}%</span></p>'
+                                   f'<p style="color: #e2e8f0; font-weight: 600; margin: 0;">Güven Seviyesi: <span style="color: {confidence_color};">{confidence_level}</span></p>'
+                                   '</div>', unsafe_allow_html=True)
+                    
+                    if tuning is not None and tuning['history']:
+                        with st.expander("🎛️ Hiperparametre Ayarı Sonuçları"):
+                            st.caption(f"{tuning['n_rows']} aylık seriyle ayarlandı ({tuning['tuned_at']}) · "
+                                       f"turlar (ağaç, katlama): {', '.join(f'{t}/{k}' for t, k in TUNING_RUNGS)} · "
+                                       "CV yalnızca eğitim döneminde, tek adım ileri skorla yapıldı; test MAPE'si ayardan bağımsızdır")
+                            tuned_display = pd.DataFrame([
+                                {'Model': name, 'Parametreler': json.dumps(params, sort_keys=True),
+                                 'CV MAPE (%)': tuning['cv_mape'].get(name)}
+                                for name, params in tuning['params'].items()
+                            ])
+                            st.dataframe(tuned_display, use_container_width=True)
+                            
+                            rounds = pd.DataFrame(tuning['history']).groupby(['Tur', 'Model']).agg(
+                                Aday=('Parametreler', 'count'),
+                                Katlama=('Katlama', 'first'),
+                                En_Iyi_CV_MAPE=('CV_MAPE', 'min')
+                            ).reset_index()
+                            st.dataframe(rounds, use_container_width=True)
+                    
+                    st.markdown("---")
+                    
+                    # Gelişmiş zaman serisi grafiği
+                    st.subheader("📈 Gelişmiş Zaman Serisi ve Tahminler")
+                    ts_chart = create_advanced_time_series_chart(monthly_df, forecast_df)
+                    st.plotly_chart(ts_chart, use_container_width=True)
+                    
+                    # Tahmin detayları
+                    st.markdown("---")
+                    st.subheader("📋 Tahmin Detayları")
+                    
+                    forecast_summary = forecast_df.groupby(['Model', 'Tahmin_Tipi']).agg({
+                        'PF_Satis': ['mean', 'sum']
+                    }).reset_index()
+                    
+                    forecast_summary.columns = ['Model', 'Tahmin Tipi', 'Ortalama Tahmin', 'Toplam Tahmin']
+                    forecast_summary.index = range(1, len(forecast_summary) + 1)
+                    
+                    styled_forecast = style_dataframe(
+                        forecast_summary,
+                        gradient_columns=['Ortalama Tahmin', 'Toplam Tahmin']
+                    )
+                    
+                    st.dataframe(styled_forecast, use_container_width=True)
+                    
+                    # Walk-forward backtest
+                    st.markdown("---")
+                    if st.checkbox("🔁 Walk-forward backtest (tüm orijinler ve ufuklar)", value=False, key='run_backtest'):
+                        with st.spinner("Tahmin orijinleri test ediliyor..."):
+                            backtest_errors, backtest_summary = compute_node(
+                                calc_scope, ('ml_backtest', territory_for_ts, forecast_months),
+                                load_forecast_backtest, model_key, monthly_df, forecast_months)
+                        
+                        if backtest_summary is not None:
+                            st.caption(f"{backtest_errors['Orijin'].nunique()} tahmin orijini · her orijinde modeller yalnızca geçmiş aylarla eğitildi")
+                            
+                            col_bt1, col_bt2 = st.columns(2)
+                            with col_bt1:
+                                st.markdown("**MAPE (%) - Model x Ufuk**")
+                                st.dataframe(backtest_summary.pivot(index='Model', columns='Ufuk', values='MAPE').style.format("{:.1f}"),
+                                             use_container_width=True)
+                            with col_bt2:
+                                st.markdown("**MAE - Model x Ufuk**")
+                                st.dataframe(backtest_summary.pivot(index='Model', columns='Ufuk', values='MAE').style.format("{:,.1f}"),
+                                             use_container_width=True)
+                        else:
+                            st.info(f"Backtest için en az {BACKTEST_MIN_TRAIN + 1} ay veri gereklidir.")
+                else:
+                    st.warning("ML modeli eğitilemedi. Yeterli veri yok olabilir.")
+                    ts_chart = create_advanced_time_series_chart(monthly_df)
+                    st.plotly_chart(ts_chart, use_container_width=True)
+            else:
+                st.warning("ML tahmini için en az 12 ay veri gereklidir.")
+                ts_chart = create_advanced_time_series_chart(monthly_df)
+                st.plotly_chart(ts_chart, use_container_width=True)
+        
+        elif analysis_type == "Trend Analizi":
+            st.subheader("📈 Trend Analizi")
+            trend_chart = create_trend_analysis_chart(monthly_df)
+            st.plotly_chart(trend_chart, use_container_width=True)
             
-            fig_pie.update_traces(
-                textposition='inside',
-                textinfo='percent+label',
-                marker=dict(line=dict(color='rgba(255, 255, 255, 0.8)', width=2))
-            )
+            # Dönemsel büyüme metrikleri
+            if 'buyume_metrikleri' in trend_analysis:
+                st.subheader("📊 Dönemsel Büyüme Oranları")
+                
+                growth_metrics = trend_analysis['buyume_metrikleri']
+                if growth_metrics:
+                    col_growth1, col_growth2, col_growth3 = st.columns(3)
+                    
+                    if 'MoM_Growth' in growth_metrics:
+                        with col_growth1:
+                            st.metric("📈 Aylık Büyüme (MoM)", format_percentage(growth_metrics['MoM_Growth']))
+                    
+                    if 'QoQ_3M_Growth' in growth_metrics:
+                        with col_growth2:
+                            st.metric("📊 3 Aylık Büyüme (QoQ)", format_percentage(growth_metrics['QoQ_3M_Growth']))
+                    
+                    if 'QoQ_6M_Growth' in growth_metrics:
+                        with col_growth3:
+                            st.metric("📈 6 Aylık Büyüme (QoQ)", format_percentage(growth_metrics['QoQ_6M_Growth']))
             
-            st.plotly_chart(fig_pie, use_container_width=True)
-        
-        # Yatırım Stratejisi
-        st.markdown("---")
-        st.subheader("🎯 Yatırım Stratejisi Analizi")
+            # Tüm seriler için toplu trend sıralaması
+            st.markdown("---")
+            st.subheader("🏁 Trend Liderlik Tablosu")
+            
+            leaderboard_level = LEVEL_OPTIONS[st.selectbox("Seviye", list(LEVEL_OPTIONS.keys()), key='trend_leaderboard_level')]
+            leaderboard = compute_node(calc_scope, ('trend_leaderboard', leaderboard_level),
+                                       calculate_trend_leaderboard, cube_filtered, selected_product, date_filter, leaderboard_level)
+            
+            if len(leaderboard) > 0:
+                name_col = LEVEL_LABELS[leaderboard_level]
+                trend_counts = leaderboard['Temel_Trend'].value_counts()
+                
+                col_lb1, col_lb2, col_lb3 = st.columns(3)
+                with col_lb1:
+                    st.metric("📈 Güçlü Artış", int(trend_counts.get("📈 Güçlü Artış", 0)))
+                with col_lb2:
+                    st.metric("📊 Sabit", int(trend_counts.get("📊 Sabit", 0)))
+                with col_lb3:
+                    st.metric("📉 Güçlü Düşüş", int(trend_counts.get("📉 Güçlü Düşüş", 0)))
+                
+                leaderboard_display = leaderboard[[name_col, 'Temel_Trend', 'Trend_Egimi_%', 'MA3_Trend',
+                                                   'Pazar_Payi_Trendi', 'CV_%', 'Volatilite', 'Momentum_3M', 'Son_PF_Satis']].copy()
+                leaderboard_display.columns = [name_col, 'Trend', 'Eğim %', 'MA 3 Trend',
+                                               'Pazar Payı Trendi', 'CV %', 'Volatilite', 'Momentum 3A', 'Son PF Satış']
+                
+                col_lb_up, col_lb_down = st.columns(2)
+                with col_lb_up:
+                    st.markdown("**📈 En Hızlı Yükselenler**")
+                    rising = leaderboard_display.head(10).copy()
+                    rising.index = range(1, len(rising) + 1)
+                    st.dataframe(style_dataframe(rising, gradient_columns=['Eğim %']), use_container_width=True)
+                with col_lb_down:
+                    st.markdown("**📉 En Hızlı Düşenler**")
+                    falling = leaderboard_display.tail(10).iloc[::-1].copy()
+                    falling.index = range(1, len(falling) + 1)
+                    st.dataframe(style_dataframe(falling, gradient_columns=['Eğim %']), use_container_width=True)
         
-        if len(investment_df) > 0:
-            strategy_counts = investment_df['Yatırım_Stratejisi'].value_counts()
+        elif analysis_type == "Karşılaştırmalı Analiz":
+            st.subheader("📊 Karşılaştırmalı Dönem Analizi")
             
-            cols_strategy = st.columns(5)
-            strategy_metrics = [
-                ("🚀 Agresif", "Agresif"),
-                ("⚡ Hızlandırılmış", "Hızlandırılmış"),
-                ("🛡️ Koruma", "Koruma"),
-                ("💎 Potansiyel", "Potansiyel"),
-                ("👁️ İzleme", "İzleme")
-            ]
+            comparisons_df = create_comparative_analysis(monthly_df, periods=[3, 6, 12])
             
-            for idx, (strategy_key, strategy_name) in enumerate(strategy_metrics):
-                with cols_strategy[idx]:
-                    count = strategy_counts.get(strategy_key, 0)
-                    total_value = investment_df[investment_df['Yatırım_Stratejisi'] == strategy_key]['PF_Satis'].sum()
-                    st.metric(
-                        strategy_name,
-                        f"{count} şehir",
-                        f"{format_number(total_value)} PF"
+            if comparisons_df is not None and len(comparisons_df) > 0:
+                comp_chart = create_comparative_period_chart(comparisons_df)
+                if comp_chart:
+                    st.plotly_chart(comp_chart, use_container_width=True)
+                
+                # Detaylı tablo
+                st.subheader("📋 Dönemsel Performans Detayları")
+                
+                comp_display = comparisons_df.copy()
+                comp_display.columns = ['Dönem', 'Ortalama Satış', 'Önceki Ortalama', 'Büyüme %', 
+                                      'Pazar Payı %', 'Pay Değişimi', 'Volatilite', 'Trend']
+                comp_display.index = range(1, len(comp_display) + 1)
+                
+                styled_comp = style_dataframe(
+                    comp_display,
+                    color_column='Büyüme %',
+                    gradient_columns=['Ortalama Satış', 'Pazar Payı %', 'Volatilite']
+                )
+                
+                st.dataframe(styled_comp, use_container_width=True)
+            else:
+                st.warning("Karşılaştırmalı analiz için yeterli veri yok.")
+        
+        elif analysis_type == "Mevsimsellik Analizi":
+            st.subheader("🔄 Mevsimsellik Analizi")
+            
+            seasonality_chart = create_seasonality_chart(monthly_df)
+            if seasonality_chart:
+                st.plotly_chart(seasonality_chart, use_container_width=True)
+                
+                # Mevsimsellik istatistikleri
+                if 'Month' in monthly_df.columns:
+                    monthly_avg = monthly_df.groupby('Month').agg({
+                        'PF_Satis': ['mean', 'std', 'min', 'max']
+                    }).reset_index()
+                    
+                    monthly_avg.columns = ['Month', 'Ortalama', 'Std Sapma', 'Minimum', 'Maksimum']
+                    monthly_avg['Month_Name'] = monthly_avg['Month'].map({
+                        1: 'Oca', 2: 'Şub', 3: 'Mar', 4: 'Nis', 5: 'May', 6: 'Haz',
+                        7: 'Tem', 8: 'Ağu', 9: 'Eyl', 10: 'Eki', 11: 'Kas', 12: 'Ara'
+                    })
+                    
+                    st.subheader("📊 Aylık Performans İstatistikleri")
+                    
+                    styled_season = style_dataframe(
+                        monthly_avg,
+                        gradient_columns=['Ortalama', 'Std Sapma', 'Minimum', 'Maksimum']
                     )
+                    
+                    st.dataframe(styled_season, use_container_width=True)
+            else:
+                st.warning("Mevsimsellik analizi için yeterli veri yok (en az 12 ay).")
             
+            # Trend / mevsimsel / artık ayrıştırması
             st.markdown("---")
+            st.subheader("🧩 Mevsimsel Ayrıştırma & Durağanlık")
             
-            # Detaylı tablo
-            st.subheader("📋 Detaylı Şehir Listesi")
-            
-            investment_display = investment_df.copy()
-            if selected_strateji != "Tümü":
-                investment_display = investment_display[investment_display['Yatırım_Stratejisi'] == selected_strateji]
+            decomposition, decomposition_summary = compute_node(
+                calc_scope, 'seasonal_decomposition',
+                load_seasonal_decomposition, calc_scope, cube_filtered, selected_product, date_filter)
             
-            city_display = investment_display.sort_values('PF_Satis', ascending=False).copy()
+            if len(decomposition) > 0:
+                selected_components = decomposition[decomposition['Territory'] == territory_for_ts]
+                decomposition_chart = create_decomposition_chart(selected_components)
+                if decomposition_chart:
+                    st.plotly_chart(decomposition_chart, use_container_width=True)
+                    
+                    selected_summary = decomposition_summary[decomposition_summary['Territory'] == territory_for_ts].iloc[0]
+                    col_dec1, col_dec2, col_dec3 = st.columns(3)
+                    with col_dec1:
+                        st.metric("🔄 Mevsimsellik Gücü", f"{selected_summary['Mevsimsellik_Gucu_%']:.1f}%")
+                    with col_dec2:
+                        st.metric("📈 Trend Gücü", f"{selected_summary['Trend_Gucu_%']:.1f}%")
+                    with col_dec3:
+                        st.metric("🧪 ADF p-değeri", f"{selected_summary['ADF_p']:.3f}",
+                                  "Durağan" if selected_summary['Duragan'] == "Evet" else "Durağan değil")
+                else:
+                    st.info("Seçili territory için ayrıştırma yapılamadı (en az 24 ay gerekli).")
+                
+                summary_display = decomposition_summary.copy()
+                summary_display.columns = ['Territory', 'Ay Sayısı', 'Mevsimsel Genlik', 'Mevsimsellik Gücü %',
+                                           'Trend Gücü %', 'ADF İstatistik', 'ADF p', 'Durağan']
+                summary_display.index = range(1, len(summary_display) + 1)
+                
+                st.dataframe(
+                    style_dataframe(summary_display, gradient_columns=['Mevsimsellik Gücü %', 'Trend Gücü %']),
+                    use_container_width=True,
+                    height=400
+                )
+            else:
+                st.info("Mevsimsel ayrıştırma için en az 24 aylık veri gerekli.")
             
-            display_cols = ['City', 'Region', 'PF_Satis', 'Toplam_Pazar', 'Pazar_Payi_%', 'Yatırım_Stratejisi']
-            city_display_formatted = city_display[display_cols].copy()
-            city_display_formatted.columns = ['Şehir', 'Bölge', 'PF Satış', 'Toplam Pazar', 'Pazar Payı %', 'Strateji']
-            city_display_formatted.index = range(1, len(city_display_formatted) + 1)
+            # Portföy genelinde mevsimsellik taraması
+            st.markdown("---")
+            st.subheader("🔍 Portföy Mevsimsellik Taraması")
             
-            styled_cities = style_dataframe(
-                city_display_formatted,
-                color_column='Pazar Payı %',
-                gradient_columns=['PF Satış']
-            )
+            scan_level = LEVEL_OPTIONS[st.selectbox("Seviye", ["Territory", "Şehir"], key='seasonality_scan_level')]
+            seasonality_scan = compute_node(calc_scope, ('seasonality_scan', scan_level),
+                                            calculate_seasonality_scan, cube_filtered, selected_product, date_filter, scan_level)
             
-            st.dataframe(
-                styled_cities,
-                use_container_width=True,
-                height=400
-            )
-    
-    # TAB 3: TERRITORY ANALİZİ
-    with tab3:
-        st.header("🏢 Territory Bazlı Detaylı Analiz")
-        
-        terr_perf = calculate_territory_performance(df_filtered, selected_product, date_filter)
-        
-        # TOPLAM PAZAR YÜZDESİ HESAPLA
-        total_market_all = terr_perf['Toplam_Pazar'].sum()
-        terr_perf['Toplam_Pazar_%'] = safe_divide(terr_perf['Toplam_Pazar'], total_market_all) * 100
-        
-        # Filtreleme ve sıralama
-        col_filter1, col_filter2 = st.columns([1, 2])
-        
-        with col_filter1:
-            sort_options = {
-                'PF_Satis': 'PF Satış',
-                'Pazar_Payi_%': 'Pazar Payı %',
-                'Toplam_Pazar': 'Toplam Pazar',
-                'Toplam_Pazar_%': 'Toplam Pazar %',
-                'Agirlik_%': 'Ağırlık %'
-            }
-            sort_by = st.selectbox(
-                "Sıralama Kriteri",
-                options=list(sort_options.keys()),
-                format_func=lambda x: sort_options[x]
-            )
-        
-        with col_filter2:
-            show_n = st.slider("Gösterilecek Territory Sayısı", 10, 100, 25, 5)
-        
-        terr_sorted = terr_perf.sort_values(sort_by, ascending=False).head(show_n)
+            if len(seasonality_scan) > 0:
+                scan_counts = seasonality_scan['Mevsimsellik'].value_counts()
+                
+                col_scan1, col_scan2, col_scan3 = st.columns(3)
+                with col_scan1:
+                    st.metric("🔄 Güçlü Mevsimsellik", int(scan_counts.get("Güçlü Mevsimsellik", 0)))
+                with col_scan2:
+                    st.metric("〰️ Zayıf Mevsimsellik", int(scan_counts.get("Zayıf Mevsimsellik", 0)))
+                with col_scan3:
+                    st.metric("➖ Mevsimsellik Yok", int(scan_counts.get("Mevsimsellik Yok", 0)))
+                
+                scan_display = seasonality_scan.copy()
+                scan_display.columns = [LEVEL_LABELS[scan_level], 'Ay Sayısı', 'Mevsimsellik', 'Baskın Periyot (Ay)', 'Güç %']
+                scan_display.index = range(1, len(scan_display) + 1)
+                
+                st.dataframe(
+                    style_dataframe(scan_display, gradient_columns=['Güç %']),
+                    use_container_width=True,
+                    height=400
+                )
         
-        # Visualizations
-        col_viz1, col_viz2 = st.columns(2)
+        elif analysis_type == "Volatilite Analizi":
+            st.subheader("📉 Volatilite Analizi")
+            
+            volatility_chart = create_volatility_chart(monthly_df)
+            if volatility_chart:
+                st.plotly_chart(volatility_chart, use_container_width=True)
+                
+                # Volatilite istatistikleri
+                if 'PF_CV' in monthly_df.columns:
+                    st.subheader("📊 Volatilite İstatistikleri")
+                    
+                    col_vol1, col_vol2, col_vol3 = st.columns(3)
+                    
+                    with col_vol1:
+                        avg_vol = monthly_df['PF_CV'].mean()
+                        st.metric("📊 Ortalama CV", f"{avg_vol:.1f}%")
+                    
+                    with col_vol2:
+                        max_vol = monthly_df['PF_CV'].max()
+                        st.metric("📈 Maksimum CV", f"{max_vol:.1f}%")
+                    
+                    with col_vol3:
+                        min_vol = monthly_df['PF_CV'].min()
+                        st.metric("📉 Minimum CV", f"{min_vol:.1f}%")
         
-        with col_viz1:
-            st.subheader("📊 PF vs Rakip Satış")
+        elif analysis_type == "Panel Analizi (Tüm Territory'ler)":
+            st.subheader("🧩 Panel Analizi - Tüm Territory'ler")
             
-            pf_texts = [format_number(x) for x in terr_sorted['PF_Satis']]
-            rakip_texts = [format_number(x) for x in terr_sorted['Rakip_Satis']]
+            panel_df = compute_node(calc_scope, 'time_series_panel',
+                                    calculate_panel_time_series, cube_filtered, selected_product, date_filter)
             
-            fig_bar = go.Figure()
+            # Her territory'nin son ayı
+            latest = panel_df.groupby('Territory', sort=False).tail(1)
             
-            fig_bar.add_trace(go.Bar(
-                x=terr_sorted['Territory'],
-                y=terr_sorted['PF_Satis'],
-                name='PF Satış',
-                marker_color=PERFORMANCE_COLORS['success'],
-                text=pf_texts,
-                textposition='outside',
-                marker=dict(
-                    line=dict(width=1.5, color='rgba(255, 255, 255, 0.8)')
-                )
-            ))
+            rank_options = {
+                'Performans Skoru': 'Performance_Score',
+                'PF Büyüme %': 'PF_Buyume_%',
+                'MA 3 Büyüme %': 'MA_3_Growth',
+                'YoY PF Büyüme %': 'YoY_PF_Growth',
+                '3 Aylık Momentum': 'Momentum_3M',
+                'Son 3 Ay vs Önceki 3 Ay %': 'QoQ_Growth_3M',
+                'Pazar Payı %': 'Pazar_Payi_%',
+                'Volatilite (CV %)': 'PF_CV'
+            }
+            rank_label = st.selectbox("Sıralama Ölçütü", list(rank_options.keys()), key='panel_rank_metric')
+            rank_col = rank_options[rank_label]
+            ranked = latest.sort_values(rank_col, ascending=False, na_position='last')
             
-            fig_bar.add_trace(go.Bar(
-                x=terr_sorted['Territory'],
-                y=terr_sorted['Rakip_Satis'],
-                name='Rakip Satış',
-                marker_color=PERFORMANCE_COLORS['danger'],
-                text=rakip_texts,
-                textposition='outside',
-                marker=dict(
-                    line=dict(width=1.5, color='rgba(255, 255, 255, 0.8)')
-                )
+            top15 = ranked.dropna(subset=[rank_col]).head(15)
+            fig_panel = go.Figure(go.Bar(
+                x=top15['Territory'],
+                y=top15[rank_col],
+                marker_color=PERFORMANCE_COLORS['info'],
+                text=[f"{v:,.1f}" for v in top15[rank_col]],
+                textposition='outside'
             ))
-            
-            fig_bar.update_layout(
-                title=dict(
-                    text=f'<b>Top {show_n} Territory - PF vs Rakip</b>',
-                    font=dict(size=18, color='white')
-                ),
-                xaxis_title='<b>Territory</b>',
-                yaxis_title='<b>Satış</b>',
-                barmode='group',
-                height=600,
-                xaxis=dict(tickangle=-45),
+            fig_panel.update_layout(
+                title=f'<b>Top 15 Territory - {rank_label}</b>',
+                height=500,
                 plot_bgcolor='rgba(0,0,0,0)',
                 paper_bgcolor='rgba(0,0,0,0)',
                 font=dict(color='#e2e8f0'),
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1
-                ),
-                yaxis=dict(
-                    tickformat=',.0f'
-                )
+                xaxis=dict(tickangle=-45)
             )
+            st.plotly_chart(fig_panel, use_container_width=True)
             
-            st.plotly_chart(fig_bar, use_container_width=True)
-        
-        with col_viz2:
-            st.subheader("🎯 Pazar Payı Dağılımı")
+            panel_display = ranked[['Territory', 'YIL_AY', 'PF_Satis', 'Pazar_Payi_%', 'PF_Buyume_%',
+                                    'MA_3_Growth', 'YoY_PF_Growth', 'Momentum_3M', 'PF_CV', 'Performance_Score']].copy()
+            panel_display.columns = ['Territory', 'Son Ay', 'PF Satış', 'Pazar Payı %', 'PF Büyüme %',
+                                     'MA 3 Büyüme %', 'YoY Büyüme %', 'Momentum 3A', 'CV %', 'Performans Skoru']
+            panel_display.index = range(1, len(panel_display) + 1)
             
-            fig_scatter = px.scatter(
-                terr_sorted,
-                x='PF_Satis',
-                y='Pazar_Payi_%',
-                size='Toplam_Pazar',
-                color='Region',
-                color_discrete_map=REGION_COLORS,
-                hover_name='Territory',
-                hover_data={
-                    'Region': True,
-                    'PF_Satis': ':,.0f',
-                    'Rakip_Satis': ':,.0f',
-                    'Pazar_Payi_%': ':.1f',
-                    'Toplam_Pazar_%': ':.1f'
-                },
-                size_max=50,
-                title=f'<b>Territory Performans Haritası</b>'
+            styled_panel = style_dataframe(
+                panel_display,
+                color_column='PF Büyüme %',
+                gradient_columns=['PF Satış', 'Performans Skoru']
             )
             
-            fig_scatter.update_layout(
-                height=600,
-                plot_bgcolor='rgba(15, 23, 41, 0.9)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#e2e8f0'),
-                xaxis_title='<b>PF Satış</b>',
-                yaxis_title='<b>Pazar Payı %</b>',
-                legend=dict(
-                    title='<b>Bölge</b>',
-                    bgcolor='rgba(30, 41, 59, 0.8)'
-                ),
-                xaxis=dict(
-                    tickformat=',.0f'
-                ),
-                yaxis=dict(
-                    ticksuffix='%'
-                )
-            )
+            st.dataframe(styled_panel, use_container_width=True, height=400)
+        
+        elif analysis_type == "Portföy Tahmini":
+            st.subheader("🔮 Portföy Tahmini - Tüm Seriler")
+            
+            col_pf1, col_pf2, col_pf3 = st.columns(3)
+            with col_pf1:
+                forecast_level = FORECAST_LEVEL_OPTIONS[st.selectbox("Seviye", list(FORECAST_LEVEL_OPTIONS.keys()),
+                                                                     key='portfolio_forecast_level')]
+            with col_pf2:
+                forecast_method = st.selectbox("Yöntem", ["Seri Bazlı Modeller", "Global Model", "İstatistiksel Modeller"],
+                                               key='portfolio_forecast_method')
+            with col_pf3:
+                portfolio_horizon = st.slider("Tahmin Periyodu (Ay)", 1, 12, 6, key='portfolio_forecast_horizon')
+            
+            name_col = LEVEL_LABELS[forecast_level]
+            
+            with st.spinner("Tüm seriler için modeller eğitiliyor..."):
+                if forecast_method == "Global Model":
+                    portfolio_forecast, portfolio_summary = compute_node(
+                        calc_scope, ('global_forecast', forecast_level, portfolio_horizon),
+                        calculate_global_forecast, calc_scope, cube_filtered, selected_product, date_filter,
+                        forecast_level, portfolio_horizon)
+                    st.caption("Tek model tüm serilerin yığılmış feature'larıyla eğitildi; MAPE son %20 takvim ayı üzerindendir.")
+                elif forecast_method == "İstatistiksel Modeller":
+                    portfolio_forecast, portfolio_summary = compute_node(
+                        calc_scope, ('statistical_forecast', forecast_level, portfolio_horizon),
+                        calculate_statistical_forecast, cube_filtered, selected_product, date_filter,
+                        forecast_level, portfolio_horizon)
+                    st.caption(f"Seri başına {', '.join(STAT_METHODS)} arasından tek adım MAPE'si en düşük yöntem seçildi.")
+                else:
+                    portfolio_forecast, portfolio_summary = compute_node(
+                        calc_scope, ('portfolio_forecast', forecast_level, portfolio_horizon),
+                        load_portfolio_forecast, calc_scope, cube_filtered, selected_product, date_filter,
+                        forecast_level, portfolio_horizon)
+            
+            fitted_summary = portfolio_summary[portfolio_summary['Durum'] == "Tamam"] if len(portfolio_summary) > 0 else portfolio_summary
+            failed_summary = portfolio_summary[portfolio_summary['Durum'].astype(str).str.startswith("Hata")] if len(portfolio_summary) > 0 else portfolio_summary
+            if len(failed_summary) > 0:
+                st.warning(f"⚠️ {len(failed_summary)} seri için tahmin üretilemedi: {failed_summary['Durum'].iloc[0]}")
             
-            st.plotly_chart(fig_scatter, use_container_width=True)
+            if len(fitted_summary) > 0:
+                col_pm1, col_pm2, col_pm3 = st.columns(3)
+                with col_pm1:
+                    st.metric("📦 Tahmin Edilen Seri", f"{len(fitted_summary)} / {len(portfolio_summary)}")
+                with col_pm2:
+                    st.metric("🎯 Medyan MAPE", f"{fitted_summary['MAPE'].median():.1f}%")
+                with col_pm3:
+                    st.metric("💊 Toplam Tahmin", format_number(fitted_summary['Toplam_Tahmin'].sum()))
+                
+                summary_display = fitted_summary[[name_col, 'Model', 'MAPE', 'MAE', 'Toplam_Tahmin']].copy()
+                summary_display.columns = [name_col, 'Seçilen Model', 'MAPE (%)', 'MAE', 'Toplam Tahmin']
+                summary_display.index = range(1, len(summary_display) + 1)
+                
+                st.dataframe(
+                    style_dataframe(summary_display, gradient_columns=['Toplam Tahmin', 'MAPE (%)']),
+                    use_container_width=True,
+                    height=400
+                )
+                
+                # Seri x ay tahmin tablosu
+                forecast_pivot = portfolio_forecast.pivot_table(index=name_col, columns='YIL_AY', values='PF_Tahmin', aggfunc='sum')
+                st.dataframe(forecast_pivot.style.format("{:,.0f}"), use_container_width=True)
+            else:
+                st.warning("Portföy tahmini için en az 24 aylık seri bulunamadı.")
         
+        # Detaylı zaman serisi tablosu
         st.markdown("---")
+        st.subheader("📋 Detaylı Zaman Serisi Verisi")
         
-        # Detaylı Territory Listesi
-        st.subheader(f"📋 Detaylı Territory Listesi (Top {show_n})")
+        display_cols = ['YIL_AY', 'PF_Satis', 'Rakip_Satis', 'Pazar_Payi_%', 
+                      'PF_Buyume_%', 'Rakip_Buyume_%', 'Goreceli_Buyume_%']
         
-        display_cols = [
-            'Territory', 'Region', 'City', 'Manager',
-            'PF_Satis', 'Rakip_Satis', 'Toplam_Pazar', 'Toplam_Pazar_%',
-            'Pazar_Payi_%', 'Goreceli_Pazar_Payi', 'Agirlik_%'
-        ]
+        # Sadece mevcut kolonları göster
+        available_cols = [col for col in display_cols if col in monthly_df.columns]
+        monthly_display = monthly_df[available_cols].copy()
         
-        terr_display = terr_sorted[display_cols].copy()
-        terr_display.columns = [
-            'Territory', 'Region', 'City', 'Manager',
-            'PF Satış', 'Rakip Satış', 'Toplam Pazar', 'Toplam Pazar %',
-            'Pazar Payı %', 'Göreceli Pay', 'Ağırlık %'
-        ]
-        terr_display.index = range(1, len(terr_display) + 1)
+        # Kolon isimlerini düzenle
+        col_names = {
+            'YIL_AY': 'Ay',
+            'PF_Satis': 'PF Satış',
+            'Rakip_Satis': 'Rakip Satış',
+            'Pazar_Payi_%': 'Pazar Payı %',
+            'PF_Buyume_%': 'PF Büyüme %',
+            'Rakip_Buyume_%': 'Rakip Büyüme %',
+            'Goreceli_Buyume_%': 'Göreceli Büyüme %'
+        }
         
-        styled_territory = style_dataframe(
-            terr_display,
-            color_column='Pazar Payı %',
-            gradient_columns=['Toplam Pazar %', 'Ağırlık %', 'Göreceli Pay']
+        monthly_display = monthly_display.rename(columns=col_names)
+        monthly_display.index = range(1, len(monthly_display) + 1)
+        
+        styled_monthly = style_dataframe(
+            monthly_display,
+            color_column='Göreceli Büyüme %',
+            gradient_columns=['PF Satış', 'Pazar Payı %', 'PF Büyüme %']
         )
         
         st.dataframe(
-            styled_territory,
+            styled_monthly,
             use_container_width=True,
-            height=600
+            height=400
         )
+
+def render_competitor_tab(ctx):
+    """Rakip analizi sekmesi"""
+    selected_product = ctx['selected_product']
+    cube_filtered = ctx['cube_filtered']
+    date_filter = ctx['date_filter']
+    calc_scope = ctx['calc_scope']
+    
+    st.header("📊 Detaylı Rakip Analizi")
+    
+    comp_data = compute_node(calc_scope, 'competitor_analysis',
+                             calculate_competitor_analysis, cube_filtered, selected_product, date_filter)
+    
+    if len(comp_data) == 0:
+        st.warning("⚠️ Seçilen filtrelerde veri bulunamadı")
+    else:
+        # Özet Metrikler
+        col1, col2, col3, col4 = st.columns(4)
         
-        # Özet İstatistikler
-        st.markdown("---")
-        st.subheader("📊 Territory Performans Özeti")
-        
-        col_sum1, col_sum2, col_sum3, col_sum4 = st.columns(4)
+        avg_pf_share = comp_data['PF_Pay_%'].mean()
+        avg_pf_growth = comp_data['PF_Buyume'].mean()
+        avg_rakip_growth = comp_data['Rakip_Buyume'].mean()
+        win_months = len(comp_data[comp_data['Fark'] > 0])
         
-        with col_sum1:
-            avg_pazar_payi = terr_sorted['Pazar_Payi_%'].mean()
-            st.metric("📊 Ort. Pazar Payı", format_percentage(avg_pazar_payi))
+        with col1:
+            st.metric("🎯 Ort. PF Pazar Payı", format_percentage(avg_pf_share))
+        with col2:
+            st.metric("📈 Ort. PF Büyüme", format_percentage(avg_pf_growth))
+        with col3:
+            st.metric("📉 Ort. Rakip Büyüme", format_percentage(avg_rakip_growth))
+        with col4:
+            st.metric("🏆 Kazanılan Aylar", f"{win_months}/{len(comp_data)}")
         
-        with col_sum2:
-            total_pf = terr_sorted['PF_Satis'].sum()
-            st.metric("💰 Toplam PF Satış", format_number(total_pf))
+        st.markdown("---")
         
-        with col_sum3:
-            avg_toplam_pazar_yuzde = terr_sorted['Toplam_Pazar_%'].mean()
-            st.metric("🏪 Ort. Pazar Payı", format_percentage(avg_toplam_pazar_yuzde))
+        # Grafikler
+        col_g1, col_g2 = st.columns(2)
         
-        with col_sum4:
-            dominant_region = terr_display['Region'].mode()[0] if len(terr_display) > 0 else "Yok"
-            region_color = REGION_COLORS.get(dominant_region, "#64748B")
-            st.markdown(
-                f'<div style="color:{region_color}; font-size:1.2rem; font-weight:bold; text-align: center;">'
-                f'🏆 {dominant_region}</div>',
-                unsafe_allow_html=True
-            )
-    
-    # TAB 4: GELİŞTİRİLMİŞ ZAMAN SERİSİ ANALİZİ
-    with tab4:
-        st.header("📈 Gelişmiş Zaman Serisi Analizi & ML Tahminleme")
+        with col_g1:
+            st.subheader("💰 Satış Karşılaştırması")
+            comp_chart = create_modern_competitor_chart(comp_data)
+            st.plotly_chart(comp_chart, use_container_width=True)
         
-        col_ts1, col_ts2 = st.columns(2)
+        with col_g2:
+            st.subheader("📈 Büyüme Karşılaştırması")
+            growth_chart = create_modern_growth_chart(comp_data)
+            st.plotly_chart(growth_chart, use_container_width=True)
         
-        with col_ts1:
-            territory_for_ts = st.selectbox(
-                "Territory Seçin",
-                ["TÜMÜ"] + sorted(df_filtered['TERRITORIES'].unique()),
-                key='ts_territory'
-            )
+        # Detaylı Tablo
+        st.markdown("---")
+        st.subheader("📋 Aylık Performans Detayları")
         
-        with col_ts2:
-            analysis_type = st.selectbox(
-                "Analiz Türü",
-                ["Temel Zaman Serisi", "Trend Analizi", "Karşılaştırmalı Analiz", "Mevsimsellik Analizi", "Volatilite Analizi"]
-            )
+        comp_display = comp_data[['YIL_AY', 'PF', 'Rakip', 'PF_Pay_%', 'PF_Buyume', 'Rakip_Buyume', 'Fark']].copy()
+        comp_display.columns = ['Ay', 'PF Satış', 'Rakip Satış', 'PF Pay %', 'PF Büyüme %', 'Rakip Büyüme %', 'Fark %']
+        comp_display.index = range(1, len(comp_display) + 1)
         
-        # Gelişmiş zaman serisi hesapla
-        monthly_df = calculate_advanced_time_series(df_filtered, selected_product, territory_for_ts, date_filter)
+        styled_comp = style_dataframe(
+            comp_display,
+            color_column='Fark %',
+            gradient_columns=['PF Pay %', 'PF Büyüme %', 'Rakip Büyüme %']
+        )
         
-        if len(monthly_df) == 0:
-            st.warning("⚠️ Seçilen filtrelerde veri bulunamadı")
-        else:
-            # Özet Metrikler
-            col_ts1, col_ts2, col_ts3, col_ts4 = st.columns(4)
-            
-            with col_ts1:
-                avg_pf = monthly_df['PF_Satis'].mean()
-                st.metric("📊 Ort. Aylık PF", format_number(avg_pf))
-            
-            with col_ts2:
-                avg_growth = monthly_df['PF_Buyume_%'].mean() if 'PF_Buyume_%' in monthly_df.columns else 0
-                st.metric("📈 Ort. Büyüme", format_percentage(avg_growth))
-            
-            with col_ts3:
-                avg_share = monthly_df['Pazar_Payi_%'].mean() if 'Pazar_Payi_%' in monthly_df.columns else 0
-                st.metric("🎯 Ort. Pazar Payı", format_percentage(avg_share))
-            
-            with col_ts4:
-                total_months = len(monthly_df)
-                st.metric("📅 Veri Dönemi", f"{total_months} ay")
-            
-            st.markdown("---")
+        st.dataframe(
+            styled_comp,
+            use_container_width=True,
+            height=400
+        )
+
+def render_bcg_tab(ctx):
+    """BCG & strateji sekmesi"""
+    selected_product = ctx['selected_product']
+    cube_filtered = ctx['cube_filtered']
+    date_filter = ctx['date_filter']
+    calc_scope = ctx['calc_scope']
+    
+    st.header("⭐ BCG Matrix & Yatırım Stratejisi")
+    
+    bcg_level = LEVEL_OPTIONS[st.selectbox("BCG Seviyesi", list(LEVEL_OPTIONS.keys()), key='bcg_level')]
+    name_col = LEVEL_LABELS[bcg_level]
+    
+    bcg_df = compute_node(calc_scope, ('bcg_matrix', bcg_level),
+                          calculate_bcg_matrix, cube_filtered, selected_product, date_filter, bcg_level)
+    
+    # BCG Dağılımı
+    st.subheader("📊 Portföy Dağılımı")
+    
+    bcg_counts = bcg_df['BCG_Kategori'].value_counts()
+    
+    col_bcg1, col_bcg2, col_bcg3, col_bcg4 = st.columns(4)
+    
+    with col_bcg1:
+        star_count = bcg_counts.get("⭐ Star", 0)
+        star_pf = bcg_df[bcg_df['BCG_Kategori'] == "⭐ Star"]['PF_Satis'].sum()
+        st.metric("⭐ Star", f"{star_count}", delta=f"{format_number(star_pf)} PF")
+    
+    with col_bcg2:
+        cow_count = bcg_counts.get("🐄 Cash Cow", 0)
+        cow_pf = bcg_df[bcg_df['BCG_Kategori'] == "🐄 Cash Cow"]['PF_Satis'].sum()
+        st.metric("🐄 Cash Cow", f"{cow_count}", delta=f"{format_number(cow_pf)} PF")
+    
+    with col_bcg3:
+        q_count = bcg_counts.get("❓ Question Mark", 0)
+        q_pf = bcg_df[bcg_df['BCG_Kategori'] == "❓ Question Mark"]['PF_Satis'].sum()
+        st.metric("❓ Question", f"{q_count}", delta=f"{format_number(q_pf)} PF")
+    
+    with col_bcg4:
+        dog_count = bcg_counts.get("🐶 Dog", 0)
+        dog_pf = bcg_df[bcg_df['BCG_Kategori'] == "🐶 Dog"]['PF_Satis'].sum()
+        st.metric("🐶 Dog", f"{dog_count}", delta=f"{format_number(dog_pf)} PF")
+    
+    st.markdown("---")
+    
+    # BCG Matrix
+    st.subheader("🎯 BCG Matrix")
+    
+    bcg_chart = create_modern_bcg_chart(bcg_df, name_col)
+    st.plotly_chart(bcg_chart, use_container_width=True)
+    
+    # BCG Detayları
+    st.markdown("---")
+    st.subheader("📋 BCG Kategori Detayları")
+    
+    display_cols_bcg = [name_col, 'Region', 'BCG_Kategori', 'PF_Satis', 'Pazar_Payi_%', 'Goreceli_Pazar_Payi', 'Pazar_Buyume_%']
+    
+    bcg_display = bcg_df[display_cols_bcg].copy()
+    bcg_display.columns = [name_col, 'Region', 'BCG', 'PF Satış', 'Pazar Payı %', 'Göreceli Pay', 'Büyüme %']
+    bcg_display = bcg_display.sort_values('PF Satış', ascending=False)
+    bcg_display.index = range(1, len(bcg_display) + 1)
+    
+    styled_bcg = style_dataframe(
+        bcg_display,
+        color_column='Pazar Payı %',
+        gradient_columns=['PF Satış', 'Büyüme %']
+    )
+    
+    st.dataframe(
+        styled_bcg,
+        use_container_width=True,
+        height=400
+    )
+
+def render_report_tab(ctx):
+    """Rapor indirme sekmesi"""
+    selected_product = ctx['selected_product']
+    cube_filtered = ctx['cube_filtered']
+    date_filter = ctx['date_filter']
+    calc_scope = ctx['calc_scope']
+    date_option = ctx['date_option']
+    
+    st.header("📥 Rapor İndirme")
+    
+    st.markdown("""
+    <div style="background: rgba(30, 41, 59, 0.7); padding: 2rem; border-radius: 12px; margin-bottom: 2rem;">
+        <h3 style="color: #e2e8f0; margin-top: 0;">📊 Detaylı Excel Raporu</h3>
+        <p style="color: #94a3b8; margin-bottom: 1.5rem;">
+            Tüm analizlerinizi içeren kapsamlı bir Excel raporu oluşturun. 
+            Rapor aşağıdaki sayfaları içerecektir:
+        </p>
+        <ul style="color: #cbd5e1; margin-left: 1.5rem;">
+            <li>Territory Performans (Toplam Pazar % ile)</li>
+            <li>Gelişmiş Zaman Serisi Analizi</li>
+            <li>Panel Zaman Serisi (tüm territory'ler)</li>
+            <li>Trend Analizi Sonuçları</li>
+            <li>Mevsimsel Ayrıştırma ve Durağanlık Testleri</li>
+            <li>ML Tahmin Sonuçları ve Walk-Forward Backtest</li>
+            <li>Portföy Tahmini (tüm territory'ler)</li>
+            <li>BCG Matrix</li>
+            <li>Şehir Bazlı Analiz</li>
+            <li>Rakip Analizi</li>
+        </ul>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    if st.button("📊 Excel Raporu Oluştur", type="primary", use_container_width=True):
+        with st.spinner("Rapor hazırlanıyor..."):
+            # Tüm analizleri hesapla
+            terr_perf = compute_node(calc_scope, 'territory_performance',
+                                     calculate_territory_performance, cube_filtered, selected_product, date_filter)
+            total_market_all = terr_perf['Toplam_Pazar'].sum()
+            terr_perf['Toplam_Pazar_%'] = safe_divide(terr_perf['Toplam_Pazar'], total_market_all) * 100
             
-            # Trend analizi yap
+            monthly_df = compute_node(calc_scope, ('time_series', "TÜMÜ"),
+                                      calculate_advanced_time_series, cube_filtered, selected_product, "TÜMÜ", date_filter)
             trend_analysis = perform_trend_analysis(monthly_df)
+            panel_df = compute_node(calc_scope, 'time_series_panel',
+                                    calculate_panel_time_series, cube_filtered, selected_product, date_filter)
+            decomposition, decomposition_summary = compute_node(
+                calc_scope, 'seasonal_decomposition',
+                load_seasonal_decomposition, calc_scope, cube_filtered, selected_product, date_filter)
+            bcg_df = compute_node(calc_scope, ('bcg_matrix', 'TERRITORIES'),
+                                  calculate_bcg_matrix, cube_filtered, selected_product, date_filter)
+            city_data = compute_node(calc_scope, 'city_performance',
+                                     calculate_city_performance, cube_filtered, selected_product, date_filter)
+            comp_data = compute_node(calc_scope, 'competitor_analysis',
+                                     calculate_competitor_analysis, cube_filtered, selected_product, date_filter)
             
-            # Trend bilgilerini göster
-            if 'error' not in trend_analysis:
-                col_trend1, col_trend2, col_trend3, col_trend4 = st.columns(4)
-                
-                with col_trend1:
-                    st.metric("📈 Temel Trend", trend_analysis.get('temel_trend', 'Bilinmiyor'))
-                
-                with col_trend2:
-                    st.metric("🔄 Mevsimsellik", trend_analysis.get('mevsimsellik', 'Bilinmiyor'))
-                
-                with col_trend3:
-                    volatility = trend_analysis.get('volatilite', 'Bilinmiyor')
-                    volatility_val = trend_analysis.get('volatilite_degeri', 0)
-                    st.metric("📉 Volatilite", volatility, f"{volatility_val:.1f}%")
-                
-                with col_trend4:
-                    momentum = trend_analysis.get('momentum_3m', 0)
-                    st.metric("⚡ 3 Aylık Momentum", format_number(momentum))
+            # ML tahmini
+            if len(monthly_df) >= 12:
+                model_key = get_model_cache_key(calc_scope, "TÜMÜ", monthly_df)
+                ml_results, best_model_name, forecast_df = compute_node(
+                    calc_scope, ('ml_forecast', "TÜMÜ", 6),
+                    get_ml_forecast, model_key, monthly_df, 6, get_model_lineage_key(calc_scope, "TÜMÜ"))
+                backtest_errors, backtest_summary = compute_node(
+                    calc_scope, ('ml_backtest', "TÜMÜ", 6),
+                    load_forecast_backtest, model_key, monthly_df, 6)
+            else:
+                ml_results, best_model_name, forecast_df = None, None, None
+                backtest_summary = None
             
-            st.markdown("---")
+            portfolio_forecast, portfolio_summary = compute_node(
+                calc_scope, ('portfolio_forecast', 'TERRITORIES', 6),
+                load_portfolio_forecast, calc_scope, cube_filtered, selected_product, date_filter, 'TERRITORIES', 6)
             
-            # Analiz türüne göre grafik göster
-            if analysis_type == "Temel Zaman Serisi":
-                st.subheader("📊 Temel Zaman Serisi Analizi")
+            output = BytesIO()
+            with pd.ExcelWriter(output, engine='openpyxl') as writer:
+                terr_perf.to_excel(writer, sheet_name='Territory Performans', index=False)
+                monthly_df.to_excel(writer, sheet_name='Zaman Serisi', index=False)
+                panel_df.to_excel(writer, sheet_name='Panel Zaman Serisi', index=False)
                 
-                # ML tahmini
-                forecast_months = st.slider("Tahmin Periyodu (Ay)", 1, 12, 6)
+                # Trend analizi sonuçları
+                if 'error' not in trend_analysis:
+                    trend_df = pd.DataFrame([trend_analysis])
+                    trend_df.to_excel(writer, sheet_name='Trend Analizi', index=False)
                 
-                if len(monthly_df) >= 12:
-                    with st.spinner("ML modelleri eğitiliyor..."):
-                        ml_results, best_model_name, forecast_df = train_advanced_ml_models(monthly_df, forecast_months)
-                    
-                    if ml_results is not None:
-                        # Model Performansı
-                        st.subheader("🤖 Model Performans Karşılaştırması")
-                        
-                        perf_data = []
-                        for name, metrics in ml_results.items():
-                            perf_data.append({
-                                'Model': name,
-                                'MAE': metrics['MAE'],
-                                'RMSE': metrics['RMSE'],
-                                'MAPE (%)': metrics['MAPE'],
-                                'R²': metrics['R2']
-                            })
-                        
-                        perf_df = pd.DataFrame(perf_data)
-                        perf_df = perf_df.sort_values('MAPE (%)')
-                        
-                        col_ml1, col_ml2 = st.columns([2, 1])
-                        
-                        with col_ml1:
-                            styled_perf = style_dataframe(
-                                perf_df,
-                                color_column='MAPE (%)',
-                                gradient_columns=['MAE', 'RMSE', 'R²']
-                            )
-                            st.dataframe(styled_perf, use_container_width=True)
-                        
-                        with col_ml2:
-                            best_mape = ml_results[best_model_name]['MAPE']
-                            
-                            if best_mape < 10:
-                                confidence_level = "🟢 YÜKSEK"
-                                confidence_color = "#06B6D4"
-                            elif best_mape < 20:
-                                confidence_level = "🟡 ORTA"
-                                confidence_color = "#F59E0B"
-                            else:
-                                confidence_level = "🔴 DÜŞÜK"
-                                confidence_color = "#64748B"
-                            
-                            st.markdown(f'<div style="background: rgba(30, 41, 59, 0.8); padding: 1.5rem; border-radius: 12px; border: 2px solid {confidence_color}; margin-top: 1rem;">'
-                                       f'<h3 style="color: white; margin: 0 0 1rem 0;">🏆 En İyi Model</h3>'
-                                       f'<p style="color: {confidence_color}; font-size: 1.5rem; font-weight: 700; margin: 0 0 0.5rem 0;">{best_model_name}</p>'
-                                       f'<p style="color: #94a3b8; margin: 0 0 1rem 0;">MAPE: <span style="color: {confidence_color}; font-weight: 700;">{best_mape:.2f}%</span></p>'
-                                       f'<p style="color: #e2e8f0; font-weight: 600; margin: 0;">Güven Seviyesi: <span style="color: {confidence_color};">{confidence_level}</span></p>'
-                                       '</div>', unsafe_allow_html=True)
-                        
-                        st.markdown("---")
-                        
-                        # Gelişmiş zaman serisi grafiği
-                        st.subheader("📈 Gelişmiş Zaman Serisi ve Tahminler")
-                        ts_chart = create_advanced_time_series_chart(monthly_df, forecast_df)
-                        st.plotly_chart(ts_chart, use_container_width=True)
-                        
-                        # Tahmin detayları
-                        st.markdown("---")
-                        st.subheader("📋 Tahmin Detayları")
-                        
-                        forecast_summary = forecast_df.groupby(['Model', 'Tahmin_Tipi']).agg({
-                            'PF_Satis': ['mean', 'sum']
-                        }).reset_index()
-                        
-                        forecast_summary.columns = ['Model', 'Tahmin Tipi', 'Ortalama Tahmin', 'Toplam Tahmin']
-                        forecast_summary.index = range(1, len(forecast_summary) + 1)
-                        
-                        styled_forecast = style_dataframe(
-                            forecast_summary,
-                            gradient_columns=['Ortalama Tahmin', 'Toplam Tahmin']
-                        )
-                        
-                        st.dataframe(styled_forecast, use_container_width=True)
-                    else:
-                        st.warning("ML modeli eğitilemedi. Yeterli veri yok olabilir.")
-                        ts_chart = create_advanced_time_series_chart(monthly_df)
-                        st.plotly_chart(ts_chart, use_container_width=True)
-                else:
-                    st.warning("ML tahmini için en az 12 ay veri gereklidir.")
-                    ts_chart = create_advanced_time_series_chart(monthly_df)
-                    st.plotly_chart(ts_chart, use_container_width=True)
-            
-            elif analysis_type == "Trend Analizi":
-                st.subheader("📈 Trend Analizi")
-                trend_chart = create_trend_analysis_chart(monthly_df)
-                st.plotly_chart(trend_chart, use_container_width=True)
+                # Mevsimsel ayrıştırma
+                if len(decomposition) > 0:
+                    decomposition.to_excel(writer, sheet_name='Mevsimsel Ayrıştırma', index=False)
+                    decomposition_summary.to_excel(writer, sheet_name='Durağanlık Testi', index=False)
                 
-                # Dönemsel büyüme metrikleri
-                if 'buyume_metrikleri' in trend_analysis:
-                    st.subheader("📊 Dönemsel Büyüme Oranları")
-                    
-                    growth_metrics = trend_analysis['buyume_metrikleri']
-                    if growth_metrics:
-                        col_growth1, col_growth2, col_growth3 = st.columns(3)
-                        
-                        if 'MoM_Growth' in growth_metrics:
-                            with col_growth1:
-                                st.metric("📈 Aylık Büyüme (MoM)", format_percentage(growth_metrics['MoM_Growth']))
-                        
-                        if 'QoQ_3M_Growth' in growth_metrics:
-                            with col_growth2:
-                                st.metric("📊 3 Aylık Büyüme (QoQ)", format_percentage(growth_metrics['QoQ_3M_Growth']))
-                        
-                        if 'QoQ_6M_Growth' in growth_metrics:
-                            with col_growth3:
-                                st.metric("📈 6 Aylık Büyüme (QoQ)", format_percentage(growth_metrics['QoQ_6M_Growth']))
-            
-            elif analysis_type == "Karşılaştırmalı Analiz":
-                st.subheader("📊 Karşılaştırmalı Dönem Analizi")
+                if bcg_df is not None:
+                    bcg_df.to_excel(writer, sheet_name='BCG Matrix', index=False)
                 
-                comparisons_df = create_comparative_analysis(monthly_df, periods=[3, 6, 12])
+                city_data.to_excel(writer, sheet_name='Şehir Analizi', index=False)
+                comp_data.to_excel(writer, sheet_name='Rakip Analizi', index=False)
                 
-                if comparisons_df is not None and len(comparisons_df) > 0:
-                    comp_chart = create_comparative_period_chart(comparisons_df)
-                    if comp_chart:
-                        st.plotly_chart(comp_chart, use_container_width=True)
-                    
-                    # Detaylı tablo
-                    st.subheader("📋 Dönemsel Performans Detayları")
-                    
-                    comp_display = comparisons_df.copy()
-                    comp_display.columns = ['Dönem', 'Ortalama Satış', 'Önceki Ortalama', 'Büyüme %', 
-                                          'Pazar Payı %', 'Pay Değişimi', 'Volatilite', 'Trend']
-                    comp_display.index = range(1, len(comp_display) + 1)
-                    
-                    styled_comp = style_dataframe(
-                        comp_display,
-                        color_column='Büyüme %',
-                        gradient_columns=['Ortalama Satış', 'Pazar Payı %', 'Volatilite']
-                    )
-                    
-                    st.dataframe(styled_comp, use_container_width=True)
-                else:
-                    st.warning("Karşılaştırmalı analiz için yeterli veri yok.")
-            
-            elif analysis_type == "Mevsimsellik Analizi":
-                st.subheader("🔄 Mevsimsellik Analizi")
+                if forecast_df is not None:
+                    forecast_df.to_excel(writer, sheet_name='ML Tahminler', index=False)
                 
-                seasonality_chart = create_seasonality_chart(monthly_df)
-                if seasonality_chart:
-                    st.plotly_chart(seasonality_chart, use_container_width=True)
-                    
-                    # Mevsimsellik istatistikleri
-                    if 'Month' in monthly_df.columns:
-                        monthly_avg = monthly_df.groupby('Month').agg({
-                            'PF_Satis': ['mean', 'std', 'min', 'max']
-                        }).reset_index()
-                        
-                        monthly_avg.columns = ['Month', 'Ortalama', 'Std Sapma', 'Minimum', 'Maksimum']
-                        monthly_avg['Month_Name'] = monthly_avg['Month'].map({
-                            1: 'Oca', 2: 'Şub', 3: 'Mar', 4: 'Nis', 5: 'May', 6: 'Haz',
-                            7: 'Tem', 8: 'Ağu', 9: 'Eyl', 10: 'Eki', 11: 'Kas', 12: 'Ara'
+                # Portföy tahmini
+                if len(portfolio_summary) > 0:
+                    portfolio_forecast.to_excel(writer, sheet_name='Portföy Tahmini', index=False)
+                    portfolio_summary.to_excel(writer, sheet_name='Portföy Model Özeti', index=False)
+                
+                # ML model performansları
+                if ml_results is not None:
+                    perf_data = []
+                    for name, metrics in ml_results.items():
+                        perf_data.append({
+                            'Model': name,
+                            'MAE': metrics['MAE'],
+                            'RMSE': metrics['RMSE'],
+                            'MAPE': metrics['MAPE'],
+                            'R2': metrics['R2']
                         })
-                        
-                        st.subheader("📊 Aylık Performans İstatistikleri")
-                        
-                        styled_season = style_dataframe(
-                            monthly_avg,
-                            gradient_columns=['Ortalama', 'Std Sapma', 'Minimum', 'Maksimum']
-                        )
-                        
-                        st.dataframe(styled_season, use_container_width=True)
-                else:
-                    st.warning("Mevsimsellik analizi için yeterli veri yok (en az 12 ay).")
-            
-            elif analysis_type == "Volatilite Analizi":
-                st.subheader("📉 Volatilite Analizi")
+                    perf_df = pd.DataFrame(perf_data)
+                    perf_df.to_excel(writer, sheet_name='ML Performans', index=False)
                 
-                volatility_chart = create_volatility_chart(monthly_df)
-                if volatility_chart:
-                    st.plotly_chart(volatility_chart, use_container_width=True)
-                    
-                    # Volatilite istatistikleri
-                    if 'PF_CV' in monthly_df.columns:
-                        st.subheader("📊 Volatilite İstatistikleri")
-                        
-                        col_vol1, col_vol2, col_vol3 = st.columns(3)
-                        
-                        with col_vol1:
-                            avg_vol = monthly_df['PF_CV'].mean()
-                            st.metric("📊 Ortalama CV", f"{avg_vol:.1f}%")
-                        
-                        with col_vol2:
-                            max_vol = monthly_df['PF_CV'].max()
-                            st.metric("📈 Maksimum CV", f"{max_vol:.1f}%")
-                        
-                        with col_vol3:
-                            min_vol = monthly_df['PF_CV'].min()
-                            st.metric("📉 Minimum CV", f"{min_vol:.1f}%")
-            
-            # Detaylı zaman serisi tablosu
-            st.markdown("---")
-            st.subheader("📋 Detaylı Zaman Serisi Verisi")
-            
-            display_cols = ['YIL_AY', 'PF_Satis', 'Rakip_Satis', 'Pazar_Payi_%', 
-                          'PF_Buyume_%', 'Rakip_Buyume_%', 'Goreceli_Buyume_%']
-            
-            # Sadece mevcut kolonları göster
-            available_cols = [col for col in display_cols if col in monthly_df.columns]
-            monthly_display = monthly_df[available_cols].copy()
-            
-            # Kolon isimlerini düzenle
-            col_names = {
-                'YIL_AY': 'Ay',
-                'PF_Satis': 'PF Satış',
-                'Rakip_Satis': 'Rakip Satış',
-                'Pazar_Payi_%': 'Pazar Payı %',
-                'PF_Buyume_%': 'PF Büyüme %',
-                'Rakip_Buyume_%': 'Rakip Büyüme %',
-                'Goreceli_Buyume_%': 'Göreceli Büyüme %'
-            }
-            
-            monthly_display = monthly_display.rename(columns=col_names)
-            monthly_display.index = range(1, len(monthly_display) + 1)
+                # Walk-forward backtest (model x ufuk)
+                if backtest_summary is not None:
+                    backtest_summary.to_excel(writer, sheet_name='ML Backtest', index=False)
+                
+                # Özet sayfası
+                summary_data = {
+                    'Metrik': ['Ürün', 'Dönem', 'Toplam PF Satış', 'Toplam Pazar', 'Pazar Payı', 
+                              'Territory Sayısı', 'Trend Durumu', 'Mevsimsellik', 'Volatilite'],
+                    'Değer': [
+                        selected_product,
+                        date_option,
+                        f"{terr_perf['PF_Satis'].sum():,.0f}",
+                        f"{terr_perf['Toplam_Pazar'].sum():,.0f}",
+                        f"{(terr_perf['PF_Satis'].sum() / terr_perf['Toplam_Pazar'].sum() * 100):.1f}%" if terr_perf['Toplam_Pazar'].sum() > 0 else "0%",
+                        len(terr_perf),
+                        trend_analysis.get('temel_trend', 'Bilinmiyor'),
+                        trend_analysis.get('mevsimsellik', 'Bilinmiyor'),
+                        trend_analysis.get('volatilite', 'Bilinmiyor')
+                    ]
+                }
+                summary_df = pd.DataFrame(summary_data)
+                summary_df.to_excel(writer, sheet_name='Özet', index=False)
             
-            styled_monthly = style_dataframe(
-                monthly_display,
-                color_column='Göreceli Büyüme %',
-                gradient_columns=['PF Satış', 'Pazar Payı %', 'PF Büyüme %']
-            )
+            st.success("✅ Rapor hazır!")
             
-            st.dataframe(
-                styled_monthly,
-                use_container_width=True,
-                height=400
+            # İndirme butonu
+            st.download_button(
+                label="💾 Excel Raporunu İndir",
+                data=output.getvalue(),
+                file_name=f"ticari_portfoy_raporu_{selected_product}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                use_container_width=True
             )
+
+# Sekme başlıkları ve içerik fonksiyonları (görüntülenme sırasıyla)
+APP_SECTIONS = [
+    ("📊 Genel Bakış", render_overview_tab),
+    ("🗺️ Modern Harita", render_map_tab),
+    ("🏢 Territory Analizi", render_territory_tab),
+    ("📈 Gelişmiş Zaman Serisi", render_time_series_tab),
+    ("🎯 Rakip Analizi", render_competitor_tab),
+    ("⭐ BCG & Strateji", render_bcg_tab),
+    ("📥 Raporlar", render_report_tab)
+]
+
+# =============================================================================
+# MAIN APP - GELİŞTİRİLMİŞ VERSİYON
+# =============================================================================
+
+def main():
+    # Başlık ve açıklama
+    st.markdown('<h1 class="main-header">🎯 GELİŞMİŞ TİCARİ PORTFÖY ANALİZ SİSTEMİ</h1>', unsafe_allow_html=True)
+    st.markdown('<div style="text-align: center; font-size: 1.2rem; color: #94a3b8; margin-bottom: 3rem;">'
+                'GERÇEK ML Tahminleme • Gelişmiş Zaman Serisi Analizi • Modern Harita • Rakip Analizi'
+                '</div>', unsafe_allow_html=True)
     
-    # TAB 5: RAKİP ANALİZİ
-    with tab5:
-        st.header("📊 Detaylı Rakip Analizi")
+    # SIDEBAR
+    with st.sidebar:
+        st.markdown('<div style="background: linear-gradient(135deg, #3B82F6 0%, #10B981 100%); '
+                   'padding: 1rem; border-radius: 12px; margin-bottom: 2rem;">'
+                   '<h3 style="color: white; margin: 0; text-align: center;">📂 VERİ YÜKLEME</h3>'
+                   '</div>', unsafe_allow_html=True)
         
-        comp_data = calculate_competitor_analysis(df_filtered, selected_product, date_filter)
+        uploaded_file = st.file_uploader("Excel Dosyası Yükleyin", type=['xlsx', 'xls'])
         
-        if len(comp_data) == 0:
-            st.warning("⚠️ Seçilen filtrelerde veri bulunamadı")
-        else:
-            # Özet Metrikler
-            col1, col2, col3, col4 = st.columns(4)
-            
-            avg_pf_share = comp_data['PF_Pay_%'].mean()
-            avg_pf_growth = comp_data['PF_Buyume'].mean()
-            avg_rakip_growth = comp_data['Rakip_Buyume'].mean()
-            win_months = len(comp_data[comp_data['Fark'] > 0])
-            
-            with col1:
-                st.metric("🎯 Ort. PF Pazar Payı", format_percentage(avg_pf_share))
-            with col2:
-                st.metric("📈 Ort. PF Büyüme", format_percentage(avg_pf_growth))
-            with col3:
-                st.metric("📉 Ort. Rakip Büyüme", format_percentage(avg_rakip_growth))
-            with col4:
-                st.metric("🏆 Kazanılan Aylar", f"{win_months}/{len(comp_data)}")
-            
-            st.markdown("---")
-            
-            # Grafikler
-            col_g1, col_g2 = st.columns(2)
-            
-            with col_g1:
-                st.subheader("💰 Satış Karşılaştırması")
-                comp_chart = create_modern_competitor_chart(comp_data)
-                st.plotly_chart(comp_chart, use_container_width=True)
-            
-            with col_g2:
-                st.subheader("📈 Büyüme Karşılaştırması")
-                growth_chart = create_modern_growth_chart(comp_data)
-                st.plotly_chart(growth_chart, use_container_width=True)
-            
-            # Detaylı Tablo
-            st.markdown("---")
-            st.subheader("📋 Aylık Performans Detayları")
-            
-            comp_display = comp_data[['YIL_AY', 'PF', 'Rakip', 'PF_Pay_%', 'PF_Buyume', 'Rakip_Buyume', 'Fark']].copy()
-            comp_display.columns = ['Ay', 'PF Satış', 'Rakip Satış', 'PF Pay %', 'PF Büyüme %', 'Rakip Büyüme %', 'Fark %']
-            comp_display.index = range(1, len(comp_display) + 1)
-            
-            styled_comp = style_dataframe(
-                comp_display,
-                color_column='Fark %',
-                gradient_columns=['PF Pay %', 'PF Büyüme %', 'Rakip Büyüme %']
-            )
-            
-            st.dataframe(
-                styled_comp,
-                use_container_width=True,
-                height=400
-            )
-    
-    # TAB 6: BCG & STRATEJİ
-    with tab6:
-        st.header("⭐ BCG Matrix & Yatırım Stratejisi")
+        if not uploaded_file:
+            st.info("👈 Lütfen sol taraftan Excel dosyasını yükleyin")
+            st.stop()
+        
+        compact_mode = st.checkbox("💾 Kompakt bellek modu", value=True)
+        lazy_mode = st.checkbox("⚡ Yalnızca seçili bölümü hesapla", value=True)
+        
+        try:
+            df = load_excel_data(uploaded_file, compact=compact_mode)
+            gdf = load_geojson_gpd()
+            geojson = load_geojson_json()
+            st.success(f"✅ **{len(df):,}** satır veri yüklendi")
+        except Exception as e:
+            st.error(f"❌ Veri yükleme hatası: {str(e)}")
+            st.stop()
+        
+        cube = load_sales_cube(df.attrs['dataset_hash'], compact_mode, df)
+        filter_index = load_filter_index(df.attrs['dataset_hash'], compact_mode, cube)
         
-        bcg_df = calculate_bcg_matrix(df_filtered, selected_product, date_filter)
+        memory_report = df.attrs.get('memory_report', {})
+        if memory_report.get('before_mb') is not None:
+            st.caption(f"💾 Bellek: {memory_report['before_mb']:,.1f} MB → {memory_report['after_mb']:,.1f} MB")
+        elif memory_report:
+            st.caption(f"💾 Bellek: {memory_report['after_mb']:,.1f} MB")
         
-        # BCG Dağılımı
-        st.subheader("📊 Portföy Dağılımı")
+        st.markdown("---")
+        
+        # Ürün Seçimi
+        st.markdown('<div style="background: rgba(30, 41, 59, 0.7); padding: 1rem; border-radius: 10px; margin: 1rem 0;">'
+                   '<h4 style="color: #e2e8f0; margin: 0 0 1rem 0;">💊 ÜRÜN SEÇİMİ</h4>', unsafe_allow_html=True)
+        selected_product = st.selectbox("", ["TROCMETAM", "CORTIPOL", "DEKSAMETAZON", "PF IZOTONIK"], label_visibility="collapsed")
+        st.markdown('</div>', unsafe_allow_html=True)
+        
+        st.markdown("---")
         
-        bcg_counts = bcg_df['BCG_Kategori'].value_counts()
+        # Tarih Aralığı
+        st.markdown('<div style="background: rgba(30, 41, 59, 0.7); padding: 1rem; border-radius: 10px; margin: 1rem 0;">'
+                   '<h4 style="color: #e2e8f0; margin: 0 0 1rem 0;">📅 TARİH ARALIĞI</h4>', unsafe_allow_html=True)
         
-        col_bcg1, col_bcg2, col_bcg3, col_bcg4 = st.columns(4)
+        min_date = df['DATE'].min()
+        max_date = df['DATE'].max()
         
-        with col_bcg1:
-            star_count = bcg_counts.get("⭐ Star", 0)
-            star_pf = bcg_df[bcg_df['BCG_Kategori'] == "⭐ Star"]['PF_Satis'].sum()
-            st.metric("⭐ Star", f"{star_count}", delta=f"{format_number(star_pf)} PF")
+        date_option = st.selectbox("Dönem Seçin", ["Tüm Veriler", "Son 3 Ay", "Son 6 Ay", "Son 1 Yıl", "2025", "2024", "Özel Aralık"])
         
-        with col_bcg2:
-            cow_count = bcg_counts.get("🐄 Cash Cow", 0)
-            cow_pf = bcg_df[bcg_df['BCG_Kategori'] == "🐄 Cash Cow"]['PF_Satis'].sum()
-            st.metric("🐄 Cash Cow", f"{cow_count}", delta=f"{format_number(cow_pf)} PF")
+        if date_option == "Tüm Veriler":
+            date_filter = None
+        elif date_option == "Son 3 Ay":
+            start_date = max_date - pd.DateOffset(months=3)
+            date_filter = (start_date, max_date)
+        elif date_option == "Son 6 Ay":
+            start_date = max_date - pd.DateOffset(months=6)
+            date_filter = (start_date, max_date)
+        elif date_option == "Son 1 Yıl":
+            start_date = max_date - pd.DateOffset(years=1)
+            date_filter = (start_date, max_date)
+        elif date_option == "2025":
+            date_filter = (pd.to_datetime('2025-01-01'), pd.to_datetime('2025-12-31'))
+        elif date_option == "2024":
+            date_filter = (pd.to_datetime('2024-01-01'), pd.to_datetime('2024-12-31'))
+        else:
+            col_date1, col_date2 = st.columns(2)
+            with col_date1:
+                start_date = st.date_input("Başlangıç", min_date, min_value=min_date, max_value=max_date)
+            with col_date2:
+                end_date = st.date_input("Bitiş", max_date, min_value=min_date, max_value=max_date)
+            date_filter = (pd.to_datetime(start_date), pd.to_datetime(end_date))
         
-        with col_bcg3:
-            q_count = bcg_counts.get("❓ Question Mark", 0)
-            q_pf = bcg_df[bcg_df['BCG_Kategori'] == "❓ Question Mark"]['PF_Satis'].sum()
-            st.metric("❓ Question", f"{q_count}", delta=f"{format_number(q_pf)} PF")
+        # Analizler ay çözünürlüğündedir: aralık tam aylara yuvarlanır
+        date_filter = snap_date_filter_to_months(date_filter)
+        if date_filter:
+            st.caption(f"📆 Ay çözünürlüğü: {date_filter[0]:%Y-%m} – {date_filter[1]:%Y-%m} (tam aylar)")
         
-        with col_bcg4:
-            dog_count = bcg_counts.get("🐶 Dog", 0)
-            dog_pf = bcg_df[bcg_df['BCG_Kategori'] == "🐶 Dog"]['PF_Satis'].sum()
-            st.metric("🐶 Dog", f"{dog_count}", delta=f"{format_number(dog_pf)} PF")
+        st.markdown('</div>', unsafe_allow_html=True)
         
         st.markdown("---")
         
-        # BCG Matrix
-        st.subheader("🎯 BCG Matrix")
+        # Filtreler
+        st.markdown('<div style="background: rgba(30, 41, 59, 0.7); padding: 1rem; border-radius: 10px; margin: 1rem 0;">'
+                   '<h4 style="color: #e2e8f0; margin: 0 0 1rem 0;">🔍 FİLTRELER</h4>', unsafe_allow_html=True)
         
-        bcg_chart = create_modern_bcg_chart(bcg_df)
-        st.plotly_chart(bcg_chart, use_container_width=True)
+        territories = ["TÜMÜ"] + sorted(filter_index['TERRITORIES'])
+        selected_territory = st.selectbox("Territory", territories)
         
-        # BCG Detayları
-        st.markdown("---")
-        st.subheader("📋 BCG Kategori Detayları")
+        regions = ["TÜMÜ"] + sorted(filter_index['REGION'])
+        selected_region = st.selectbox("Bölge", regions)
         
-        display_cols_bcg = ['Territory', 'Region', 'BCG_Kategori', 'PF_Satis', 'Pazar_Payi_%', 'Goreceli_Pazar_Payi', 'Pazar_Buyume_%']
+        managers = ["TÜMÜ"] + sorted(filter_index['MANAGER'])
+        selected_manager = st.selectbox("Manager", managers)
         
-        bcg_display = bcg_df[display_cols_bcg].copy()
-        bcg_display.columns = ['Territory', 'Region', 'BCG', 'PF Satış', 'Pazar Payı %', 'Göreceli Pay', 'Büyüme %']
-        bcg_display = bcg_display.sort_values('PF Satış', ascending=False)
-        bcg_display.index = range(1, len(bcg_display) + 1)
+        st.markdown('</div>', unsafe_allow_html=True)
         
-        styled_bcg = style_dataframe(
-            bcg_display,
-            color_column='Pazar Payı %',
-            gradient_columns=['PF Satış', 'Büyüme %']
-        )
+        # Veri filtreleme (küp üzerinde, önceden hesaplanmış satır indeksleriyle)
+        filter_selections = {
+            'TERRITORIES': selected_territory,
+            'REGION': selected_region,
+            'MANAGER': selected_manager
+        }
+        cube_filtered = apply_filter_index(cube, filter_index, filter_selections)
+        cube_filtered.attrs['frame_key'] = (df.attrs['dataset_hash'], compact_mode, tuple(sorted(filter_selections.items())))
         
-        st.dataframe(
-            styled_bcg,
-            use_container_width=True,
-            height=400
+        # Sekmeler arası ortak hesaplamalar bu kapsamla paylaşılır
+        start_calc_run()
+        calc_scope = make_calc_scope(df.attrs['dataset_hash'], compact_mode, selected_product,
+                                     filter_selections, date_filter)
+        calc_graph_status = st.empty()
+        model_cache_status = st.empty()
+        
+        st.markdown("---")
+        
+        # Harita Ayarları
+        st.markdown('<div style="background: rgba(30, 41, 59, 0.7); padding: 1rem; border-radius: 10px; margin: 1rem 0;">'
+                   '<h4 style="color: #e2e8f0; margin: 0 0 1rem 0;">🗺️ HARİTA AYARLARI</h4>', unsafe_allow_html=True)
+        
+        view_mode = st.radio(
+            "Görünüm Modu",
+            ["Bölge Görünümü", "Şehir Görünümü"],
+            index=0
         )
+        
+        # Yatırım stratejisi filtresi
+        strateji_list = ["Tümü", "🚀 Agresif", "⚡ Hızlandırılmış", "🛡️ Koruma", "💎 Potansiyel", "👁️ İzleme"]
+        selected_strateji = st.selectbox("Yatırım Stratejisi", strateji_list)
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+        
+        # Renk Legend
+        st.markdown("---")
+        st.markdown('<h4 style="color: #e2e8f0;">🎨 BÖLGE RENKLERİ</h4>', unsafe_allow_html=True)
+        for region, color in list(REGION_COLORS.items())[:5]:
+            st.markdown(f'<div style="display: flex; align-items: center; margin: 0.3rem 0;">'
+                       f'<div style="width: 12px; height: 12px; background-color: {color}; border-radius: 2px; margin-right: 8px;"></div>'
+                       f'<span style="color: #cbd5e1; font-size: 0.9rem;">{region}</span>'
+                       f'</div>', unsafe_allow_html=True)
     
-    # TAB 7: RAPORLAR
-    with tab7:
-        st.header("📥 Rapor İndirme")
-        
-        st.markdown("""
-        <div style="background: rgba(30, 41, 59, 0.7); padding: 2rem; border-radius: 12px; margin-bottom: 2rem;">
-            <h3 style="color: #e2e8f0; margin-top: 0;">📊 Detaylı Excel Raporu</h3>
-            <p style="color: #94a3b8; margin-bottom: 1.5rem;">
-                Tüm analizlerinizi içeren kapsamlı bir Excel raporu oluşturun. 
-                Rapor aşağıdaki sayfaları içerecektir:
-            </p>
-            <ul style="color: #cbd5e1; margin-left: 1.5rem;">
-                <li>Territory Performans (Toplam Pazar % ile)</li>
-                <li>Gelişmiş Zaman Serisi Analizi</li>
-                <li>Trend Analizi Sonuçları</li>
-                <li>ML Tahmin Sonuçları</li>
-                <li>BCG Matrix</li>
-                <li>Şehir Bazlı Analiz</li>
-                <li>Rakip Analizi</li>
-            </ul>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        if st.button("📊 Excel Raporu Oluştur", type="primary", use_container_width=True):
-            with st.spinner("Rapor hazırlanıyor..."):
-                # Tüm analizleri hesapla
-                terr_perf = calculate_territory_performance(df_filtered, selected_product, date_filter)
-                total_market_all = terr_perf['Toplam_Pazar'].sum()
-                terr_perf['Toplam_Pazar_%'] = safe_divide(terr_perf['Toplam_Pazar'], total_market_all) * 100
-                
-                monthly_df = calculate_advanced_time_series(df_filtered, selected_product, None, date_filter)
-                trend_analysis = perform_trend_analysis(monthly_df)
-                bcg_df = calculate_bcg_matrix(df_filtered, selected_product, date_filter)
-                city_data = calculate_city_performance(df_filtered, selected_product, date_filter)
-                comp_data = calculate_competitor_analysis(df_filtered, selected_product, date_filter)
-                
-                # ML tahmini
-                if len(monthly_df) >= 12:
-                    ml_results, best_model_name, forecast_df = train_advanced_ml_models(monthly_df, 6)
-                else:
-                    ml_results, best_model_name, forecast_df = None, None, None
-                
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    terr_perf.to_excel(writer, sheet_name='Territory Performans', index=False)
-                    monthly_df.to_excel(writer, sheet_name='Zaman Serisi', index=False)
-                    
-                    # Trend analizi sonuçları
-                    if 'error' not in trend_analysis:
-                        trend_df = pd.DataFrame([trend_analysis])
-                        trend_df.to_excel(writer, sheet_name='Trend Analizi', index=False)
-                    
-                    if bcg_df is not None:
-                        bcg_df.to_excel(writer, sheet_name='BCG Matrix', index=False)
-                    
-                    city_data.to_excel(writer, sheet_name='Şehir Analizi', index=False)
-                    comp_data.to_excel(writer, sheet_name='Rakip Analizi', index=False)
-                    
-                    if forecast_df is not None:
-                        forecast_df.to_excel(writer, sheet_name='ML Tahminler', index=False)
-                    
-                    # ML model performansları
-                    if ml_results is not None:
-                        perf_data = []
-                        for name, metrics in ml_results.items():
-                            perf_data.append({
-                                'Model': name,
-                                'MAE': metrics['MAE'],
-                                'RMSE': metrics['RMSE'],
-                                'MAPE': metrics['MAPE'],
-                                'R2': metrics['R2']
-                            })
-                        perf_df = pd.DataFrame(perf_data)
-                        perf_df.to_excel(writer, sheet_name='ML Performans', index=False)
-                    
-                    # Özet sayfası
-                    summary_data = {
-                        'Metrik': ['Ürün', 'Dönem', 'Toplam PF Satış', 'Toplam Pazar', 'Pazar Payı', 
-                                  'Territory Sayısı', 'Trend Durumu', 'Mevsimsellik', 'Volatilite'],
-                        'Değer': [
-                            selected_product,
-                            date_option,
-                            f"{terr_perf['PF_Satis'].sum():,.0f}",
-                            f"{terr_perf['Toplam_Pazar'].sum():,.0f}",
-                            f"{(terr_perf['PF_Satis'].sum() / terr_perf['Toplam_Pazar'].sum() * 100):.1f}%" if terr_perf['Toplam_Pazar'].sum() > 0 else "0%",
-                            len(terr_perf),
-                            trend_analysis.get('temel_trend', 'Bilinmiyor'),
-                            trend_analysis.get('mevsimsellik', 'Bilinmiyor'),
-                            trend_analysis.get('volatilite', 'Bilinmiyor')
-                        ]
-                    }
-                    summary_df = pd.DataFrame(summary_data)
-                    summary_df.to_excel(writer, sheet_name='Özet', index=False)
-                
-                st.success("✅ Rapor hazır!")
-                
-                # İndirme butonu
-                st.download_button(
-                    label="💾 Excel Raporunu İndir",
-                    data=output.getvalue(),
-                    file_name=f"ticari_portfoy_raporu_{selected_product}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True
-                )
+    # Sekmelerin ortak girdileri
+    ctx = {
+        'selected_product': selected_product,
+        'cube_filtered': cube_filtered,
+        'date_filter': date_filter,
+        'date_option': date_option,
+        'calc_scope': calc_scope,
+        'gdf': gdf,
+        'view_mode': view_mode,
+        'selected_strateji': selected_strateji
+    }
+    
+    # ANA İÇERİK
+    if lazy_mode:
+        # Yalnızca seçili bölüm hesaplanır; diğerleri açıldıklarında hesaplama grafından çizilir
+        section_labels = [label for label, _ in APP_SECTIONS]
+        selected_section = st.radio("Bölüm", section_labels, horizontal=True,
+                                    key='active_section', label_visibility="collapsed")
+        dict(APP_SECTIONS)[selected_section](ctx)
+    else:
+        for tab, (_, render_section) in zip(st.tabs([label for label, _ in APP_SECTIONS]), APP_SECTIONS):
+            with tab:
+                render_section(ctx)
+    
+    # Hesaplama grafı özeti (sekmeler çalıştıktan sonra)
+    graph = get_calc_graph()
+    calc_graph_status.caption(
+        f"🧮 Hesaplama: bu turda {graph['run_hits']} paylaşılan / {graph['run_misses']} yeni "
+        f"(oturum: {graph['hits']} / {graph['misses']})"
+    )
+    model_stats = get_model_cache_stats()
+    model_cache_status.caption(
+        f"🤖 Model önbelleği: {model_stats['hits']} isabet / {model_stats['misses']} eğitim / "
+        f"{model_stats['evictions']} çıkarma · {model_stats['entries']} model, {model_stats['size_mb']:.1f} MB"
+        + (f" · 🔄 {model_stats['refreshes']} artımlı yenileme ({model_stats['rows_reused']} ay ve "
+           f"{model_stats['trees_reused']} ağaç yeniden kullanıldı, {model_stats['trees_trained']} yeni ağaç)"
+           if model_stats['refreshes'] else "")
+        + (f" · ↩️ {model_stats['refresh_fallbacks']} yenileme MAPE kötüleştiği için tam eğitime döndü"
+           if model_stats['refresh_fallbacks'] else "")
+    )
 
 if __name__ == "__main__":
     main()